@@ -0,0 +1,294 @@
+import asyncio
+import base64
+import hashlib
+import json
+import logging
+import math
+import os
+import re
+import time
+from array import array
+from config import Config
+from prompts import TRIGGER_KEYWORDS
+
+logger = logging.getLogger(__name__)
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+_TRIGGER_SET = frozenset(TRIGGER_KEYWORDS)
+
+def _hash64(value):
+    return int.from_bytes(hashlib.blake2b(str(value).encode(), digest_size=8).digest(), 'little')
+
+
+class HyperLogLog:
+    """Approximate distinct counter in 2**p bytes (p=10: 1 KiB, ~3% error)"""
+
+    def __init__(self, p=10, registers=None):
+        self.p = p
+        self.m = 1 << p
+        self.registers = registers if registers is not None else bytearray(self.m)
+
+    def add(self, value):
+        x = _hash64(value)
+        index = x & (self.m - 1)
+        rest = x >> self.p
+        rank = (64 - self.p) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def count(self):
+        alpha = 0.7213 / (1 + 1.079 / self.m)
+        estimate = alpha * self.m * self.m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * self.m and zeros:
+            # Small range correction (linear counting)
+            estimate = self.m * math.log(self.m / zeros)
+        return int(round(estimate))
+
+    def merge(self, other):
+        merged = HyperLogLog(self.p)
+        merged.registers = bytearray(max(a, b) for a, b in zip(self.registers, other.registers))
+        return merged
+
+
+class CountMinSketch:
+    """Approximate frequency counts in depth x width counters"""
+
+    def __init__(self, width=512, depth=4, table=None):
+        self.width = width
+        self.depth = depth
+        self.table = table if table is not None else array('I', bytes(4 * width * depth))
+
+    def _cells(self, key):
+        x = _hash64(key)
+        h1, h2 = x & 0xFFFFFFFF, (x >> 32) | 1
+        return [row * self.width + (h1 + row * h2) % self.width for row in range(self.depth)]
+
+    def add(self, key, count=1):
+        cells = self._cells(key)
+        for cell in cells:
+            self.table[cell] = min(self.table[cell] + count, 0xFFFFFFFF)
+        return min(self.table[cell] for cell in cells)
+
+    def estimate(self, key):
+        return min(self.table[cell] for cell in self._cells(key))
+
+
+class TopK:
+    """Heaviest keys seen so far, tracked with Count-Min estimates"""
+
+    def __init__(self, k=10):
+        self.k = k
+        self.items = {}
+
+    def offer(self, key, estimate):
+        if key in self.items or len(self.items) < self.k:
+            self.items[key] = estimate
+            return
+        lightest = min(self.items, key=self.items.get)
+        if estimate > self.items[lightest]:
+            del self.items[lightest]
+            self.items[key] = estimate
+
+    def top(self, n=None):
+        return sorted(self.items.items(), key=lambda item: item[1], reverse=True)[:n or self.k]
+
+
+class DecayedCounter:
+    """Exponentially decayed count; value / half-life approximates a recent rate"""
+
+    __slots__ = ('value', 'updated_at')
+
+    def __init__(self, value=0.0, updated_at=None):
+        self.value = value
+        self.updated_at = updated_at if updated_at is not None else time.time()
+
+    def get(self, half_life, now=None):
+        now = now or time.time()
+        return self.value * 0.5 ** ((now - self.updated_at) / half_life)
+
+    def add(self, half_life, amount=1.0, now=None):
+        now = now or time.time()
+        self.value = self.get(half_life, now) + amount
+        self.updated_at = now
+
+    def rate_per_hour(self, half_life, now=None):
+        return self.get(half_life, now) * math.log(2) / half_life * 3600
+
+
+class GuildAnalytics:
+    """Fixed-size statistics for one guild"""
+
+    def __init__(self):
+        self.users = HyperLogLog()
+        self.previous_users = HyperLogLog()  # previous window, so "active" never drops to zero
+        self.window_started = time.time()
+        self.keywords = CountMinSketch()
+        self.top_keywords = TopK()
+        self.channels = {}  # channel_id -> {'name', 'messages', 'replies'}
+        self.messages = DecayedCounter()
+        self.replies = DecayedCounter()
+
+    def _rotate_window(self, now):
+        if now - self.window_started >= Config.ANALYTICS_USER_WINDOW:
+            self.previous_users, self.users = self.users, HyperLogLog()
+            self.window_started = now
+
+    def _channel(self, channel_id, name):
+        channel = self.channels.get(channel_id)
+        if channel is None:
+            if len(self.channels) >= Config.ANALYTICS_MAX_CHANNELS:
+                # Evict the quietest channel
+                half_life = Config.ANALYTICS_HALF_LIFE
+                quietest = min(self.channels, key=lambda cid: self.channels[cid]['messages'].get(half_life))
+                del self.channels[quietest]
+            channel = self.channels[channel_id] = {
+                'name': name, 'messages': DecayedCounter(), 'replies': DecayedCounter()
+            }
+        return channel
+
+    def record_message(self, user_id, channel_id, channel_name, content, now=None):
+        now = now or time.time()
+        half_life = Config.ANALYTICS_HALF_LIFE
+        self._rotate_window(now)
+        self.users.add(user_id)
+        self.messages.add(half_life, now=now)
+        self._channel(channel_id, channel_name)['messages'].add(half_life, now=now)
+
+        words = set(_WORD_RE.findall(content.lower()))
+        for keyword in words & _TRIGGER_SET:
+            self.top_keywords.offer(keyword, self.keywords.add(keyword))
+
+    def record_reply(self, channel_id, channel_name, now=None):
+        now = now or time.time()
+        half_life = Config.ANALYTICS_HALF_LIFE
+        self.replies.add(half_life, now=now)
+        self._channel(channel_id, channel_name)['replies'].add(half_life, now=now)
+
+    def summary(self, now=None):
+        now = now or time.time()
+        half_life = Config.ANALYTICS_HALF_LIFE
+        messages = self.messages.get(half_life, now)
+        busiest = sorted(
+            self.channels.values(), key=lambda c: c['messages'].get(half_life, now), reverse=True
+        )[:5]
+        return {
+            'active_users': self.users.merge(self.previous_users).count(),
+            'top_keywords': self.top_keywords.top(5),
+            'busiest_channels': [(c['name'], c['messages'].rate_per_hour(half_life, now)) for c in busiest],
+            'messages_per_hour': self.messages.rate_per_hour(half_life, now),
+            'reply_rate': self.replies.get(half_life, now) / messages if messages else 0.0,
+        }
+
+    def to_dict(self):
+        def counter(c):
+            return [c.value, c.updated_at]
+        return {
+            'users': base64.b64encode(self.users.registers).decode(),
+            'previous_users': base64.b64encode(self.previous_users.registers).decode(),
+            'window_started': self.window_started,
+            'keywords': base64.b64encode(self.keywords.table.tobytes()).decode(),
+            'top_keywords': self.top_keywords.items,
+            'channels': {
+                str(cid): {'name': c['name'], 'messages': counter(c['messages']), 'replies': counter(c['replies'])}
+                for cid, c in self.channels.items()
+            },
+            'messages': counter(self.messages),
+            'replies': counter(self.replies),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        guild = cls()
+        guild.users.registers = bytearray(base64.b64decode(data['users']))
+        guild.previous_users.registers = bytearray(base64.b64decode(data['previous_users']))
+        guild.window_started = data['window_started']
+        guild.keywords.table = array('I')
+        guild.keywords.table.frombytes(base64.b64decode(data['keywords']))
+        guild.top_keywords.items = dict(data['top_keywords'])
+        guild.channels = {
+            int(cid): {
+                'name': c['name'],
+                'messages': DecayedCounter(*c['messages']),
+                'replies': DecayedCounter(*c['replies']),
+            }
+            for cid, c in data['channels'].items()
+        }
+        guild.messages = DecayedCounter(*data['messages'])
+        guild.replies = DecayedCounter(*data['replies'])
+        return guild
+
+
+class AnalyticsStore:
+    """Per-guild sketches fed from on_message, snapshotted to disk periodically"""
+
+    def __init__(self, path=None):
+        self.path = path or Config.ANALYTICS_SNAPSHOT_PATH
+        self.guilds = {}
+        self._snapshot_task = None
+        self.load()
+
+    def _guild(self, guild_id):
+        guild = self.guilds.get(guild_id)
+        if guild is None:
+            guild = self.guilds[guild_id] = GuildAnalytics()
+        return guild
+
+    def record_message(self, message):
+        if message.guild is None:
+            return
+        self._guild(message.guild.id).record_message(
+            message.author.id, message.channel.id, message.channel.name, message.content
+        )
+
+    def record_reply(self, message):
+        if message.guild is None:
+            return
+        self._guild(message.guild.id).record_reply(message.channel.id, message.channel.name)
+
+    def summary(self, guild_id):
+        guild = self.guilds.get(guild_id)
+        return guild.summary() if guild else None
+
+    def forget_guild(self, guild_id):
+        self.guilds.pop(guild_id, None)
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                data = json.load(f)
+            self.guilds = {int(gid): GuildAnalytics.from_dict(g) for gid, g in data.items()}
+            logger.info(f"Estatísticas de {len(self.guilds)} servidores restauradas")
+        except Exception as e:
+            logger.error(f"Erro ao carregar estatísticas: {e}")
+
+    def _serialize(self):
+        return {str(gid): guild.to_dict() for gid, guild in self.guilds.items()}
+
+    def save(self):
+        self._write(self._serialize())
+
+    def start(self):
+        """Snapshot periodically in the background"""
+        if self._snapshot_task is None:
+            self._snapshot_task = asyncio.create_task(self._snapshot_loop())
+
+    async def _snapshot_loop(self):
+        while True:
+            await asyncio.sleep(Config.ANALYTICS_SNAPSHOT_INTERVAL)
+            # Serialize on the loop (consistent view), write off it
+            await asyncio.to_thread(self._write, self._serialize())
+
+    def _write(self, data):
+        tmp_path = self.path + ".tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.error(f"Erro ao salvar estatísticas: {e}")
+
+    def get_stats(self):
+        return {'guilds': len(self.guilds)}
@@ -0,0 +1,211 @@
+import asyncio
+import collections
+import glob
+import gzip
+import io
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+from config import Config
+
+try:
+    import zstandard
+except ImportError:  # optional; segments fall back to gzip
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+class InteractionLog:
+    """Append-only log of model calls and fallbacks, written in compressed batches"""
+
+    def __init__(self, directory=None):
+        self.directory = directory or Config.AUDIT_LOG_DIR
+        self.enabled = Config.AUDIT_LOG_ENABLED
+        # Bounded so a stalled writer can never grow memory without limit
+        self._pending = collections.deque(maxlen=Config.AUDIT_MAX_PENDING)
+        self._writer_task = None
+        self._segment_path = None
+        self._compressor = zstandard.ZstdCompressor(level=3) if zstandard else None
+        self.extension = ".jsonl.zst" if zstandard else ".jsonl.gz"
+
+        self.recorded = 0
+        self.written = 0
+        self.segments = 0
+
+    def record(self, kind, **fields):
+        """Hot path: only appends to the in-memory buffer"""
+        if not self.enabled:
+            return
+        fields['kind'] = kind
+        fields['ts'] = time.time()
+        self._pending.append(fields)
+        self.recorded += 1
+
+    def start(self):
+        """Flush batches from a background task"""
+        if self.enabled and self._writer_task is None:
+            self._writer_task = asyncio.create_task(self._writer_loop())
+
+    async def _writer_loop(self):
+        while True:
+            await asyncio.sleep(Config.AUDIT_FLUSH_INTERVAL)
+            batch = self._drain()
+            if batch:
+                await asyncio.to_thread(self._write_batch, batch)
+
+    def _drain(self):
+        batch = list(self._pending)
+        self._pending.clear()
+        return batch
+
+    def _compress(self, data):
+        if self._compressor:
+            return self._compressor.compress(data)
+        return gzip.compress(data, compresslevel=6)
+
+    def _current_segment(self):
+        """Segment file for the next batch, rotated by size"""
+        if self._segment_path and os.path.exists(self._segment_path):
+            if os.path.getsize(self._segment_path) < Config.AUDIT_SEGMENT_BYTES:
+                return self._segment_path
+
+        os.makedirs(self.directory, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        self._segment_path = os.path.join(self.directory, f"interactions-{stamp}-{os.getpid()}{self.extension}")
+        self.segments += 1
+        return self._segment_path
+
+    def _write_batch(self, batch):
+        # Every batch is an independent compressed frame appended to the segment
+        lines = "".join(json.dumps(entry, ensure_ascii=False) + "\n" for entry in batch)
+        try:
+            with open(self._current_segment(), 'ab') as f:
+                f.write(self._compress(lines.encode('utf-8')))
+            self.written += len(batch)
+        except OSError as e:
+            logger.error(f"Erro ao gravar log de interações: {e}")
+
+    def close(self):
+        """Stop the writer and flush whatever is still buffered"""
+        if self._writer_task:
+            self._writer_task.cancel()
+            self._writer_task = None
+        batch = self._drain()
+        if batch:
+            self._write_batch(batch)
+
+    def get_stats(self):
+        return {
+            'recorded': self.recorded,
+            'written': self.written,
+            'pending': len(self._pending),
+            'dropped': self.recorded - self.written - len(self._pending),
+            'segments': self.segments,
+            'compression': 'zstd' if zstandard else 'gzip',
+        }
+
+
+_interaction_log = None
+
+def get_interaction_log():
+    """Get the process-wide interaction log"""
+    global _interaction_log
+    if _interaction_log is None:
+        _interaction_log = InteractionLog()
+    return _interaction_log
+
+
+def _open_segment(path):
+    if path.endswith(".zst"):
+        if zstandard is None:
+            raise RuntimeError("zstandard não instalado")
+        raw = open(path, 'rb')
+        stream = zstandard.ZstdDecompressor().stream_reader(raw, read_across_frames=True, closefd=True)
+        return io.TextIOWrapper(stream, encoding='utf-8')
+    return gzip.open(path, 'rt', encoding='utf-8')
+
+def read_entries(directory=None):
+    """Stream every entry of every segment, oldest segment first"""
+    directory = directory or Config.AUDIT_LOG_DIR
+    paths = sorted(glob.glob(os.path.join(directory, "interactions-*.jsonl.*")), key=os.path.getmtime)
+    for path in paths:
+        try:
+            with _open_segment(path) as f:
+                for line in f:
+                    if line.strip():
+                        yield json.loads(line)
+        except (OSError, RuntimeError, ValueError, EOFError) as e:
+            # A segment cut off mid-frame (crash) still yields what came before
+            logger.warning(f"Segmento ignorado ou incompleto {path}: {e}")
+
+def build_report(entries):
+    """Aggregate entries into per-call-site latency, token, fallback and response tier statistics"""
+    sites = {}
+    fallbacks = collections.Counter()
+    tiers = collections.Counter()
+    for entry in entries:
+        if entry['kind'] == 'fallback':
+            fallbacks[(entry.get('category'), entry.get('source'))] += 1
+            continue
+        if entry['kind'] == 'tier':
+            tiers[entry.get('tier')] += 1
+            continue
+        site = sites.setdefault(entry['site'], {
+            'calls': 0, 'outcomes': collections.Counter(), 'latencies': [],
+            'prompt': 0, 'cached': 0, 'output': 0, 'thoughts': 0
+        })
+        site['calls'] += 1
+        site['outcomes'][entry['outcome']] += 1
+        if entry.get('latency_ms') is not None:
+            site['latencies'].append(entry['latency_ms'])
+        for key in ('prompt', 'cached', 'output', 'thoughts'):
+            site[key] += entry.get(f'{key}_tokens') or 0
+    return sites, fallbacks, tiers
+
+def print_report(sites, fallbacks, tiers=None):
+    print(f"{'local':>13} {'chamadas':>8} {'ok':>6} {'falhas':>6} {'p50 ms':>8} {'p95 ms':>8} {'entrada':>8} {'cache':>7} {'saída':>7}")
+    for name, site in sorted(sites.items()):
+        latencies = sorted(site['latencies'])
+        p50 = statistics.median(latencies) if latencies else 0.0
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] if latencies else 0.0
+        ok = site['outcomes'].get('ok', 0)
+        calls = site['calls']
+        print(
+            f"{name:>13} {calls:>8} {ok:>6} {calls - ok:>6} {p50:8.1f} {p95:8.1f} "
+            f"{site['prompt'] / calls:8.1f} {site['cached'] / calls:7.1f} {site['output'] / calls:7.1f}"
+        )
+        failures = {outcome: count for outcome, count in site['outcomes'].items() if outcome != 'ok'}
+        if failures:
+            print(f"{'':>13} {failures}")
+
+    if fallbacks:
+        print("\nrespostas locais (categoria, origem): quantidade")
+        for (category, source), count in fallbacks.most_common():
+            print(f"  {category}, {source}: {count}")
+
+    if tiers:
+        total = sum(tiers.values())
+        saved = tiers.get('reaction', 0) + tiers.get('template', 0)
+        print("\nníveis de resposta em conversas:")
+        for tier in ('reaction', 'template', 'model'):
+            print(f"  {tier}: {tiers.get(tier, 0)}")
+        print(f"  chamadas ao modelo evitadas: {saved} de {total} ({saved / total:.0%})")
+
+
+def main():
+    command = sys.argv[1] if len(sys.argv) > 1 else 'report'
+    directory = sys.argv[2] if len(sys.argv) > 2 else None
+    if command == 'report':
+        print_report(*build_report(read_entries(directory)))
+    elif command == 'dump':
+        for entry in read_entries(directory):
+            print(json.dumps(entry, ensure_ascii=False))
+    else:
+        raise SystemExit("uso: python audit_log.py [report|dump] [diretorio]")
+
+
+if __name__ == "__main__":
+    main()
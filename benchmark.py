@@ -0,0 +1,214 @@
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import time
+from google.genai import types
+from config import Config
+from cassette import Cassette
+from personality_gemini import GeminiPersonalityEngine
+from personality_local import LocalModelPool, LocalPersonalityEngine
+
+class StubModels:
+    """Offline stand-in for client.models that simulates Gemini latency"""
+
+    # Rough per-token costs for a flash model
+    BASE_LATENCY = 0.25
+    OUTPUT_TOKEN_LATENCY = 0.004
+    THOUGHT_TOKEN_LATENCY = 0.002
+    DEFAULT_THINKING = 600
+
+    def __init__(self, seed=42):
+        self._random = random.Random(seed)
+
+    def generate_content(self, model, contents, config=None):
+        max_tokens = config.max_output_tokens if config and config.max_output_tokens else 1000
+        thinking = config.thinking_config if config else None
+        if thinking is None or thinking.thinking_budget is None or thinking.thinking_budget < 0:
+            thoughts = self._random.randint(200, self.DEFAULT_THINKING)
+        else:
+            thoughts = self._random.randint(0, thinking.thinking_budget) if thinking.thinking_budget else 0
+
+        output = min(max_tokens, self._random.randint(20, 120))
+        time.sleep(
+            self.BASE_LATENCY
+            + output * self.OUTPUT_TOKEN_LATENCY
+            + thoughts * self.THOUGHT_TOKEN_LATENCY
+        )
+
+        prompt_tokens = len(str(contents)) // 4
+        if config and config.system_instruction:
+            prompt_tokens += len(str(config.system_instruction)) // 4
+
+        return types.GenerateContentResponse(
+            candidates=[types.Candidate(content=types.Content(
+                role="model", parts=[types.Part(text="Resposta simulada " * max(1, output // 4))]
+            ))],
+            usage_metadata=types.GenerateContentResponseUsageMetadata(
+                prompt_token_count=prompt_tokens,
+                candidates_token_count=output,
+                thoughts_token_count=thoughts,
+                total_token_count=prompt_tokens + output + thoughts,
+            )
+        )
+
+
+class StubClient:
+    def __init__(self, seed=42):
+        self.models = StubModels(seed)
+
+
+def _stub_local_init(*args):
+    pass
+
+def _stub_local_batch(requests):
+    """CPU-bound stand-in for a small quantized model (no llama-cpp needed)"""
+    results = []
+    for prompt, max_tokens, temperature, persona in requests:
+        started = time.perf_counter()
+        output_tokens = min(max_tokens, 40)
+        # Roughly 1ms of pure CPU per generated token
+        deadline = time.process_time() + output_tokens * 0.001
+        while time.process_time() < deadline:
+            pass
+        results.append(("Resposta local simulada", len(prompt) // 4, output_tokens, time.perf_counter() - started))
+    return results
+
+
+# One representative call per generation profile
+PROFILE_CALLS = {
+    'casual': lambda e: e.generate_casual_response("alguém aí jogou o jogo novo? achei muito legal", "Fulano", "Servidor"),
+    'mention': lambda e: e.generate_response("<@123> qual o melhor anime da temporada?", "Fulano", "Servidor"),
+    'roast': lambda e: e.generate_roast("Fulano"),
+    'joke': lambda e: e.generate_joke(),
+    'welcome': lambda e: e.generate_welcome_message("Fulano", "Servidor"),
+}
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+async def benchmark_profiles(engine, iterations=10, profiles=None):
+    """Run every profile against an engine and collect latency and token usage"""
+    results = {}
+    for profile in profiles or PROFILE_CALLS:
+        latencies = []
+        engine.usage.pop(profile, None)
+        for _ in range(iterations):
+            started = time.perf_counter()
+            await PROFILE_CALLS[profile](engine)
+            latencies.append(time.perf_counter() - started)
+
+        usage = engine.usage.get(profile, {})
+        calls = usage.get('calls') or 1
+        results[profile] = {
+            'p50_ms': statistics.median(latencies) * 1000,
+            'p95_ms': _percentile(latencies, 0.95) * 1000,
+            'prompt_tokens': usage.get('prompt', 0) / calls,
+            'output_tokens': usage.get('output', 0) / calls,
+            'thought_tokens': usage.get('thoughts', 0) / calls,
+        }
+    return results
+
+async def benchmark_concurrency(engine, levels=(1, 4, 16), requests_per_level=32, profile='mention'):
+    """Throughput and latency of one profile at several concurrency levels"""
+    results = {}
+    for level in levels:
+        latencies = []
+        semaphore = asyncio.Semaphore(level)
+
+        async def one_request():
+            async with semaphore:
+                started = time.perf_counter()
+                await PROFILE_CALLS[profile](engine)
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one_request() for _ in range(requests_per_level)))
+        elapsed = time.perf_counter() - started
+        results[level] = {
+            'throughput': requests_per_level / elapsed,
+            'p50_ms': statistics.median(latencies) * 1000,
+            'p95_ms': _percentile(latencies, 0.95) * 1000,
+        }
+    return results
+
+def print_concurrency_results(results):
+    print(f"{'concorrência':>12} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8}")
+    for level, row in results.items():
+        print(f"{level:>12} {row['throughput']:8.2f} {row['p50_ms']:8.1f} {row['p95_ms']:8.1f}")
+
+def print_results(results):
+    print(f"{'perfil':>8} {'modelo':>18} {'p50 ms':>8} {'p95 ms':>8} {'entrada':>8} {'saída':>7} {'thinking':>9}")
+    for profile, row in results.items():
+        model = Config.GENERATION_PROFILES[profile]['model']
+        print(
+            f"{profile:>8} {model:>18} {row['p50_ms']:8.1f} {row['p95_ms']:8.1f} "
+            f"{row['prompt_tokens']:8.1f} {row['output_tokens']:7.1f} {row['thought_tokens']:9.1f}"
+        )
+
+def build_engine(backend, cassette_path=None, replay_latency='none', workers=None):
+    """Create an engine wired to the requested backend (benchmark replies never reach the corpus)"""
+    engine = _build_engine(backend, cassette_path, replay_latency, workers)
+    engine.reply_corpus = None
+    return engine
+
+def _build_engine(backend, cassette_path, replay_latency, workers):
+    if backend == 'stub':
+        return GeminiPersonalityEngine(client=StubClient())
+    if backend in ('live', 'record'):
+        if not os.getenv('GEMINI_API_KEY'):
+            raise SystemExit(f"GEMINI_API_KEY é necessário para o backend {backend}")
+        engine = GeminiPersonalityEngine()
+        if backend == 'record':
+            engine.client = Cassette(cassette_path or Config.GEMINI_CASSETTE_PATH, Cassette.RECORD, inner=engine.client)
+        return engine
+    if backend == 'replay':
+        # Offline and reproducible: responses and usage come from a recording
+        return GeminiPersonalityEngine(client=Cassette(
+            cassette_path or Config.GEMINI_CASSETTE_PATH, Cassette.REPLAY, latency=replay_latency
+        ))
+    if backend == 'local':
+        engine = LocalPersonalityEngine()
+        if not engine.has_api:
+            raise SystemExit("Backend local indisponível (llama-cpp-python ou LOCAL_MODEL_PATH)")
+        return engine
+    if backend == 'local-stub':
+        pool = LocalModelPool(workers, generate_fn=_stub_local_batch, initializer=_stub_local_init, initargs=())
+        return LocalPersonalityEngine(pool=pool)
+    raise SystemExit(f"Backend desconhecido: {backend}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark dos perfis de geração")
+    parser.add_argument('--backend', default='stub', help="stub, live, record, replay, local ou local-stub")
+    parser.add_argument('--cassette', help="arquivo de gravação para record/replay")
+    parser.add_argument('--replay-latency', default='none', choices=Cassette.LATENCY_MODES)
+    parser.add_argument('--iterations', type=int, default=10)
+    parser.add_argument('--profile', action='append', choices=list(PROFILE_CALLS))
+    parser.add_argument('--concurrency', help="níveis de concorrência, ex.: 1,4,16")
+    parser.add_argument('--requests', type=int, default=32, help="requisições por nível de concorrência")
+    parser.add_argument('--workers', type=int, help="processos do modelo local (padrão: LOCAL_LLM_WORKERS)")
+    args = parser.parse_args()
+
+    engine = build_engine(args.backend, args.cassette, args.replay_latency, args.workers)
+    asyncio.run(run(engine, args))
+    if isinstance(engine.client, Cassette):
+        if engine.client.mode == Cassette.RECORD:
+            engine.client.save()
+        print(engine.client.get_stats())
+
+async def run(engine, args):
+    if isinstance(engine, LocalPersonalityEngine):
+        # Model loading is not part of the measurement
+        await engine.warmup()
+
+    if args.concurrency:
+        levels = [int(level) for level in args.concurrency.split(',')]
+        profile = args.profile[0] if args.profile else 'mention'
+        print_concurrency_results(await benchmark_concurrency(engine, levels, args.requests, profile))
+    else:
+        print_results(await benchmark_profiles(engine, args.iterations, args.profile))
+
+if __name__ == "__main__":
+    main()
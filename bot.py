@@ -1,19 +1,43 @@
+# Installed first so every following import is timed
+from startup_profile import startup_profile
+startup_profile.install()
+
 import discord
 from discord.ext import commands
 import asyncio
 import logging
 import os
 from config import Config
-from personality_gemini import GeminiPersonalityEngine
+from prompts import TRIGGER_KEYWORDS
 from commands import setup_commands
-from utils import RateLimiter
+from slash_commands import BotCommandTree, setup_slash_commands
+from utils import RateLimiter, setup_logging
+from member_cache import MemberCacheManager
+from welcome import WelcomeBatcher
+from dispatcher import OutboundDispatcher
+from analytics import AnalyticsStore
+from state_backend import get_state_backend
+from participation import ParticipationController
+from response_policy import ResponsePolicy
+from reply_cache import ReplyCache
+from memory_monitor import MemoryMonitor
+from user_profiles import ProfileSummarizer
+from transport import get_shared_transport
+from audit_log import get_interaction_log
+from lifecycle import InFlightTracker, restore_state, save_state, install_signal_handlers
 
 # Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+setup_logging()
 logger = logging.getLogger(__name__)
+startup_profile.mark("módulos carregados")
+
+def create_personality_engine():
+    """Import and build only the configured backend (provider SDKs are slow to import)"""
+    if Config.AI_BACKEND == "local":
+        from personality_local import LocalPersonalityEngine
+        return LocalPersonalityEngine()
+    from personality_gemini import GeminiPersonalityEngine
+    return GeminiPersonalityEngine()
 
 class PortugueseBot(commands.Bot):
     def __init__(self):
@@ -22,23 +46,62 @@ class PortugueseBot(commands.Bot):
         intents.message_content = True
         intents.members = True
         
+        # Member caching strategy (eager chunking or lazy per-guild)
+        member_cache = MemberCacheManager()
+        
+        # Outbound messages go through paced per-channel queues
+        dispatcher = OutboundDispatcher()
+        
         super().__init__(
             command_prefix=Config.COMMAND_PREFIX,
             intents=intents,
-            description="Um bot português engraçado que usa IA para zoar com os membros do servidor!"
+            description="Um bot português engraçado que usa IA para zoar com os membros do servidor!",
+            http_trace=dispatcher.trace_config,
+            tree_cls=BotCommandTree,
+            **member_cache.client_options(intents)
         )
         
+        self.member_cache = member_cache
+        self.dispatcher = dispatcher
+        
         # Initialize components
-        self.personality = GeminiPersonalityEngine()
-        self.rate_limiter = RateLimiter()
+        self.personality = create_personality_engine()
+        # Limits live in Redis when replicas must share them (STATE_BACKEND=redis)
+        self.state = get_state_backend()
+        self.rate_limiter = RateLimiter(self.state if self.state.shared else None)
+        self.welcomer = WelcomeBatcher(self.personality, self.dispatcher)
+        self.analytics = AnalyticsStore()
+        self.participation = ParticipationController()
+        self.response_policy = ResponsePolicy(self.personality)
+        self.reply_cache = ReplyCache()
+        self.memory = MemoryMonitor(self)
+        self.profile_summarizer = ProfileSummarizer(self.personality)
+        self._startup_reported = False
+        
+        # Shutdown protocol: stop intake, finish in-flight replies, hand state over
+        self.accepting = True
+        self.in_flight = InFlightTracker()
+        restore_state(self)
         
     async def setup_hook(self):
         """Called when the bot is starting up"""
         logger.info("Configurando o bot...")
+        startup_profile.mark("setup_hook iniciado")
         
         # Setup commands
         await setup_commands(self)
+        if Config.SLASH_COMMANDS:
+            await setup_slash_commands(self)
+        
+        # Pay connection setup / model loading now instead of on the first user request
+        await self.personality.warmup()
         
+        self.analytics.start()
+        get_interaction_log().start()
+        self.memory.start()
+        self.profile_summarizer.start()
+        
+        startup_profile.mark("setup_hook concluído")
         logger.info("Bot configurado com sucesso!")
     
     async def on_ready(self):
@@ -46,6 +109,12 @@ class PortugueseBot(commands.Bot):
         logger.info(f'{self.user} está online e pronto para zoar!')
         logger.info(f'Bot está em {len(self.guilds)} servidores')
         
+        # on_ready fires again after reconnects; the profile is only for the first boot
+        if startup_profile.enabled and not self._startup_reported:
+            self._startup_reported = True
+            startup_profile.mark("on_ready")
+            startup_profile.report()
+        
         # Set bot status
         activity = discord.Activity(
             type=discord.ActivityType.listening,
@@ -55,15 +124,26 @@ class PortugueseBot(commands.Bot):
     
     async def on_message(self, message):
         """Handle incoming messages"""
-        # Ignore messages from bots
-        if message.author.bot:
+        # Count our own replies for the reply rate, then ignore messages from bots
+        if message.author == self.user:
+            self.analytics.record_reply(message)
+        if message.author.bot or not self.accepting:
             return
         
+        self.analytics.record_message(message)
+        # Channel lines the replies can be grounded on (commands are not context)
+        if message.guild and not message.content.startswith(self.command_prefix):
+            self.personality.remember_channel_message(message.channel.id, message.author.display_name, message.content)
+        
+        # Names seen in chat feed slash command autocomplete
+        self.member_cache.remember(message.author)
+        
         # Process commands first
-        await self.process_commands(message)
+        async with self.in_flight.track():
+            await self.process_commands(message)
         
         # Check if bot was mentioned, called by name, or if it's a DM
-        bot_mentioned = self.user in message.mentions
+        bot_mentioned = self.user in message.mentions or self._replies_to_bot(message)
         is_dm = isinstance(message.channel, discord.DMChannel)
         
         # Check if bot is called by name
@@ -75,39 +155,55 @@ class PortugueseBot(commands.Bot):
             bot_name_mentioned = any(name in message.content.lower() for name in bot_names)
         
         if bot_mentioned or is_dm or bot_name_mentioned:
-            await self.handle_mention_or_dm(message)
+            async with self.in_flight.track():
+                await self.handle_mention_or_dm(message)
         # NEW: Participate in conversations naturally
         elif await self.should_participate_in_conversation(message):
-            await self.participate_in_conversation(message)
+            async with self.in_flight.track():
+                await self.participate_in_conversation(message)
+    
+    def _replies_to_bot(self, message):
+        """Whether the message is a reply to one of the bot's messages (even with the ping turned off)"""
+        reference = message.reference
+        if reference is None or reference.message_id is None:
+            return False
+        if self.reply_cache.is_bot_message(reference.message_id):
+            return True
+        resolved = reference.resolved
+        return isinstance(resolved, discord.Message) and resolved.author == self.user
     
     async def handle_mention_or_dm(self, message):
         """Handle mentions and direct messages"""
         try:
             # Check rate limiting
-            if not self.rate_limiter.check_user(message.author.id):
-                await message.reply("Calma aí, amigão! Você está falando muito rápido. Espera um pouquinho! 😅")
+            if not await self.rate_limiter.allow(message.author.id):
+                self.dispatcher.reply(message, "Calma aí, amigão! Você está falando muito rápido. Espera um pouquinho! 😅")
                 return
             
             # Show typing indicator
             async with message.channel.typing():
+                # A reply carries the chain it points to, rebuilt mostly from memory
+                reply_chain = await self.reply_cache.build_chain(message, self.user) if message.reference else None
+                
                 # Generate response using personality engine
                 response = await self.personality.generate_response(
                     message.content,
                     message.author.display_name,
-                    message.guild.name if message.guild else "DM"
+                    message.guild.name if message.guild else "DM",
+                    channel_id=message.channel.id if message.guild else None,
+                    reply_chain=reply_chain,
+                    user_id=message.author.id
                 )
                 
-                # Send response
-                await message.reply(response)
+                # Queue response; typing stops as soon as generation is done
+                self.reply_cache.track(self.dispatcher.reply(message, response), message)
                 
         except Exception as e:
             logger.error(f"Erro ao processar mensagem: {e}")
-            await message.reply("Ops! Algo deu errado na minha cabeça. Tenta de novo! 🤖💥")
+            self.dispatcher.reply(message, "Ops! Algo deu errado na minha cabeça. Tenta de novo! 🤖💥")
     
     async def should_participate_in_conversation(self, message):
         """Determine if the bot should participate in this conversation"""
-        import random
-        
         # Don't participate if it's a command
         if message.content.startswith(self.command_prefix):
             return False
@@ -116,32 +212,40 @@ class PortugueseBot(commands.Bot):
         if len(message.content.strip()) < 10:
             return False
         
-        # Higher chance for questions
-        if '?' in message.content:
-            return random.random() < (Config.CASUAL_PARTICIPATION_RATE * 2)  # 2x rate for questions
-        
-        # Keywords that trigger participation
-        trigger_keywords = [
-            'alguém', 'algum', 'opinião', 'acham', 'pensam', 'sabem', 'conhecem',
-            'ajuda', 'dica', 'sugestão', 'recomenda', 'indica', 'melhor',
-            'pior', 'legal', 'massa', 'dahora', 'top', 'ruim', 'chato',
-            'game', 'jogo', 'filme', 'série', 'música', 'comida', 'anime',
-            'python', 'código', 'programação', 'tech', 'ia', 'ai', 'bot',
-            'engraçado', 'funny', 'piada', 'meme', 'rir', 'kkkk', 'haha'
-        ]
-        
+        # Questions and trigger keywords weigh more than general chatter;
+        # the controller sets the base rate from the channel's traffic
         message_lower = message.content.lower()
-        if any(keyword in message_lower for keyword in trigger_keywords):
-            return random.random() < Config.CASUAL_PARTICIPATION_RATE  # Configurable rate
-        
-        # Random participation for general messages
-        return random.random() < (Config.CASUAL_PARTICIPATION_RATE * 0.3)  # Lower rate for general messages
+        if '?' in message.content:
+            weight = 2.0
+        elif any(keyword in message_lower for keyword in TRIGGER_KEYWORDS):
+            weight = 1.0
+        else:
+            weight = 0.3
+        return self.participation.should_participate(message.channel.id, weight)
     
     async def participate_in_conversation(self, message):
         """Participate naturally in conversations"""
         try:
             # Check rate limiting (more lenient for natural participation)
-            if not self.rate_limiter.check_user(message.author.id):
+            if not await self.rate_limiter.allow(message.author.id):
+                return
+            
+            # Cheapest tiers first: a reaction or a local reply skip the model
+            tier, emoji = self.response_policy.choose(message.content)
+            if tier == ResponsePolicy.REACTION:
+                try:
+                    await message.add_reaction(emoji)
+                except discord.HTTPException as e:
+                    logger.warning(f"Erro ao reagir à mensagem: {e}")
+                    return
+                # A reaction is a participation too; the controller must see it
+                self.participation.record_reply(message.channel.id)
+                return
+            if tier == ResponsePolicy.TEMPLATE:
+                response = self.response_policy.template_reply(message.content)
+                if response:
+                    self.reply_cache.track(self.dispatcher.reply(message, response), message)
+                    self.participation.record_reply(message.channel.id)
                 return
             
             # Show typing indicator
@@ -150,48 +254,65 @@ class PortugueseBot(commands.Bot):
                 response = await self.personality.generate_casual_response(
                     message.content,
                     message.author.display_name,
-                    message.guild.name if message.guild else "DM"
+                    message.guild.name if message.guild else "DM",
+                    channel_id=message.channel.id,
+                    user_id=message.author.id
                 )
                 
                 if response:
-                    await message.reply(response)
+                    self.reply_cache.track(self.dispatcher.reply(message, response), message)
+                    self.participation.record_reply(message.channel.id)
                     
         except Exception as e:
             logger.error(f"Erro ao participar da conversa: {e}")
     
+    async def on_guild_remove(self, guild):
+        """Forget per-guild state when the bot leaves a server"""
+        self.member_cache.forget_guild(guild.id)
+        self.welcomer.invalidate_channel(guild.id)
+        self.analytics.forget_guild(guild.id)
+        for channel in guild.channels:
+            self.participation.forget_channel(channel.id)
+            self.personality.channel_context.forget_channel(channel.id)
+    
+    async def on_guild_update(self, before, after):
+        """Refresh the welcome channel if the system channel changed"""
+        if before.system_channel != after.system_channel:
+            self.welcomer.invalidate_channel(after.id)
+    
+    async def on_guild_channel_create(self, channel):
+        self.welcomer.invalidate_channel(channel.guild.id)
+    
+    async def on_guild_channel_delete(self, channel):
+        self.welcomer.invalidate_channel(channel.guild.id)
+        self.participation.forget_channel(channel.id)
+        self.personality.channel_context.forget_channel(channel.id)
+    
+    async def on_guild_channel_update(self, before, after):
+        if before.name != after.name:
+            self.welcomer.invalidate_channel(after.guild.id)
+    
     async def on_member_join(self, member):
-        """Welcome new members with a funny message"""
-        try:
-            # Find system channel or general channel
-            channel = member.guild.system_channel
-            if not channel:
-                # Try to find a general channel
-                for ch in member.guild.text_channels:
-                    if 'geral' in ch.name.lower() or 'general' in ch.name.lower():
-                        channel = ch
-                        break
-            
-            if channel:
-                welcome_msg = await self.personality.generate_welcome_message(
-                    member.display_name,
-                    member.guild.name
-                )
-                await channel.send(welcome_msg)
-                
-        except Exception as e:
-            logger.error(f"Erro ao dar boas-vindas: {e}")
+        """Welcome new members with a funny message (batched during join bursts)"""
+        self.member_cache.remember(member)
+        self.welcomer.add_member(member)
+    
+    async def on_raw_member_remove(self, payload):
+        self.member_cache.names.remove(payload.guild_id, payload.user.id)
     
     async def on_command_error(self, ctx, error):
         """Handle command errors"""
         if isinstance(error, commands.CommandNotFound):
-            await ctx.reply("Esse comando não existe, meu chapa! Use `!help` para ver os comandos disponíveis. 🤔")
+            self.dispatcher.reply(ctx.message, "Esse comando não existe, meu chapa! Use `!help` para ver os comandos disponíveis. 🤔")
         elif isinstance(error, commands.MissingRequiredArgument):
-            await ctx.reply("Faltou alguma coisa aí! Verifica os argumentos do comando. 😉")
+            self.dispatcher.reply(ctx.message, "Faltou alguma coisa aí! Verifica os argumentos do comando. 😉")
+        elif isinstance(error, commands.NotOwner):
+            self.dispatcher.reply(ctx.message, "Esse comando é só pro dono do bot! 🔒")
         elif isinstance(error, commands.CommandOnCooldown):
-            await ctx.reply(f"Calma aí! Espera mais {error.retry_after:.1f} segundos. ⏰")
+            self.dispatcher.reply(ctx.message, f"Calma aí! Espera mais {error.retry_after:.1f} segundos. ⏰")
         else:
             logger.error(f"Erro em comando: {error}")
-            await ctx.reply("Deu ruim aqui! Tenta de novo mais tarde. 🛠️")
+            self.dispatcher.reply(ctx.message, "Deu ruim aqui! Tenta de novo mais tarde. 🛠️")
 
 async def main():
     """Main function to run the bot"""
@@ -202,6 +323,8 @@ async def main():
     
     # Create and run bot
     bot = PortugueseBot()
+    startup_profile.mark("bot criado")
+    install_signal_handlers(bot)
     
     try:
         await bot.start(Config.DISCORD_TOKEN)
@@ -210,7 +333,16 @@ async def main():
     except Exception as e:
         logger.error(f"Erro ao iniciar o bot: {e}")
     finally:
+        if bot.accepting:
+            # Not a graceful shutdown (crash or login failure); keep what we can
+            save_state(bot)
         await bot.close()
+        bot.analytics.save()
+        if bot.personality.reply_corpus:
+            bot.personality.reply_corpus.flush()
+        get_interaction_log().close()
+        await bot.state.close()
+        get_shared_transport().close()
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -0,0 +1,172 @@
+import atexit
+import hashlib
+import json
+import logging
+import os
+import random
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+
+class CassetteMiss(KeyError):
+    """A replayed request was never recorded"""
+
+
+def request_fingerprint(model, contents, config=None):
+    """Stable key for a generate_content request
+
+    The persona system instruction is left out, so recordings keep replaying
+    after persona edits.
+    """
+    thinking = config.thinking_config if config else None
+    key = {
+        'model': model,
+        'contents': contents if isinstance(contents, str) else str(contents),
+        'max_output_tokens': config.max_output_tokens if config else None,
+        'temperature': config.temperature if config else None,
+        'thinking_budget': thinking.thinking_budget if thinking else None,
+    }
+    return hashlib.sha256(json.dumps(key, sort_keys=True, ensure_ascii=False).encode()).hexdigest()
+
+
+class CassetteModels:
+    """client.models stand-in that records live responses or replays them"""
+
+    def __init__(self, cassette):
+        self._cassette = cassette
+
+    def generate_content(self, model, contents, config=None):
+        fingerprint = request_fingerprint(model, contents, config)
+        if self._cassette.mode == Cassette.RECORD:
+            started = time.perf_counter()
+            response = self._cassette.inner.models.generate_content(model=model, contents=contents, config=config)
+            self._cassette.add(fingerprint, model, response, time.perf_counter() - started)
+            return response
+        return self._cassette.replay(fingerprint, model)
+
+
+class Cassette:
+    """Record/replay wrapper with the shape of a genai client"""
+
+    RECORD = "record"
+    REPLAY = "replay"
+
+    # Replay latency: none, the latency recorded for that response, or a
+    # sample from every latency recorded for the model
+    LATENCY_MODES = ("none", "recorded", "sampled")
+
+    def __init__(self, path, mode, inner=None, latency="none", seed=42):
+        if mode not in (self.RECORD, self.REPLAY):
+            raise ValueError(f"modo de cassete desconhecido: {mode}")
+        if mode == self.RECORD and inner is None:
+            raise ValueError("o modo record precisa de um cliente real")
+        if latency not in self.LATENCY_MODES:
+            raise ValueError(f"latência de replay desconhecida: {latency}")
+
+        self.path = path
+        self.mode = mode
+        self.inner = inner
+        self.latency = latency
+        self.models = CassetteModels(self)
+        # Replay never touches the network, so there is nothing to pre-connect
+        self.offline = mode == self.REPLAY
+
+        self._lock = threading.Lock()
+        self._random = random.Random(seed)
+        self._positions = {}  # fingerprint -> next recording to replay
+        self._latencies = {}  # model -> every recorded latency, for sampled replay
+        self.entries = {}  # fingerprint -> [recording, ...]
+        self.hits = 0
+        self.misses = 0
+        self.load()
+        if mode == self.RECORD:
+            atexit.register(self.save)
+
+    def load(self):
+        if not os.path.exists(self.path):
+            if self.mode == self.REPLAY:
+                raise FileNotFoundError(f"cassete não encontrado: {self.path}")
+            return
+        with open(self.path, encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('version') != FORMAT_VERSION:
+            raise ValueError(f"versão de cassete incompatível: {data.get('version')}")
+        self.entries = data['entries']
+        logger.info(f"Cassete carregado: {sum(len(v) for v in self.entries.values())} respostas de {self.path}")
+
+    def save(self):
+        tmp_path = self.path + ".tmp"
+        with self._lock:
+            data = {'version': FORMAT_VERSION, 'entries': self.entries}
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.path)
+
+    def add(self, fingerprint, model, response, latency):
+        usage = response.usage_metadata
+        recording = {
+            'model': model,
+            'text': response.text,
+            'latency': round(latency, 4),
+            'prompt_tokens': usage.prompt_token_count if usage else None,
+            'cached_tokens': usage.cached_content_token_count if usage else None,
+            'output_tokens': usage.candidates_token_count if usage else None,
+            'thoughts_tokens': usage.thoughts_token_count if usage else None,
+        }
+        with self._lock:
+            self.entries.setdefault(fingerprint, []).append(recording)
+
+    def replay(self, fingerprint, model):
+        with self._lock:
+            recordings = self.entries.get(fingerprint)
+            if not recordings:
+                self.misses += 1
+                raise CassetteMiss(fingerprint)
+            # Cycle through every recording of a repeated request
+            position = self._positions.get(fingerprint, 0)
+            self._positions[fingerprint] = position + 1
+            recording = recordings[position % len(recordings)]
+            self.hits += 1
+            delay = self._replay_delay(recording, model)
+
+        if delay:
+            time.sleep(delay)
+        return self._build_response(recording)
+
+    def _replay_delay(self, recording, model):
+        if self.latency == "recorded":
+            return recording['latency']
+        if self.latency == "sampled":
+            latencies = self._latencies.get(model)
+            if latencies is None:
+                latencies = self._latencies[model] = [
+                    r['latency'] for rs in self.entries.values() for r in rs if r['model'] == model
+                ]
+            return self._random.choice(latencies)
+        return 0.0
+
+    @staticmethod
+    def _build_response(recording):
+        from google.genai import types
+        return types.GenerateContentResponse(
+            candidates=[types.Candidate(content=types.Content(
+                role="model", parts=[types.Part(text=recording['text'] or "")]
+            ))],
+            usage_metadata=types.GenerateContentResponseUsageMetadata(
+                prompt_token_count=recording['prompt_tokens'],
+                cached_content_token_count=recording['cached_tokens'],
+                candidates_token_count=recording['output_tokens'],
+                thoughts_token_count=recording['thoughts_tokens'],
+            )
+        )
+
+    def get_stats(self):
+        return {
+            'mode': self.mode,
+            'recordings': sum(len(v) for v in self.entries.values()),
+            'hits': self.hits,
+            'misses': self.misses,
+        }
@@ -0,0 +1,104 @@
+import logging
+import time
+from config import Config
+from utils import ErrorHandler
+
+logger = logging.getLogger(__name__)
+
+class CircuitBreaker:
+    """Stops calling a failing model provider and lets probes test recovery"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name, failure_threshold=None, recovery_time=None, quota_recovery_time=None):
+        self.name = name
+        self.failure_threshold = failure_threshold or Config.BREAKER_FAILURE_THRESHOLD
+        self.recovery_time = recovery_time or Config.BREAKER_RECOVERY_TIME
+        self.quota_recovery_time = quota_recovery_time or Config.BREAKER_QUOTA_RECOVERY_TIME
+
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.open_for = 0.0
+        self.open_reason = None
+        self._probe_in_flight = False
+
+        self.short_circuited = 0
+        self.failures_by_category = {}
+
+    def allow_request(self):
+        """Check if a call may go to the provider right now"""
+        if self.state == self.CLOSED:
+            return True
+
+        if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.open_for:
+            self.state = self.HALF_OPEN
+            logger.info(f"Circuito {self.name} meio aberto, testando recuperação")
+
+        # Half open: a single probe at a time, everyone else gets the fallback
+        if self.state == self.HALF_OPEN and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+
+        self.short_circuited += 1
+        return False
+
+    def release_probe(self):
+        """Give the half-open probe back when its call ended without an outcome (e.g. cancelled)"""
+        if self.state == self.HALF_OPEN:
+            self._probe_in_flight = False
+
+    def record_success(self):
+        if self.state != self.CLOSED:
+            logger.info(f"Circuito {self.name} fechado, provedor recuperado")
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.open_reason = None
+        self._probe_in_flight = False
+
+    def record_failure(self, error):
+        """Count a failed call; quota and auth errors open the circuit at once"""
+        category = ErrorHandler.classify_error(error)
+        self.failures_by_category[category] = self.failures_by_category.get(category, 0) + 1
+
+        # A bad request says nothing about the provider's health
+        if category == "invalid":
+            self._probe_in_flight = False
+            return
+
+        self.consecutive_failures += 1
+
+        if category in ("quota", "auth"):
+            self._open(category, self.quota_recovery_time)
+        elif self.state == self.HALF_OPEN:
+            # Failed probe: back off a little longer each time
+            self._open(category, min(self.open_for * 2, self.quota_recovery_time))
+        elif self.consecutive_failures >= self.failure_threshold:
+            self._open(category, self.recovery_time)
+        else:
+            self._probe_in_flight = False
+
+    def _open(self, reason, duration):
+        if self.state != self.OPEN:
+            logger.warning(f"Circuito {self.name} aberto ({reason}) por {duration:.0f}s")
+        self.state = self.OPEN
+        self.opened_at = time.monotonic()
+        self.open_for = duration
+        self.open_reason = reason
+        self._probe_in_flight = False
+
+    def get_stats(self):
+        """Get circuit breaker state"""
+        retry_in = 0.0
+        if self.state == self.OPEN:
+            retry_in = max(0.0, self.open_for - (time.monotonic() - self.opened_at))
+        return {
+            'state': self.state,
+            'reason': self.open_reason,
+            'retry_in': round(retry_in, 1),
+            'consecutive_failures': self.consecutive_failures,
+            'short_circuited': self.short_circuited,
+            'failures_by_category': dict(self.failures_by_category),
+        }
@@ -0,0 +1,91 @@
+"""Texts and cooldowns of the fun commands, shared by every way of invoking them
+
+Kept free of import side effects so the HTTP interactions endpoint can use
+the same commands without loading the gateway bot.
+"""
+import logging
+import random
+
+logger = logging.getLogger(__name__)
+
+FALLBACK_ROASTS = [
+    "{mention} Você é legal, mas sua internet não! 😂",
+    "{mention} Parece que seu Wi-Fi é pior que minha IA! 🤖",
+    "{mention} Sua conexão deve estar pior que meu senso de humor! 📡"
+]
+
+FALLBACK_JOKES = [
+    "Por que o bot cruzou a estrada? Para chegar do outro lado do servidor! 🤖",
+    "Qual é o cúmulo da preguiça? Usar um bot para contar piadas! 😂",
+    "Minha IA está com bug, mas meu humor está funcionando! 🔧"
+]
+
+FALLBACK_COMPLIMENTS = [
+    "{mention} Você é quase tão legal quanto eu! 🤖",
+    "{mention} Sua existência torna este servidor 3% melhor! 📈",
+    "{mention} Você é a prova de que até humanos podem ser legais! 👨‍💻"
+]
+
+# Shared by the prefix and slash versions of each command
+
+# (uses, seconds) per user; also used by the slash commands and the HTTP endpoint
+COMMAND_COOLDOWNS = {
+    'zoa': (1, 10),
+    'piada': (1, 5),
+    'elogio': (1, 15),
+    'conversa': (2, 30),
+}
+
+def cooldown_key(name, user_id):
+    """One bucket per command and user, whichever way the command was invoked"""
+    return f"cooldown:{name}:{user_id}"
+
+async def roast_text(bot, target_user):
+    """Roast for a member, falling back to canned lines"""
+    try:
+        if bot.personality.has_api and bot.personality.client:
+            roast = await bot.personality.generate_roast(target_user.display_name)
+            if roast:
+                return f"{target_user.mention} {roast}"
+    except Exception as e:
+        logger.error(f"Erro no comando zoa: {e}")
+    return random.choice(FALLBACK_ROASTS).format(mention=target_user.mention)
+
+async def joke_text(bot):
+    """Joke from the model, falling back to canned jokes"""
+    try:
+        if bot.personality.has_api and bot.personality.client:
+            joke = await bot.personality.generate_joke()
+            if joke:
+                return f"🎭 {joke}"
+    except Exception as e:
+        logger.error(f"Erro no comando piada: {e}")
+    return random.choice(FALLBACK_JOKES)
+
+async def compliment_text(bot, target_user):
+    """Compliment for a member (sometimes a backhanded one)"""
+    try:
+        # Sometimes make it a backhanded compliment
+        is_backhanded = random.random() < 0.3
+        
+        if bot.personality.has_api and bot.personality.client:
+            compliment = await bot.personality.generate_compliment(
+                target_user.display_name,
+                backhanded=is_backhanded
+            )
+            if compliment:
+                return f"{target_user.mention} {compliment}"
+    except Exception as e:
+        logger.error(f"Erro no comando elogio: {e}")
+    return random.choice(FALLBACK_COMPLIMENTS).format(mention=target_user.mention)
+
+async def conversation_text(bot, topic):
+    """Conversation starter about a topic"""
+    try:
+        if bot.personality.has_api and bot.personality.client:
+            conversation_starter = await bot.personality.generate_conversation_starter(topic)
+            if conversation_starter:
+                return f"💬 {conversation_starter}"
+    except Exception as e:
+        logger.error(f"Erro no comando conversa: {e}")
+    return f"Hmm, {topic}? Interessante! O que vocês acham sobre isso? Alguém aí manja? 🤔"
@@ -1,17 +1,150 @@
 import discord
 from discord.ext import commands
-import random
+import io
 import asyncio
-from personality import PersonalityEngine
+import time
+from transport import get_shared_transport
 import logging
+from memory_monitor import format_size
+from state_backend import get_state_backend
+from profiler import SamplingProfiler
+from config import Config
+from command_text import (
+    COMMAND_COOLDOWNS, cooldown_key, roast_text, joke_text, compliment_text, conversation_text
+)
 
 logger = logging.getLogger(__name__)
 
+def shared_cooldown(name):
+    """commands.cooldown with the bucket in the state backend, so replicas share it"""
+    rate, per = COMMAND_COOLDOWNS[name]
+    
+    async def predicate(ctx):
+        retry_after = await get_state_backend().take(cooldown_key(name, ctx.author.id), rate, per)
+        if retry_after:
+            raise commands.CommandOnCooldown(commands.Cooldown(rate, per), retry_after, commands.BucketType.user)
+        return True
+    return commands.check(predicate)
+
+def build_status_embed(bot):
+    """Embed with the bot's current statistics"""
+    embed = discord.Embed(
+        title="🤖 Status do Bot Zoeiro",
+        color=0x00ff00,
+        description="Um bot português que usa IA para zoar com vocês!"
+    )
+    
+    embed.add_field(
+        name="📊 Estatísticas",
+        value=f"Servidores: {len(bot.guilds)}\nUsuários: {bot.member_cache.member_count(bot.guilds)}",
+        inline=True
+    )
+    
+    breaker_stats = bot.personality.breaker.get_stats()
+    http_stats = get_shared_transport().get_stats()
+    embed.add_field(
+        name="🧠 IA",
+        value=(
+            f"Powered by {bot.personality.backend_name}\nCircuito: {breaker_stats['state']}\n"
+            f"Conexões reusadas: {http_stats['reuse_rate']:.0%}"
+        ),
+        inline=True
+    )
+    
+    welcome_stats = bot.welcomer.get_stats()
+    embed.add_field(
+        name="👋 Boas-vindas",
+        value=f"Entradas: {welcome_stats['joins']}\nMensagens economizadas: {welcome_stats['sends_saved']}",
+        inline=True
+    )
+    
+    dispatch_stats = bot.dispatcher.get_stats()
+    embed.add_field(
+        name="📤 Envios",
+        value=f"Fila: {dispatch_stats['queue_depth']}\nMescladas: {dispatch_stats['merged']}\n429s: {dispatch_stats['rate_limited']}",
+        inline=True
+    )
+    
+    reply_stats = bot.reply_cache.get_stats()
+    embed.add_field(
+        name="🧵 Respostas encadeadas",
+        value=(
+            f"Em memória: {reply_stats['entries']}\n"
+            f"Acertos: {reply_stats['hit_rate']:.0%}\nBuscas na API: {reply_stats['fetches']}"
+        ),
+        inline=True
+    )
+    
+    tier_stats = bot.response_policy.get_stats()
+    embed.add_field(
+        name="🪙 Níveis de resposta",
+        value=(
+            f"Reações: {tier_stats['reaction']}\nRespostas locais: {tier_stats['template']}\n"
+            f"IA: {tier_stats['model']}\nChamadas evitadas: {tier_stats['model_calls_saved']} ({tier_stats['saved_rate']:.0%})"
+        ),
+        inline=True
+    )
+    
+    participation_stats = bot.participation.get_stats()
+    embed.add_field(
+        name="🎚️ Participação",
+        value=(
+            f"Respostas/hora: {participation_stats['replies_per_hour']:.1f} de {participation_stats['global_budget_per_hour']:g}\n"
+            f"Canais: {participation_stats['channels']}\nFator global: {participation_stats['global_factor']:.0%}"
+        ),
+        inline=True
+    )
+    
+    embed.add_field(
+        name="⚡ Comandos",
+        value="`!zoa` - Zoa alguém\n`!piada` - Conta piada\n`!elogio` - Faz elogio\n`!help` - Ajuda\nTambém disponíveis como `/` comandos",
+        inline=False
+    )
+    
+    embed.set_footer(text="Feito com 💙 e muito café ☕")
+    return embed
+
+def build_stats_embed(bot, guild, channel=None):
+    """Embed with the server's activity sketches"""
+    summary = bot.analytics.summary(guild.id)
+    embed = discord.Embed(title=f"📈 Estatísticas de {guild.name}", color=0x3498db)
+    if not summary:
+        embed.description = "Ainda não vi ninguém conversando por aqui! 🦗"
+        return embed
+    
+    embed.add_field(
+        name="👥 Atividade",
+        value=(
+            f"Usuários ativos: ~{summary['active_users']}\n"
+            f"Mensagens/hora: {summary['messages_per_hour']:.1f}\n"
+            f"Taxa de respostas do bot: {summary['reply_rate']:.0%}"
+        ),
+        inline=True
+    )
+    keywords = "\n".join(f"`{word}` ~{count}" for word, count in summary['top_keywords']) or "Nenhum ainda"
+    embed.add_field(name="🔥 Assuntos", value=keywords, inline=True)
+    channels = "\n".join(f"#{name}: {rate:.1f}/h" for name, rate in summary['busiest_channels']) or "Nenhum ainda"
+    embed.add_field(name="📢 Canais mais movimentados", value=channels, inline=False)
+    
+    participation = bot.participation.channel_state(channel.id) if channel else None
+    if participation:
+        embed.add_field(
+            name=f"🎚️ Participação em #{channel.name}",
+            value=(
+                f"Mensagens/hora: {participation['messages_per_hour']:.1f}\n"
+                f"Respostas/hora: {participation['replies_per_hour']:.1f} (alvo {bot.participation.target:g})\n"
+                f"Chance atual: {participation['probability']:.1%} (ganho {participation['gain']:.2f})"
+            ),
+            inline=False
+        )
+    embed.set_footer(text="Valores aproximados, sem guardar mensagens")
+    return embed
+
 async def setup_commands(bot):
     """Setup all bot commands"""
     
     @bot.command(name='zoa', aliases=['zoar'])
-    @commands.cooldown(1, 10, commands.BucketType.user)
+    @shared_cooldown('zoa')
     async def mock_user(ctx, *, target=None):
         """Zoa um usuário específico ou aleatório"""
         if target:
@@ -20,99 +153,27 @@ async def setup_commands(bot):
                 target_user = ctx.message.mentions[0]
             else:
                 # Try to find by name
-                target_user = discord.utils.find(
-                    lambda m: target.lower() in m.display_name.lower(), 
-                    ctx.guild.members
-                )
+                target_user = await bot.member_cache.find_member(ctx.guild, target)
         else:
             # Random user from server
-            target_user = random.choice([m for m in ctx.guild.members if not m.bot])
+            target_user = await bot.member_cache.random_member(ctx.guild)
         
         if not target_user:
-            await ctx.reply("Não achei essa pessoa! Você inventou? 🤔")
+            bot.dispatcher.reply(ctx.message, "Não achei essa pessoa! Você inventou? 🤔")
             return
         
-        try:
-            async with ctx.typing():
-                prompt = f"""
-                Faça uma zoação amigável e engraçada sobre {target_user.display_name}.
-                Seja criativo mas respeitoso. Use humor brasileiro.
-                Máximo 2 frases.
-                """
-                
-                if bot.personality.has_api and bot.personality.client:
-                    response = bot.personality.client.models.generate_content(
-                        model="gemini-2.5-flash",
-                        contents=f"""
-                        Faça uma zoação amigável e engraçada sobre {target_user.display_name}.
-                        Seja criativo mas respeitoso. Use humor brasileiro.
-                        Máximo 2 frases. Fale português do Brasil.
-                        """
-                    )
-                    roast = response.text.strip() if response.text else None
-                else:
-                    roast = None
-                
-                if roast:
-                    await ctx.reply(f"{target_user.mention} {roast}")
-                else:
-                    # Fallback responses
-                    fallback_roasts = [
-                        f"{target_user.mention} Você é legal, mas sua internet não! 😂",
-                        f"{target_user.mention} Parece que seu Wi-Fi é pior que minha IA! 🤖",
-                        f"{target_user.mention} Sua conexão deve estar pior que meu senso de humor! 📡"
-                    ]
-                    await ctx.reply(random.choice(fallback_roasts))
-                
-        except Exception as e:
-            logger.error(f"Erro no comando zoa: {e}")
-            fallback_roasts = [
-                f"{target_user.mention} Você é legal, mas sua internet não! 😂",
-                f"{target_user.mention} Parece que seu Wi-Fi é pior que minha IA! 🤖",
-                f"{target_user.mention} Sua conexão deve estar pior que meu senso de humor! 📡"
-            ]
-            await ctx.reply(random.choice(fallback_roasts))
+        async with ctx.typing():
+            bot.dispatcher.reply(ctx.message, await roast_text(bot, target_user))
     
     @bot.command(name='piada', aliases=['joke'])
-    @commands.cooldown(1, 5, commands.BucketType.user)
+    @shared_cooldown('piada')
     async def tell_joke(ctx):
         """Conta uma piada"""
-        try:
-            async with ctx.typing():
-                if bot.personality.has_api and bot.personality.client:
-                    response = bot.personality.client.models.generate_content(
-                        model="gemini-2.5-flash",
-                        contents="""
-                        Conte uma piada curta e engraçada em português brasileiro.
-                        Pode ser sobre tecnologia, games, ou cotidiano.
-                        Máximo 3 frases. Fale português do Brasil.
-                        """
-                    )
-                    joke = response.text.strip() if response.text else None
-                else:
-                    joke = None
-                
-                if joke:
-                    await ctx.reply(f"🎭 {joke}")
-                else:
-                    fallback_jokes = [
-                        "Por que o bot cruzou a estrada? Para chegar do outro lado do servidor! 🤖",
-                        "Qual é o cúmulo da preguiça? Usar um bot para contar piadas! 😂",
-                        "Minha IA está com bug, mas meu humor está funcionando! 🔧"
-                    ]
-                    await ctx.reply(random.choice(fallback_jokes))
-                
-        except Exception as e:
-            logger.error(f"Erro no comando piada: {e}")
-            fallback_jokes = [
-                "Por que o bot cruzou a estrada? Para chegar do outro lado do servidor! 🤖",
-                "Qual é o cúmulo da preguiça? Usar um bot para contar piadas! 😂",
-                "Minha IA está com bug, mas meu humor está funcionando! 🔧"
-            ]
-            await ctx.reply(random.choice(fallback_jokes))
+        async with ctx.typing():
+            bot.dispatcher.reply(ctx.message, await joke_text(bot))
     
     @bot.command(name='elogio', aliases=['compliment'])
-    @commands.cooldown(1, 15, commands.BucketType.user)
+    @shared_cooldown('elogio')
     async def compliment_user(ctx, *, target=None):
         """Faz um elogio (às vezes meio zoeiro)"""
         target_user = ctx.author
@@ -121,115 +182,103 @@ async def setup_commands(bot):
             if ctx.message.mentions:
                 target_user = ctx.message.mentions[0]
             else:
-                target_user = discord.utils.find(
-                    lambda m: target.lower() in m.display_name.lower(), 
-                    ctx.guild.members
-                )
+                target_user = await bot.member_cache.find_member(ctx.guild, target)
         
         if not target_user:
             target_user = ctx.author
         
-        try:
-            async with ctx.typing():
-                # Sometimes make it a backhanded compliment
-                is_backhanded = random.random() < 0.3
-                
-                if bot.personality.has_api and bot.personality.client:
-                    response = bot.personality.client.models.generate_content(
-                        model="gemini-2.5-flash",
-                        contents=f"""
-                        Faça um {'elogio meio duvidoso e engraçado' if is_backhanded else 'elogio genuíno mas divertido'} 
-                        para {target_user.display_name}.
-                        Seja criativo e use humor brasileiro.
-                        Máximo 2 frases. Fale português do Brasil.
-                        """
-                    )
-                    compliment = response.text.strip() if response.text else None
-                else:
-                    compliment = None
-                
-                if compliment:
-                    await ctx.reply(f"{target_user.mention} {compliment}")
-                else:
-                    fallback_compliments = [
-                        f"{target_user.mention} Você é quase tão legal quanto eu! 🤖",
-                        f"{target_user.mention} Sua existência torna este servidor 3% melhor! 📈",
-                        f"{target_user.mention} Você é a prova de que até humanos podem ser legais! 👨‍💻"
-                    ]
-                    await ctx.reply(random.choice(fallback_compliments))
-                
-        except Exception as e:
-            logger.error(f"Erro no comando elogio: {e}")
-            fallback_compliments = [
-                f"{target_user.mention} Você é quase tão legal quanto eu! 🤖",
-                f"{target_user.mention} Sua existência torna este servidor 3% melhor! 📈",
-                f"{target_user.mention} Você é a prova de que até humanos podem ser legais! 👨‍💻"
-            ]
-            await ctx.reply(random.choice(fallback_compliments))
+        async with ctx.typing():
+            bot.dispatcher.reply(ctx.message, await compliment_text(bot, target_user))
     
     @bot.command(name='status', aliases=['info'])
     async def bot_status(ctx):
         """Mostra informações sobre o bot"""
-        embed = discord.Embed(
-            title="🤖 Status do Bot Zoeiro",
-            color=0x00ff00,
-            description="Um bot português que usa IA para zoar com vocês!"
-        )
+        await ctx.reply(embed=build_status_embed(bot))
+    
+    @bot.command(name='stats', aliases=['estatisticas'])
+    @commands.guild_only()
+    async def server_stats(ctx):
+        """Mostra estatísticas de atividade do servidor"""
+        await ctx.reply(embed=build_stats_embed(bot, ctx.guild, ctx.channel))
+    
+    @bot.command(name='memoria', aliases=['memory'], hidden=True)
+    @commands.is_owner()
+    async def memory_report(ctx, limit: int = 10):
+        """Mostra uso de memória e os pontos que mais cresceram (só o dono)"""
+        if not bot.memory.tracing:
+            bot.memory.start_tracing()
+            bot.dispatcher.reply(ctx.message, "Rastreamento de memória iniciado! Roda de novo daqui a pouco pra ver o crescimento. 🔍")
+            return
+        
+        stats = bot.memory.get_stats()
+        sizes = bot.memory.structure_sizes()
+        # Snapshots walk every traced block; keep that off the event loop
+        growth = await asyncio.to_thread(bot.memory.top_growth, limit)
         
+        embed = discord.Embed(title="🧠 Memória", color=0x9b59b6)
         embed.add_field(
-            name="📊 Estatísticas",
-            value=f"Servidores: {len(bot.guilds)}\nUsuários: {len(set(bot.get_all_members()))}",
-            inline=True
+            name="Processo",
+            value=f"RSS: {format_size(stats['rss'])}\nRastreada: {format_size(stats['traced'])} (pico {format_size(stats['traced_peak'])})",
+            inline=False
         )
-        
         embed.add_field(
-            name="🧠 IA",
-            value="Powered by GPT-4o",
-            inline=True
+            name="Estruturas",
+            value="\n".join(
+                f"{name}: {size['entries']}" + (f" ({format_size(size['bytes'])})" if size['bytes'] is not None else "")
+                for name, size in sizes.items()
+            ),
+            inline=False
         )
-        
+        lines = [f"+{format_size(size)} ({count:+d}) {site}" for site, size, count in growth]
         embed.add_field(
-            name="⚡ Comandos",
-            value="`!zoa` - Zoa alguém\n`!piada` - Conta piada\n`!elogio` - Faz elogio\n`!help` - Ajuda",
+            name="Maior crescimento desde o início",
+            value=f"```\n{chr(10).join(lines)[:1000] or 'nada ainda'}\n```",
             inline=False
         )
+        await ctx.reply(embed=embed)
+    
+    profiler = SamplingProfiler()
+    
+    @bot.command(name='perfil', aliases=['profile'], hidden=True)
+    @commands.is_owner()
+    async def profile_report(ctx, seconds: int = 10):
+        """Amostra as pilhas do bot por N segundos e manda o resultado (só o dono)"""
+        if profiler.running:
+            bot.dispatcher.reply(ctx.message, "Já tem um perfil rodando! Espera ele terminar. ⏳")
+            return
+        seconds = max(1, min(seconds, Config.PROFILER_MAX_SECONDS))
+        bot.dispatcher.reply(ctx.message, f"Perfilando por {seconds}s... 🔬")
+        result = await profiler.run(seconds)
+        summary = result.summary()
         
-        embed.set_footer(text="Feito com 💙 e muito café ☕")
+        embed = discord.Embed(title="🔬 Perfil", color=0xe67e22)
+        embed.add_field(
+            name="Amostras",
+            value=f"{summary['samples']} em {result.duration:.1f}s\nLoop ocupado: {summary['loop_busy']:.0%}",
+            inline=False
+        )
+        for name, rows in [("Tasks no loop", summary['tasks']), ("CPU por função", summary['functions']), ("Esperando em", summary['waiting'])]:
+            lines = "\n".join(f"{count:5d}  {label}" for label, count in rows)
+            embed.add_field(name=name, value=f"```\n{lines[:1000] or 'nada'}\n```", inline=False)
+        embed.set_footer(text="Arquivos em formato collapsed (flamegraph.pl / speedscope)")
         
-        await ctx.reply(embed=embed)
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        files = [
+            discord.File(io.BytesIO(result.collapsed(result.cpu).encode()), filename=f"perfil-cpu-{stamp}.folded"),
+            discord.File(io.BytesIO(result.collapsed(result.waiting).encode()), filename=f"perfil-espera-{stamp}.folded"),
+        ]
+        await ctx.reply(embed=embed, files=files)
     
     @bot.command(name='conversa', aliases=['chat'])
-    @commands.cooldown(2, 30, commands.BucketType.user)
+    @shared_cooldown('conversa')
     async def start_conversation(ctx, *, topic=None):
         """Inicia uma conversa sobre um tópico"""
         if not topic:
-            await ctx.reply("Sobre o que você quer conversar? Exemplo: `!conversa games`")
+            bot.dispatcher.reply(ctx.message, "Sobre o que você quer conversar? Exemplo: `!conversa games`")
             return
         
-        try:
-            async with ctx.typing():
-                if bot.personality.has_api and bot.personality.client:
-                    response = bot.personality.client.models.generate_content(
-                        model="gemini-2.5-flash",
-                        contents=f"""
-                        Inicie uma conversa interessante e divertida sobre: {topic}
-                        Faça uma pergunta ou comentário provocativo para gerar discussão.
-                        Seja engraçado e use gírias brasileiras.
-                        Máximo 2 frases. Fale português do Brasil.
-                        """
-                    )
-                    conversation_starter = response.text.strip() if response.text else None
-                else:
-                    conversation_starter = None
-                
-                if conversation_starter:
-                    await ctx.reply(f"💬 {conversation_starter}")
-                else:
-                    await ctx.reply(f"Hmm, {topic}? Interessante! O que vocês acham sobre isso? Alguém aí manja? 🤔")
-                
-        except Exception as e:
-            logger.error(f"Erro no comando conversa: {e}")
-            await ctx.reply(f"Hmm, {topic}? Interessante! O que vocês acham sobre isso? Alguém aí manja? 🤔")
+        async with ctx.typing():
+            bot.dispatcher.reply(ctx.message, await conversation_text(bot, topic))
 
 
 import os
@@ -374,10 +423,11 @@ async def parar_command(ctx):
         await ctx.send('Não estou tocando nada no momento.')
 
 # --- Inicia o Bot ---
-DISCORD_TOKEN = os.environ.get('DISCORD_TOKEN')
+if __name__ == "__main__":
+    DISCORD_TOKEN = os.environ.get('DISCORD_TOKEN')
 
-if DISCORD_TOKEN:
-    bot.run(DISCORD_TOKEN)
-else:
-    print("ERRO: O token do Discord não foi encontrado nas variáveis de ambiente.")
-    print("Por favor, adicione 'DISCORD_TOKEN' nos Secrets do Replit com o token do seu bot.")
+    if DISCORD_TOKEN:
+        bot.run(DISCORD_TOKEN)
+    else:
+        print("ERRO: O token do Discord não foi encontrado nas variáveis de ambiente.")
+        print("Por favor, adicione 'DISCORD_TOKEN' nos Secrets do Replit com o token do seu bot.")
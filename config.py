@@ -4,6 +4,18 @@ from dotenv import load_dotenv
 # Load environment variables from .env file
 load_dotenv()
 
+def _generation_profile(name, max_tokens, temperature, thinking_budget=0, persona=False):
+    """Read one generation profile from PROFILE_<NAME>_* environment variables"""
+    prefix = f"PROFILE_{name.upper()}_"
+    budget = os.getenv(prefix + "THINKING_BUDGET", str(thinking_budget))
+    return {
+        'model': os.getenv(prefix + "MODEL", "gemini-2.5-flash"),
+        'thinking_budget': int(budget) if budget else None,  # empty = model default, -1 = dynamic
+        'max_tokens': int(os.getenv(prefix + "MAX_TOKENS", str(max_tokens))),
+        'temperature': float(os.getenv(prefix + "TEMPERATURE", str(temperature))),
+        'persona': persona,  # send prompts.PERSONA_INSTRUCTION as system instruction
+    }
+
 class Config:
     """Configuration class for the Discord bot"""
     
@@ -15,15 +27,180 @@ class Config:
     OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
     GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
     
+    # Model backend: "gemini" or "local" (quantized GGUF model on CPU)
+    AI_BACKEND = os.getenv("AI_BACKEND", "gemini").lower()
+    
+    # Local model settings (AI_BACKEND=local, requires llama-cpp-python)
+    LOCAL_MODEL_PATH = os.getenv("LOCAL_MODEL_PATH", "models/model.gguf")
+    LOCAL_LLM_WORKERS = int(os.getenv("LOCAL_LLM_WORKERS", "1"))  # processes, each with its own model copy
+    LOCAL_LLM_THREADS = int(os.getenv("LOCAL_LLM_THREADS", "0"))  # 0 = CPU count / workers
+    LOCAL_LLM_CONTEXT = int(os.getenv("LOCAL_LLM_CONTEXT", "1024"))
+    LOCAL_LLM_MAX_BATCH = int(os.getenv("LOCAL_LLM_MAX_BATCH", "8"))
+    LOCAL_LLM_BATCH_WINDOW = float(os.getenv("LOCAL_LLM_BATCH_WINDOW", "0.02"))  # seconds to gather a batch
+    LOCAL_LLM_TIMEOUT = float(os.getenv("LOCAL_LLM_TIMEOUT", "60"))  # seconds per batch
+    
+    # Gemini settings
+    GEMINI_TIMEOUT = float(os.getenv("GEMINI_TIMEOUT", "15"))  # seconds per call
+    GEMINI_CASSETTE_MODE = os.getenv("GEMINI_CASSETTE_MODE", "").lower()  # "", "record" or "replay"
+    GEMINI_CASSETTE_PATH = os.getenv("GEMINI_CASSETTE_PATH", "gemini_cassette.json")
+    GEMINI_CASSETTE_LATENCY = os.getenv("GEMINI_CASSETTE_LATENCY", "none")  # replay delay: none, recorded or sampled
+    
+    # HTTP connection pool shared by the provider clients
+    HTTP2 = os.getenv("HTTP2", "auto").lower()  # "auto" enables HTTP/2 when the h2 package is installed
+    HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "20"))
+    HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "10"))
+    HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "300"))  # seconds
+    HTTP_KEEPALIVE_INTERVAL = float(os.getenv("HTTP_KEEPALIVE_INTERVAL", "120"))  # idle seconds between pings
+    
+    # Local fallback generator
+    FALLBACK_MODEL_PATH = os.getenv("FALLBACK_MODEL_PATH", "fallback_model.bin")
+    REPLY_CORPUS_PATH = os.getenv("REPLY_CORPUS_PATH", "reply_corpus.jsonl")
+    LOG_GOOD_REPLIES = os.getenv("LOG_GOOD_REPLIES", "true").lower() == "true"
+    
+    # Circuit breaker settings (shared by every model caller)
+    BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))  # consecutive errors/timeouts
+    BREAKER_RECOVERY_TIME = float(os.getenv("BREAKER_RECOVERY_TIME", "30"))  # seconds before a probe
+    BREAKER_QUOTA_RECOVERY_TIME = float(os.getenv("BREAKER_QUOTA_RECOVERY_TIME", "300"))  # seconds after quota/auth errors
+    
+    # Generation profiles per call site (!elogio uses "roast", !conversa uses "joke");
+    # only conversation replies carry the persona, commands keep their own tone
+    GENERATION_PROFILES = {
+        'casual': _generation_profile('casual', max_tokens=100, temperature=0.8, persona=True),
+        'mention': _generation_profile('mention', max_tokens=200, temperature=0.8, persona=True),
+        'roast': _generation_profile('roast', max_tokens=150, temperature=1.0),
+        'joke': _generation_profile('joke', max_tokens=200, temperature=1.0),
+        'welcome': _generation_profile('welcome', max_tokens=150, temperature=0.9),
+        'profile': _generation_profile('profile', max_tokens=80, temperature=0.3),
+    }
+    
+    # Quota (free tier defaults); background jobs only use what stays below the spare fraction
+    GEMINI_RPM_LIMIT = int(os.getenv("GEMINI_RPM_LIMIT", "10"))
+    GEMINI_DAILY_LIMIT = int(os.getenv("GEMINI_DAILY_LIMIT", "250"))
+    QUOTA_SPARE_FRACTION = float(os.getenv("QUOTA_SPARE_FRACTION", "0.5"))
+    
+    # User profile summaries
+    PROFILE_SUMMARIES = os.getenv("PROFILE_SUMMARIES", "true").lower() == "true"
+    PROFILE_SUMMARY_INTERVAL = float(os.getenv("PROFILE_SUMMARY_INTERVAL", "120"))  # seconds between background runs
+    PROFILE_MIN_MESSAGES = int(os.getenv("PROFILE_MIN_MESSAGES", "3"))  # exchanges before a user is summarized
+    PROFILE_MAX_PENDING = int(os.getenv("PROFILE_MAX_PENDING", "10"))  # exchanges kept per user between summaries
+    PROFILE_MAX_USERS = int(os.getenv("PROFILE_MAX_USERS", "500"))
+    PROFILE_MAX_CHARS = int(os.getenv("PROFILE_MAX_CHARS", "200"))  # keeps the attached profile at a fixed small cost
+    
     # Bot personality settings
     HUMOR_LEVEL = float(os.getenv("HUMOR_LEVEL", "0.8"))  # 0.0 to 1.0
     TEASING_PROBABILITY = float(os.getenv("TEASING_PROBABILITY", "0.3"))  # 0.0 to 1.0
-    CASUAL_PARTICIPATION_RATE = float(os.getenv("CASUAL_PARTICIPATION_RATE", "0.15"))  # 0.0 to 1.0
+    
+    # Response tiers for casual participation (response_policy.py)
+    RESPONSE_TIERS = os.getenv("RESPONSE_TIERS", "true").lower() == "true"  # false sends everything to the model
+    RESPONSE_MODEL_MIN_WORDS = int(os.getenv("RESPONSE_MODEL_MIN_WORDS", "12"))  # longer messages always get the model
+    
+    # Casual participation controller
+    PARTICIPATION_TARGET_PER_HOUR = float(os.getenv("PARTICIPATION_TARGET_PER_HOUR", "4"))  # casual replies per channel
+    PARTICIPATION_GLOBAL_BUDGET_PER_HOUR = float(os.getenv("PARTICIPATION_GLOBAL_BUDGET_PER_HOUR", "60"))  # across all channels
+    PARTICIPATION_HALF_LIFE = float(os.getenv("PARTICIPATION_HALF_LIFE", "1800"))  # seconds
+    PARTICIPATION_MIN_PROBABILITY = float(os.getenv("PARTICIPATION_MIN_PROBABILITY", "0.002"))
+    PARTICIPATION_MAX_PROBABILITY = float(os.getenv("PARTICIPATION_MAX_PROBABILITY", "0.3"))
+    PARTICIPATION_FEEDBACK = float(os.getenv("PARTICIPATION_FEEDBACK", "0.02"))  # gain correction per message
+    PARTICIPATION_MAX_CHANNELS = int(os.getenv("PARTICIPATION_MAX_CHANNELS", "2000"))
     
     # Rate limiting settings
     RATE_LIMIT_MESSAGES = int(os.getenv("RATE_LIMIT_MESSAGES", "5"))
     RATE_LIMIT_WINDOW = int(os.getenv("RATE_LIMIT_WINDOW", "60"))  # seconds
     
+    # Shared state for rate limits and cooldowns (state_backend.py)
+    STATE_BACKEND = os.getenv("STATE_BACKEND", "memory")  # "memory" (per process) or "redis" (shared by replicas)
+    REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+    REDIS_TIMEOUT = float(os.getenv("REDIS_TIMEOUT", "0.5"))  # seconds; checks fall back to local limits after this
+    REDIS_RETRY_INTERVAL = float(os.getenv("REDIS_RETRY_INTERVAL", "10"))  # seconds on local limits after a failure
+    STATE_KEY_PREFIX = os.getenv("STATE_KEY_PREFIX", "drode:")
+    STATE_MEMORY_MAX_KEYS = int(os.getenv("STATE_MEMORY_MAX_KEYS", "10000"))
+    
+    # Logging settings
+    LOG_FILE = os.getenv("LOG_FILE", "bot.log")
+    LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(5 * 1024 * 1024)))
+    LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "3"))
+    LOG_SAMPLE_WINDOW = float(os.getenv("LOG_SAMPLE_WINDOW", "60"))  # seconds
+    LOG_SAMPLE_BURST = int(os.getenv("LOG_SAMPLE_BURST", "5"))  # identical errors kept per window
+    LOG_MAX_BODY_CHARS = int(os.getenv("LOG_MAX_BODY_CHARS", "500"))
+    
+    # Member cache settings
+    MEMBER_CACHE_MODE = os.getenv("MEMBER_CACHE_MODE", "lazy")  # "eager" or "lazy"
+    MEMBER_INDEX_MAX_PER_GUILD = int(os.getenv("MEMBER_INDEX_MAX_PER_GUILD", "5000"))  # names kept for autocomplete
+    
+    # Interaction audit log settings
+    AUDIT_LOG_ENABLED = os.getenv("AUDIT_LOG_ENABLED", "true").lower() == "true"
+    AUDIT_LOG_DIR = os.getenv("AUDIT_LOG_DIR", "audit")
+    AUDIT_LOG_TEXT = os.getenv("AUDIT_LOG_TEXT", "true").lower() == "true"  # include prompt and reply text
+    AUDIT_MAX_TEXT = int(os.getenv("AUDIT_MAX_TEXT", "1000"))  # characters kept per prompt/reply
+    AUDIT_FLUSH_INTERVAL = float(os.getenv("AUDIT_FLUSH_INTERVAL", "5"))  # seconds between batches
+    AUDIT_SEGMENT_BYTES = int(os.getenv("AUDIT_SEGMENT_BYTES", str(16 * 1024 * 1024)))  # rotate segments at this size
+    AUDIT_MAX_PENDING = int(os.getenv("AUDIT_MAX_PENDING", "10000"))  # entries buffered before dropping the oldest
+    
+    # Shutdown and restart settings
+    SHUTDOWN_DEADLINE = float(os.getenv("SHUTDOWN_DEADLINE", "20"))  # seconds to finish in-flight replies on SIGTERM
+    STATE_PATH = os.getenv("STATE_PATH", "bot_state.json")
+    STATE_MAX_AGE = float(os.getenv("STATE_MAX_AGE", "3600"))  # older state is not restored
+    
+    # Memory monitoring settings
+    MEMORY_MONITOR = os.getenv("MEMORY_MONITOR", "false").lower() == "true"  # periodic tracemalloc snapshots
+    MEMORY_TRACE_FRAMES = int(os.getenv("MEMORY_TRACE_FRAMES", "10"))
+    MEMORY_SNAPSHOT_INTERVAL = float(os.getenv("MEMORY_SNAPSHOT_INTERVAL", "900"))  # seconds
+    MEMORY_GROWTH_WARN_MB = float(os.getenv("MEMORY_GROWTH_WARN_MB", "50"))  # per snapshot interval
+    MEMORY_SOAK_MAX_GROWTH_MB = float(os.getenv("MEMORY_SOAK_MAX_GROWTH_MB", "5"))
+    
+    # Sampling profiler (!perfil)
+    PROFILER_INTERVAL = float(os.getenv("PROFILER_INTERVAL", "0.01"))  # seconds between thread stack samples
+    PROFILER_AWAIT_INTERVAL = float(os.getenv("PROFILER_AWAIT_INTERVAL", "0.05"))  # seconds between task samples
+    PROFILER_MAX_SECONDS = int(os.getenv("PROFILER_MAX_SECONDS", "120"))
+    
+    # Analytics settings
+    ANALYTICS_SNAPSHOT_PATH = os.getenv("ANALYTICS_SNAPSHOT_PATH", "analytics.json")
+    ANALYTICS_SNAPSHOT_INTERVAL = float(os.getenv("ANALYTICS_SNAPSHOT_INTERVAL", "300"))  # seconds
+    ANALYTICS_HALF_LIFE = float(os.getenv("ANALYTICS_HALF_LIFE", "3600"))  # seconds
+    ANALYTICS_USER_WINDOW = float(os.getenv("ANALYTICS_USER_WINDOW", "86400"))  # seconds per active-user window
+    ANALYTICS_MAX_CHANNELS = int(os.getenv("ANALYTICS_MAX_CHANNELS", "50"))  # per guild
+    
+    # Channel context retrieval settings
+    RETRIEVAL_ENABLED = os.getenv("RETRIEVAL_ENABLED", "true").lower() == "true"
+    RETRIEVAL_RING_SIZE = int(os.getenv("RETRIEVAL_RING_SIZE", "300"))  # recent messages kept per channel
+    RETRIEVAL_MAX_CHANNELS = int(os.getenv("RETRIEVAL_MAX_CHANNELS", "100"))
+    RETRIEVAL_DIMENSIONS = int(os.getenv("RETRIEVAL_DIMENSIONS", "4096"))  # hash buckets per vector
+    RETRIEVAL_MAX_TERMS = int(os.getenv("RETRIEVAL_MAX_TERMS", "24"))  # terms kept per message
+    RETRIEVAL_MIN_CHARS = int(os.getenv("RETRIEVAL_MIN_CHARS", "10"))  # shorter messages are not indexed
+    RETRIEVAL_MAX_CHARS = int(os.getenv("RETRIEVAL_MAX_CHARS", "200"))  # characters kept per line
+    RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "3"))  # lines added to the prompt
+    RETRIEVAL_MIN_SCORE = float(os.getenv("RETRIEVAL_MIN_SCORE", "0.15"))  # cosine similarity
+    
+    # Reply chain settings (replies to the bot carry the messages they point to)
+    REPLY_CACHE_SIZE = int(os.getenv("REPLY_CACHE_SIZE", "2000"))  # bot messages remembered
+    REPLY_CACHE_MAX_CHARS = int(os.getenv("REPLY_CACHE_MAX_CHARS", "300"))  # characters kept per message
+    REPLY_CHAIN_DEPTH = int(os.getenv("REPLY_CHAIN_DEPTH", "4"))  # messages added to the prompt
+    
+    # Slash command settings
+    SLASH_COMMANDS = os.getenv("SLASH_COMMANDS", "true").lower() == "true"
+    COMMAND_SYNC_HASH_PATH = os.getenv("COMMAND_SYNC_HASH_PATH", ".command_sync_hash")
+    
+    # HTTP interactions endpoint (interactions_server.py)
+    INTERACTIONS_PUBLIC_KEY = os.getenv("DISCORD_PUBLIC_KEY")  # application public key, hex
+    INTERACTIONS_HOST = os.getenv("INTERACTIONS_HOST", "0.0.0.0")
+    INTERACTIONS_PORT = int(os.getenv("INTERACTIONS_PORT", "8080"))
+    INTERACTIONS_PATH = os.getenv("INTERACTIONS_PATH", "/interactions")
+    INTERACTIONS_MAX_SKEW = float(os.getenv("INTERACTIONS_MAX_SKEW", "300"))  # seconds a signed request stays valid
+    INTERACTIONS_SEARCH_TTL = float(os.getenv("INTERACTIONS_SEARCH_TTL", "30"))  # seconds a member search is reused
+    INTERACTIONS_SEARCH_MAX_ENTRIES = int(os.getenv("INTERACTIONS_SEARCH_MAX_ENTRIES", "500"))
+    DISCORD_API_BASE = os.getenv("DISCORD_API_BASE", "https://discord.com/api/v10")
+    
+    # Welcome settings
+    WELCOME_BATCH_WINDOW = float(os.getenv("WELCOME_BATCH_WINDOW", "5"))  # seconds
+    WELCOME_MAX_NAMES = int(os.getenv("WELCOME_MAX_NAMES", "10"))
+    
+    # Outbound message settings
+    MESSAGE_MAX_LENGTH = int(os.getenv("MESSAGE_MAX_LENGTH", "2000"))
+    MESSAGE_MAX_PARTS = int(os.getenv("MESSAGE_MAX_PARTS", "3"))  # longer replies are truncated
+    CHANNEL_RATE_LIMIT = int(os.getenv("CHANNEL_RATE_LIMIT", "5"))  # messages per window until Discord headers say otherwise
+    CHANNEL_RATE_WINDOW = float(os.getenv("CHANNEL_RATE_WINDOW", "5"))  # seconds
+    DISPATCHER_IDLE_TIMEOUT = float(os.getenv("DISPATCHER_IDLE_TIMEOUT", "60"))  # seconds before an idle channel queue is dropped
+    
     # OpenAI model settings
     MODEL_NAME = os.getenv("MODEL_NAME", "gpt-4o")  # the newest OpenAI model is "gpt-4o" which was released May 13, 2024. do not change this unless explicitly requested by the user
     MAX_TOKENS = int(os.getenv("MAX_TOKENS", "150"))
@@ -32,10 +209,18 @@ class Config:
     @classmethod
     def validate(cls):
         """Validate that all required configuration is present"""
-        required_vars = [
-            ("DISCORD_TOKEN", cls.DISCORD_TOKEN),
-            ("OPENAI_API_KEY", cls.OPENAI_API_KEY)
-        ]
+        required_vars = [("DISCORD_TOKEN", cls.DISCORD_TOKEN)]
+        
+        # Only the configured backend's credentials are needed
+        if cls.AI_BACKEND == "gemini":
+            if cls.GEMINI_CASSETTE_MODE != "replay":
+                required_vars.append(("GEMINI_API_KEY", cls.GEMINI_API_KEY))
+        elif cls.AI_BACKEND == "local":
+            if not os.path.exists(cls.LOCAL_MODEL_PATH):
+                print(f"Modelo local não encontrado em {cls.LOCAL_MODEL_PATH}; o bot vai usar respostas de fallback")
+        else:
+            print(f"AI_BACKEND desconhecido: {cls.AI_BACKEND} (use 'gemini' ou 'local')")
+            return False
         
         missing_vars = []
         for var_name, var_value in required_vars:
@@ -0,0 +1,219 @@
+import asyncio
+import logging
+import re
+import time
+import aiohttp
+from config import Config
+from utils import MessageFormatter
+
+logger = logging.getLogger(__name__)
+
+# POST /api/v10/channels/{channel_id}/messages
+CHANNEL_MESSAGES_ROUTE = re.compile(r'/channels/(\d+)/messages$')
+
+class ChannelBucket:
+    """Local view of Discord's rate limit bucket for one channel"""
+
+    def __init__(self, limit, window):
+        self.limit = limit
+        self.window = window
+        self.remaining = limit
+        self.reset_at = 0.0
+
+    def delay(self):
+        """Seconds to wait before the next send is allowed"""
+        now = time.monotonic()
+        if now >= self.reset_at:
+            self.remaining = self.limit
+            self.reset_at = now + self.window
+            return 0.0
+        if self.remaining > 0:
+            return 0.0
+        return self.reset_at - now
+
+    def consume(self):
+        self.remaining = max(0, self.remaining - 1)
+
+    def update_from_headers(self, headers):
+        """Sync the bucket with the X-RateLimit headers Discord returned"""
+        try:
+            if 'X-RateLimit-Limit' in headers:
+                self.limit = int(headers['X-RateLimit-Limit'])
+            if 'X-RateLimit-Remaining' in headers:
+                self.remaining = int(headers['X-RateLimit-Remaining'])
+            reset_after = headers.get('X-RateLimit-Reset-After') or headers.get('Retry-After')
+            if reset_after is not None:
+                self.reset_at = time.monotonic() + float(reset_after)
+        except ValueError:
+            pass
+
+
+class OutboundMessage:
+    """A pending bot message waiting in a channel queue"""
+
+    __slots__ = ('channel', 'content', 'reference', 'future')
+
+    def __init__(self, channel, content, reference, future):
+        self.channel = channel
+        self.content = content
+        self.reference = reference
+        self.future = future
+
+
+class OutboundDispatcher:
+    """Paces and merges outgoing bot messages through per-channel queues"""
+
+    def __init__(self):
+        self.max_length = Config.MESSAGE_MAX_LENGTH
+        self.max_parts = Config.MESSAGE_MAX_PARTS
+        self.idle_timeout = Config.DISPATCHER_IDLE_TIMEOUT
+
+        self._queues = {}  # channel_id -> asyncio.Queue of OutboundMessage
+        self._workers = {}
+        self._buckets = {}
+        self._outstanding = set()  # futures of messages not delivered yet
+
+        self.sent = 0
+        self.merged = 0
+        self.rate_limited = 0  # 429 responses seen on any route
+        self.paced_seconds = 0.0
+
+        self.trace_config = aiohttp.TraceConfig()
+        self.trace_config.on_request_end.append(self._on_request_end)
+
+    def reply(self, message, content):
+        """Queue a reply to a message; returns a future with the sent message"""
+        return self._enqueue(message.channel, content, message)
+
+    def send(self, channel, content):
+        """Queue a plain message to a channel"""
+        return self._enqueue(channel, content, None)
+
+    def _enqueue(self, channel, content, reference):
+        future = asyncio.get_running_loop().create_future()
+        queue = self._queues.get(channel.id)
+        if queue is None:
+            queue = self._queues[channel.id] = asyncio.Queue()
+
+        queue.put_nowait(OutboundMessage(channel, content, reference, future))
+        self._outstanding.add(future)
+        future.add_done_callback(self._outstanding.discard)
+
+        if channel.id not in self._workers:
+            self._workers[channel.id] = asyncio.create_task(self._worker(channel.id, queue))
+        return future
+
+    async def drain(self, timeout):
+        """Wait for every queued message to be delivered; returns how many were not"""
+        if self._outstanding:
+            await asyncio.wait(list(self._outstanding), timeout=timeout)
+        return len(self._outstanding)
+
+    def _bucket(self, channel_id):
+        bucket = self._buckets.get(channel_id)
+        if bucket is None:
+            bucket = self._buckets[channel_id] = ChannelBucket(
+                Config.CHANNEL_RATE_LIMIT, Config.CHANNEL_RATE_WINDOW
+            )
+        return bucket
+
+    async def _worker(self, channel_id, queue):
+        try:
+            while True:
+                try:
+                    first = await asyncio.wait_for(queue.get(), timeout=self.idle_timeout)
+                except asyncio.TimeoutError:
+                    if queue.empty():
+                        return
+                    continue
+
+                # Pace before Discord would answer with a 429
+                bucket = self._bucket(channel_id)
+                delay = bucket.delay()
+                if delay > 0:
+                    self.paced_seconds += delay
+                    await asyncio.sleep(delay)
+
+                # Everything queued while we waited goes out as one message
+                batch = [first]
+                while not queue.empty():
+                    batch.append(queue.get_nowait())
+
+                await self._deliver(batch, bucket)
+        finally:
+            self._workers.pop(channel_id, None)
+            if queue.empty():
+                self._queues.pop(channel_id, None)
+                self._buckets.pop(channel_id, None)
+
+    async def _deliver(self, batch, bucket):
+        last = batch[-1]
+        if len(batch) > 1:
+            self.merged += len(batch) - 1
+            content = self._merge(batch)
+        else:
+            content = last.content
+
+        sent_message = None
+        try:
+            for index, part in enumerate(self._split(content)):
+                if index and bucket.delay() > 0:
+                    await asyncio.sleep(bucket.delay())
+                bucket.consume()
+                if index == 0 and last.reference is not None:
+                    sent_message = await last.reference.reply(part)
+                else:
+                    sent = await last.channel.send(part)
+                    sent_message = sent_message or sent
+                self.sent += 1
+        except Exception as e:
+            logger.error(f"Erro ao enviar mensagem no canal {last.channel.id}: {e}")
+
+        for item in batch:
+            if not item.future.done():
+                item.future.set_result(sent_message)
+
+    def _merge(self, batch):
+        """Combine several pending replies for one channel into one message"""
+        authors = {item.reference.author.id for item in batch if item.reference is not None}
+        if len(authors) <= 1:
+            return "\n".join(item.content for item in batch)
+
+        parts = []
+        for item in batch:
+            if item.reference is not None and item is not batch[-1]:
+                parts.append(f"{item.reference.author.mention} {item.content}")
+            else:
+                parts.append(item.content)
+        return "\n".join(parts)
+
+    def _split(self, content):
+        """Split long content into Discord sized parts"""
+        parts = MessageFormatter.split_message(content, self.max_length)
+        if len(parts) > self.max_parts:
+            parts = parts[:self.max_parts - 1] + [
+                MessageFormatter.truncate_message(" ".join(parts[self.max_parts - 1:]), self.max_length)
+            ]
+        return parts
+
+    async def _on_request_end(self, session, context, params):
+        """Read Discord rate limit headers from every HTTP response"""
+        if params.response.status == 429:
+            self.rate_limited += 1
+
+        match = CHANNEL_MESSAGES_ROUTE.search(params.url.path)
+        if params.method == 'POST' and match:
+            channel_id = int(match.group(1))
+            if channel_id in self._buckets:
+                self._buckets[channel_id].update_from_headers(params.response.headers)
+
+    def get_stats(self):
+        """Get dispatcher statistics"""
+        return {
+            'queue_depth': sum(q.qsize() for q in self._queues.values()),
+            'active_channels': len(self._workers),
+            'sent': self.sent,
+            'merged': self.merged,
+            'rate_limited': self.rate_limited,
+            'paced_seconds': round(self.paced_seconds, 2),
+        }
@@ -0,0 +1,194 @@
+import bisect
+import json
+import logging
+import marshal
+import os
+import random
+import re
+import sys
+import time
+import zlib
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"DRFB1"
+START = 0  # token id marking the start of a reply
+END = 1    # token id marking the end of a reply
+MAX_TOKENS = 40
+
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]+", re.UNICODE)
+_PUNCTUATION_RE = re.compile(r"^[.,!?…:;)]+$")
+
+def tokenize(text):
+    return _TOKEN_RE.findall(text)
+
+def detokenize(tokens):
+    """Join tokens back, without spaces before punctuation"""
+    text = ""
+    for token in tokens:
+        if text and not _PUNCTUATION_RE.match(token):
+            text += " "
+        text += token
+    return text
+
+
+class ReplyCorpus:
+    """Collects good model replies per fallback category for training"""
+
+    def __init__(self, path=None, flush_every=20):
+        self.path = path or Config.REPLY_CORPUS_PATH
+        self.flush_every = flush_every
+        self._buffer = []
+
+    def add(self, category, reply):
+        """Keep a reply if it is short, clean and reusable"""
+        reply = reply.strip()
+        if not (5 <= len(reply) <= 200) or '<@' in reply or 'http' in reply or reply.upper() == "SKIP":
+            return
+        self._buffer.append({'category': category, 'reply': reply})
+        if len(self._buffer) >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        if not self._buffer:
+            return
+        try:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                for entry in self._buffer:
+                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        except OSError as e:
+            logger.error(f"Erro ao salvar corpus de respostas: {e}")
+        self._buffer.clear()
+
+
+class LocalReplyModel:
+    """Word bigram Markov model per category, loaded from a compact binary file"""
+
+    def __init__(self, vocab, categories):
+        self.vocab = vocab
+        # category -> {state: (next_ids, cumulative_weights)}
+        self.categories = categories
+
+    @classmethod
+    def load(cls, path=None):
+        """Load a compiled model; returns None when no model has been built"""
+        path = path or Config.FALLBACK_MODEL_PATH
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            if not data.startswith(MAGIC):
+                raise ValueError("formato desconhecido")
+            payload = marshal.loads(zlib.decompress(data[len(MAGIC):]))
+            model = cls(payload['vocab'], payload['categories'])
+            logger.info(f"Modelo local de respostas carregado ({len(model.vocab)} palavras, {len(model.categories)} categorias)")
+            return model
+        except Exception as e:
+            logger.error(f"Erro ao carregar modelo local de respostas: {e}")
+            return None
+
+    def generate(self, category, rng=random):
+        """Walk the chain for a category; returns None if it cannot"""
+        chain = self.categories.get(category)
+        if not chain:
+            return None
+
+        state = (START, START)
+        tokens = []
+        for _ in range(MAX_TOKENS):
+            transitions = chain.get(state)
+            if not transitions:
+                break
+            next_ids, weights = transitions
+            pick = bisect.bisect_right(weights, rng.random() * weights[-1])
+            token_id = next_ids[min(pick, len(next_ids) - 1)]
+            if token_id == END:
+                break
+            tokens.append(self.vocab[token_id])
+            state = (state[1], token_id)
+
+        return detokenize(tokens) if tokens else None
+
+
+def compile_model(samples, output_path):
+    """Build the binary model from (category, reply) pairs"""
+    vocab = ["<s>", "</s>"]
+    index = {}
+    counts = {}  # category -> state -> next -> count
+
+    for category, reply in samples:
+        ids = []
+        for token in tokenize(reply):
+            if token not in index:
+                index[token] = len(vocab)
+                vocab.append(token)
+            ids.append(index[token])
+
+        chain = counts.setdefault(category, {})
+        sequence = [START, START] + ids + [END]
+        for i in range(2, len(sequence)):
+            nexts = chain.setdefault((sequence[i - 2], sequence[i - 1]), {})
+            nexts[sequence[i]] = nexts.get(sequence[i], 0) + 1
+
+    categories = {}
+    for category, chain in counts.items():
+        compiled = {}
+        for state, nexts in chain.items():
+            next_ids = tuple(nexts)
+            cumulative, total = [], 0
+            for token_id in next_ids:
+                total += nexts[token_id]
+                cumulative.append(total)
+            compiled[state] = (next_ids, tuple(cumulative))
+        categories[category] = compiled
+
+    payload = zlib.compress(marshal.dumps({'vocab': vocab, 'categories': categories}), 9)
+    with open(output_path, 'wb') as f:
+        f.write(MAGIC + payload)
+    return len(vocab), len(categories), len(payload) + len(MAGIC)
+
+def load_samples(corpus_path, seeds):
+    """Seed replies plus every logged reply in the corpus"""
+    samples = [(category, reply) for category, replies in seeds.items() for reply in replies]
+    if os.path.exists(corpus_path):
+        with open(corpus_path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                    samples.append((entry['category'], entry['reply']))
+                except (ValueError, KeyError):
+                    continue
+    return samples
+
+
+def main():
+    from personality_gemini import GeminiPersonalityEngine
+
+    command = sys.argv[1] if len(sys.argv) > 1 else 'build'
+    if command == 'build':
+        corpus_path = sys.argv[2] if len(sys.argv) > 2 else Config.REPLY_CORPUS_PATH
+        output_path = sys.argv[3] if len(sys.argv) > 3 else Config.FALLBACK_MODEL_PATH
+        seeds = GeminiPersonalityEngine().fallback_seeds()
+        samples = load_samples(corpus_path, seeds)
+        vocab, categories, size = compile_model(samples, output_path)
+        print(f"{len(samples)} respostas, {vocab} palavras, {categories} categorias -> {output_path} ({size} bytes)")
+    elif command == 'sample':
+        model = LocalReplyModel.load(sys.argv[3] if len(sys.argv) > 3 else None)
+        if model is None:
+            raise SystemExit("Nenhum modelo compilado; rode 'python fallback_model.py build' primeiro")
+        category = sys.argv[2] if len(sys.argv) > 2 else 'default'
+        for _ in range(5):
+            print(model.generate(category))
+        started = time.perf_counter()
+        runs = 10000
+        for _ in range(runs):
+            model.generate(category)
+        print(f"{(time.perf_counter() - started) / runs * 1e6:.1f} µs por resposta")
+    else:
+        raise SystemExit("uso: python fallback_model.py [build [corpus] [saida] | sample categoria [modelo]]")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,490 @@
+"""Slash commands over an HTTP interactions endpoint
+
+Instead of the gateway, Discord POSTs each interaction to this server
+(set the application's Interactions Endpoint URL to it). Workers keep no
+gateway connection, so any number of replicas can run behind a load
+balancer; the commands reuse the same helpers as the gateway bot.
+
+    python interactions_server.py serve       # run a worker
+    python interactions_server.py demo        # signed local payloads against a worker
+"""
+import asyncio
+import binascii
+import collections
+import json
+import logging
+import random
+import sys
+import time
+import aiohttp
+from aiohttp import web
+from discord import InteractionType, InteractionResponseType
+from config import Config
+from command_text import COMMAND_COOLDOWNS, cooldown_key, roast_text, joke_text, compliment_text, conversation_text
+from slash_commands import MAX_CHOICES
+from state_backend import get_state_backend
+
+try:
+    from nacl.signing import SigningKey, VerifyKey
+    from nacl.exceptions import BadSignatureError as InvalidSignature
+except ImportError:  # declared in pyproject.toml; cryptography also works
+    SigningKey = VerifyKey = None
+    from cryptography.exceptions import InvalidSignature
+    from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey, Ed25519PublicKey
+
+logger = logging.getLogger(__name__)
+
+EPHEMERAL = 1 << 6  # message flag: only the invoking user sees it
+
+class SignatureVerifier:
+    """Checks Discord's Ed25519 signature over timestamp + body"""
+
+    def __init__(self, public_key_hex):
+        key = bytes.fromhex(public_key_hex)
+        self._key = VerifyKey(key) if VerifyKey else Ed25519PublicKey.from_public_bytes(key)
+
+    def verify(self, signature_hex, timestamp, body):
+        try:
+            signature = bytes.fromhex(signature_hex)
+            message = timestamp.encode() + body
+            if VerifyKey:
+                self._key.verify(message, signature)
+            else:
+                self._key.verify(signature, message)
+        except (ValueError, binascii.Error, InvalidSignature):
+            return False
+
+        # Signatures are not bound to a request; refuse old ones being replayed
+        try:
+            return abs(time.time() - int(timestamp)) <= Config.INTERACTIONS_MAX_SKEW
+        except ValueError:
+            return False
+
+def generate_signing_key():
+    """New Ed25519 key pair as (private key, public key hex); used by the local stand-in"""
+    if SigningKey:
+        private = SigningKey.generate()
+        return private, private.verify_key.encode().hex()
+    private = Ed25519PrivateKey.generate()
+    return private, private.public_key().public_bytes_raw().hex()
+
+def sign_payload(private, timestamp, body):
+    message = timestamp.encode() + body
+    if SigningKey:
+        return private.sign(message).signature.hex()
+    return private.sign(message).hex()
+
+
+class InteractionMember:
+    """The parts of a member the command helpers use, built from a JSON payload"""
+
+    __slots__ = ('id', 'display_name', 'bot')
+
+    def __init__(self, data):
+        user = data.get('user', data)
+        self.id = int(user['id'])
+        self.display_name = data.get('nick') or user.get('global_name') or user['username']
+        self.bot = user.get('bot', False)
+
+    @property
+    def mention(self):
+        return f"<@{self.id}>"
+
+
+class MemberSearchCache:
+    """Recent members/search results per guild, reused while the user keeps typing
+
+    Autocomplete fires on every keystroke. A result shorter than its limit
+    holds every match of its query, so longer queries starting with it are
+    filtered locally (by the same username/nickname prefix rule Discord's
+    search uses) instead of calling the REST route again.
+    """
+
+    def __init__(self, ttl=None, max_entries=None):
+        self.ttl = ttl or Config.INTERACTIONS_SEARCH_TTL
+        self.max_entries = max_entries or Config.INTERACTIONS_SEARCH_MAX_ENTRIES
+        self._entries = collections.OrderedDict()  # (guild_id, query) -> (expires_at, members, complete)
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _matches(member, query):
+        names = (member.get('user', member).get('username'), member.get('nick'))
+        return any(name and name.lower().startswith(query) for name in names)
+
+    def get(self, guild_id, query):
+        """Cached members for the query, or None when the API must be asked"""
+        query = query.lower()
+        now = time.monotonic()
+        for length in range(len(query), 0, -1):
+            key = (guild_id, query[:length])
+            entry = self._entries.get(key)
+            if entry is None:
+                continue
+            expires_at, members, complete = entry
+            if expires_at < now:
+                del self._entries[key]
+                continue
+            if length == len(query):
+                self.hits += 1
+                return members
+            if complete:
+                self.hits += 1
+                return [member for member in members if self._matches(member, query)]
+        self.misses += 1
+        return None
+
+    def put(self, guild_id, query, members, limit):
+        key = (guild_id, query.lower())
+        self._entries[key] = (time.monotonic() + self.ttl, members, len(members) < limit)
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+class InteractionWorker:
+    """Answers interaction payloads with the bot's command logic; holds no gateway state"""
+
+    def __init__(self, personality=None, public_key=None, api_base=None):
+        if personality is None:
+            from bot import create_personality_engine
+            personality = create_personality_engine()
+        self.personality = personality
+        self.verifier = SignatureVerifier(public_key or Config.INTERACTIONS_PUBLIC_KEY)
+        self.api_base = (api_base or Config.DISCORD_API_BASE).rstrip('/')
+        self.session = None
+        self.accepting = True
+        # Replicas only share cooldowns with STATE_BACKEND=redis
+        self.state = get_state_backend()
+        self._tasks = set()  # followups still being generated or sent
+        self.member_search = MemberSearchCache()
+
+        self.commands = {
+            'zoa': self._zoa,
+            'piada': self._piada,
+            'elogio': self._elogio,
+            'conversa': self._conversa,
+        }
+        self.handled = collections.Counter()
+        self.rejected_signatures = 0
+
+    async def start(self):
+        self.session = aiohttp.ClientSession(headers={'Authorization': f"Bot {Config.DISCORD_TOKEN}"})
+        await self.personality.warmup()
+
+    async def close(self, deadline=None):
+        """Stop taking commands and let pending followups finish"""
+        self.accepting = False
+        deadline = deadline if deadline is not None else Config.SHUTDOWN_DEADLINE
+        if self._tasks:
+            _, pending = await asyncio.wait(self._tasks, timeout=deadline)
+            if pending:
+                logger.warning(f"{len(pending)} respostas não terminaram dentro do prazo")
+        if self.session:
+            await self.session.close()
+        await self.state.close()
+
+    # HTTP
+
+    def build_app(self):
+        app = web.Application()
+        app.router.add_post(Config.INTERACTIONS_PATH, self.handle_request)
+        app.router.add_get('/health', self.handle_health)
+        app.on_startup.append(lambda app: self.start())
+        app.on_shutdown.append(lambda app: self.close())
+        return app
+
+    async def handle_request(self, request):
+        body = await request.read()
+        signature = request.headers.get('X-Signature-Ed25519', '')
+        timestamp = request.headers.get('X-Signature-Timestamp', '')
+        if not self.verifier.verify(signature, timestamp, body):
+            self.rejected_signatures += 1
+            return web.Response(status=401, text="invalid request signature")
+        return web.json_response(await self.handle(json.loads(body)))
+
+    async def handle_health(self, request):
+        status = 200 if self.accepting else 503
+        return web.json_response(self.get_stats(), status=status)
+
+    # Interactions
+
+    async def handle(self, interaction):
+        """Response body for one interaction; slow work continues as a followup"""
+        kind = interaction['type']
+        if kind == InteractionType.ping.value:
+            return {'type': InteractionResponseType.pong.value}
+        if kind == InteractionType.autocomplete.value:
+            return {
+                'type': InteractionResponseType.autocomplete_result.value,
+                'data': {'choices': await self._autocomplete(interaction)},
+            }
+        if kind != InteractionType.application_command.value:
+            return self._message("Não sei lidar com isso! 🤔", ephemeral=True)
+
+        name = interaction['data']['name']
+        handler = self.commands.get(name)
+        if name == 'status':
+            return self._message(self._status_text())
+        if handler is None:
+            return self._message("Esse comando só funciona no bot principal! 🤖", ephemeral=True)
+        if not self.accepting:
+            return self._message("Tô reiniciando! Tenta de novo em alguns segundos. 🔄", ephemeral=True)
+        retry_after = await self.state.take(
+            cooldown_key(name, self._invoker(interaction).id), *COMMAND_COOLDOWNS[name]
+        )
+        if retry_after:
+            return self._message(f"Calma aí! Espera mais {retry_after:.1f} segundos. ⏰", ephemeral=True)
+
+        # Acknowledge first; generation can take longer than the 3s interaction window
+        self.handled[name] += 1
+        task = asyncio.create_task(self._follow_up(handler, interaction))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return {'type': InteractionResponseType.deferred_channel_message.value}
+
+    @staticmethod
+    def _message(content, ephemeral=False):
+        data = {'content': content, 'allowed_mentions': {'parse': ['users']}}
+        if ephemeral:
+            data['flags'] = EPHEMERAL
+        return {'type': InteractionResponseType.channel_message.value, 'data': data}
+
+    async def _follow_up(self, handler, interaction):
+        try:
+            content = await handler(interaction)
+        except Exception as e:
+            logger.error(f"Erro em interação HTTP: {e}")
+            content = "Deu ruim aqui! Tenta de novo mais tarde. 🛠️"
+        url = f"{self.api_base}/webhooks/{interaction['application_id']}/{interaction['token']}/messages/@original"
+        payload = {'content': content, 'allowed_mentions': {'parse': ['users']}}
+        try:
+            async with self.session.patch(url, json=payload) as response:
+                if response.status >= 400:
+                    logger.error(f"Erro ao enviar resposta da interação: {response.status} {await response.text()}")
+        except aiohttp.ClientError as e:
+            logger.error(f"Erro ao enviar resposta da interação: {e}")
+
+    @staticmethod
+    def _invoker(interaction):
+        return InteractionMember(interaction.get('member') or interaction['user'])
+
+    @staticmethod
+    def _option(interaction, name):
+        for option in interaction['data'].get('options', []):
+            if option['name'] == name:
+                return option
+        return None
+
+    # Members come from the REST API instead of a gateway cache
+
+    async def _api_get(self, path, **params):
+        async with self.session.get(f"{self.api_base}{path}", params=params) as response:
+            if response.status == 404:
+                return None
+            response.raise_for_status()
+            return await response.json()
+
+    async def _resolve_member(self, guild_id, value):
+        """Member from an autocomplete value (member id) or a typed name"""
+        if value.isdigit():
+            data = await self._api_get(f"/guilds/{guild_id}/members/{value}")
+            if data:
+                return InteractionMember(data)
+        results = await self._api_get(f"/guilds/{guild_id}/members/search", query=value, limit=1)
+        return InteractionMember(results[0]) if results else None
+
+    async def _random_member(self, guild_id):
+        members = await self._api_get(f"/guilds/{guild_id}/members", limit=1000) or []
+        humans = [member for member in map(InteractionMember, members) if not member.bot]
+        return random.choice(humans) if humans else None
+
+    async def _autocomplete(self, interaction):
+        guild_id = interaction.get('guild_id')
+        focused = next((o for o in interaction['data'].get('options', []) if o.get('focused')), None)
+        if not guild_id or focused is None or not focused['value']:
+            return []
+        results = self.member_search.get(guild_id, focused['value'])
+        if results is None:
+            try:
+                results = await self._api_get(
+                    f"/guilds/{guild_id}/members/search", query=focused['value'], limit=MAX_CHOICES
+                ) or []
+            except aiohttp.ClientError as e:
+                logger.warning(f"Erro no autocomplete: {e}")
+                return []
+            self.member_search.put(guild_id, focused['value'], results, MAX_CHOICES)
+        members = [member for member in map(InteractionMember, results) if not member.bot]
+        return [{'name': member.display_name[:100], 'value': str(member.id)} for member in members]
+
+    # Commands (same helpers as the gateway bot; `self` stands in for the bot)
+
+    async def _zoa(self, interaction):
+        guild_id = interaction['guild_id']
+        membro = self._option(interaction, 'membro')
+        if membro:
+            target_user = await self._resolve_member(guild_id, membro['value'])
+        else:
+            target_user = await self._random_member(guild_id)
+        if not target_user:
+            return "Não achei essa pessoa! Você inventou? 🤔"
+        return await roast_text(self, target_user)
+
+    async def _piada(self, interaction):
+        return await joke_text(self)
+
+    async def _elogio(self, interaction):
+        membro = self._option(interaction, 'membro')
+        target_user = await self._resolve_member(interaction['guild_id'], membro['value']) if membro else None
+        return await compliment_text(self, target_user or self._invoker(interaction))
+
+    async def _conversa(self, interaction):
+        return await conversation_text(self, self._option(interaction, 'topico')['value'])
+
+    def _status_text(self):
+        breaker = self.personality.breaker.get_stats()
+        return (
+            f"🤖 Réplica HTTP no ar!\nCircuito: {breaker['state']}\n"
+            f"Comandos atendidos: {sum(self.handled.values())}\nEm andamento: {len(self._tasks)}"
+        )
+
+    def get_stats(self):
+        return {
+            'accepting': self.accepting,
+            'in_flight': len(self._tasks),
+            'handled': dict(self.handled),
+            'rejected_signatures': self.rejected_signatures,
+            'member_search_hits': self.member_search.hits,
+            'member_search_misses': self.member_search.misses,
+        }
+
+
+def serve():
+    """Run a worker until SIGTERM/SIGINT (aiohttp then runs the shutdown hooks)"""
+    from utils import setup_logging
+    setup_logging()
+    if not Config.validate() or not Config.INTERACTIONS_PUBLIC_KEY:
+        raise SystemExit("Configuração inválida! DISCORD_TOKEN e DISCORD_PUBLIC_KEY são obrigatórios.")
+    worker = InteractionWorker()
+    web.run_app(worker.build_app(), host=Config.INTERACTIONS_HOST, port=Config.INTERACTIONS_PORT)
+
+
+# Local stand-in for Discord: signs payloads and collects the followup webhooks
+
+class LocalDiscord:
+    """Posts signed interactions to a worker and records the followups it sends back"""
+
+    def __init__(self):
+        self.private_key, self.public_key = generate_signing_key()
+        self.followups = {}  # interaction token -> content
+        self.searches = 0
+        self._arrived = asyncio.Condition()
+
+    def build_app(self):
+        app = web.Application()
+        app.router.add_patch('/webhooks/{application_id}/{token}/messages/@original', self._followup)
+        app.router.add_get('/guilds/{guild_id}/members', self._members)
+        app.router.add_get('/guilds/{guild_id}/members/search', self._members)
+        return app
+
+    async def _followup(self, request):
+        content = (await request.json())['content']
+        async with self._arrived:
+            self.followups[request.match_info['token']] = content
+            self._arrived.notify_all()
+        return web.json_response({'content': content})
+
+    async def _members(self, request):
+        members = [
+            {'user': {'id': '1001', 'username': 'fulano'}, 'nick': 'Fulano'},
+            {'user': {'id': '1002', 'username': 'robo', 'bot': True}},
+        ]
+        query = request.query.get('query')
+        if query is not None:
+            self.searches += 1
+            members = [member for member in members if MemberSearchCache._matches(member, query.lower())]
+        return web.json_response(members)
+
+    async def post(self, session, url, payload, tamper=False):
+        body = json.dumps(payload).encode()
+        timestamp = str(int(time.time()))
+        signature = sign_payload(self.private_key, timestamp, body)
+        if tamper:
+            body += b" "
+        headers = {'X-Signature-Ed25519': signature, 'X-Signature-Timestamp': timestamp, 'Content-Type': 'application/json'}
+        async with session.post(url, data=body, headers=headers) as response:
+            return response.status, await response.json() if response.status == 200 else None
+
+    async def wait_followup(self, token, timeout=30):
+        async with self._arrived:
+            await asyncio.wait_for(self._arrived.wait_for(lambda: token in self.followups), timeout)
+        return self.followups[token]
+
+    @staticmethod
+    def command(name, token, options=None):
+        return {
+            'type': InteractionType.application_command.value,
+            'id': '1', 'application_id': '42', 'token': token, 'guild_id': '7',
+            'member': {'user': {'id': '1001', 'username': 'fulano'}, 'nick': 'Fulano'},
+            'data': {'name': name, 'options': options or []},
+        }
+
+
+async def demo(port=8787):
+    """Start a worker and a fake Discord API locally and exchange signed interactions"""
+    from personality_gemini import GeminiPersonalityEngine
+    discord_api = LocalDiscord()
+    api_runner = web.AppRunner(discord_api.build_app())
+    await api_runner.setup()
+    await web.TCPSite(api_runner, '127.0.0.1', port + 1).start()
+
+    worker = InteractionWorker(
+        personality=GeminiPersonalityEngine(client=None),
+        public_key=discord_api.public_key,
+        api_base=f"http://127.0.0.1:{port + 1}"
+    )
+    worker_runner = web.AppRunner(worker.build_app())
+    await worker_runner.setup()
+    await web.TCPSite(worker_runner, '127.0.0.1', port).start()
+    url = f"http://127.0.0.1:{port}{Config.INTERACTIONS_PATH}"
+
+    try:
+        async with aiohttp.ClientSession() as session:
+            status, body = await discord_api.post(session, url, {'type': InteractionType.ping.value})
+            print(f"ping: {status} {body}")
+            status, _ = await discord_api.post(session, url, {'type': InteractionType.ping.value}, tamper=True)
+            print(f"assinatura inválida: {status}")
+
+            for name, options in [('piada', None), ('zoa', None), ('elogio', None), ('conversa', [{'name': 'topico', 'value': 'games'}])]:
+                token = f"token-{name}"
+                status, body = await discord_api.post(session, url, discord_api.command(name, token, options))
+                print(f"/{name}: {status} tipo {body['type']} -> {await discord_api.wait_followup(token)}")
+
+            status, body = await discord_api.post(session, url, discord_api.command('piada', 'token-again'))
+            print(f"/piada de novo: {body['data']['content']}")
+
+            # One autocomplete per keystroke, as Discord sends them
+            searches = discord_api.searches
+            for typed in ('f', 'fu', 'ful', 'fula', 'fulano'):
+                autocomplete = discord_api.command('zoa', 'token-autocomplete', [{'name': 'membro', 'value': typed, 'focused': True}])
+                autocomplete['type'] = InteractionType.autocomplete.value
+                status, body = await discord_api.post(session, url, autocomplete)
+            print(f"autocomplete: {status} {body['data']['choices']} ({discord_api.searches - searches} busca(s) na API para 5 teclas)")
+    finally:
+        await worker_runner.cleanup()
+        await api_runner.cleanup()
+
+
+def main():
+    command = sys.argv[1] if len(sys.argv) > 1 else 'serve'
+    if command == 'serve':
+        serve()
+    elif command == 'demo':
+        logging.basicConfig(level=logging.WARNING)
+        asyncio.run(demo())
+    else:
+        raise SystemExit("uso: python interactions_server.py [serve|demo]")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import signal
+import time
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+STATE_VERSION = 1
+
+class InFlightTracker:
+    """Counts handlers that are generating a reply, so shutdown can wait for them"""
+
+    def __init__(self):
+        self.count = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    @contextlib.asynccontextmanager
+    async def track(self):
+        self.count += 1
+        self._idle.clear()
+        try:
+            yield
+        finally:
+            self.count -= 1
+            if self.count == 0:
+                self._idle.set()
+
+    async def wait(self, timeout):
+        """Wait until nothing is in flight; returns False on timeout"""
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout=max(0.0, timeout))
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+
+def save_state(bot, path=None):
+    """Write the state worth handing to the next process"""
+    path = path or Config.STATE_PATH
+    state = {
+        'version': STATE_VERSION,
+        'saved_at': time.time(),
+        'personality': bot.personality.export_state(),
+        'rate_limiter': bot.rate_limiter.export_state(),
+        'member_names': bot.member_cache.names.export_state(),
+        'participation': bot.participation.export_state(),
+    }
+    tmp_path = path + ".tmp"
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        logger.info(f"Estado salvo em {path}")
+    except OSError as e:
+        logger.error(f"Erro ao salvar estado: {e}")
+
+def restore_state(bot, path=None):
+    """Load state left by the previous process, if recent enough"""
+    path = path or Config.STATE_PATH
+    if not os.path.exists(path):
+        return False
+    try:
+        with open(path, encoding='utf-8') as f:
+            state = json.load(f)
+        age = time.time() - state['saved_at']
+        if state.get('version') != STATE_VERSION or age > Config.STATE_MAX_AGE:
+            logger.info(f"Estado anterior ignorado (versão {state.get('version')}, {age:.0f}s atrás)")
+            return False
+
+        bot.personality.import_state(state['personality'])
+        bot.rate_limiter.import_state(state['rate_limiter'])
+        bot.member_cache.names.import_state(state['member_names'])
+        bot.participation.import_state(state.get('participation', {}))
+        logger.info(f"Estado restaurado de {age:.0f}s atrás")
+        return True
+    except Exception as e:
+        logger.error(f"Erro ao restaurar estado: {e}")
+        return False
+
+
+async def graceful_shutdown(bot, deadline=None):
+    """Stop intake, let in-flight replies finish within the deadline, flush state and close"""
+    if not bot.accepting:
+        return
+    bot.accepting = False
+    deadline = deadline if deadline is not None else Config.SHUTDOWN_DEADLINE
+    ends_at = time.monotonic() + deadline
+    logger.info(f"Desligando: {bot.in_flight.count} respostas em andamento, prazo de {deadline:.0f}s")
+
+    if not await bot.in_flight.wait(ends_at - time.monotonic()):
+        logger.warning(f"{bot.in_flight.count} respostas não terminaram dentro do prazo")
+
+    # Welcomes still waiting for their batch window go out now, canned if the model is too slow
+    await bot.welcomer.flush_pending(max(0.0, ends_at - time.monotonic()))
+    undelivered = await bot.dispatcher.drain(max(0.0, ends_at - time.monotonic()))
+    if undelivered:
+        logger.warning(f"{undelivered} mensagens não foram enviadas antes do desligamento")
+
+    save_state(bot)
+    await bot.close()
+
+def install_signal_handlers(bot):
+    """SIGTERM/SIGINT start a graceful shutdown instead of killing the loop"""
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(sig, lambda: asyncio.create_task(graceful_shutdown(bot)))
+        except (NotImplementedError, RuntimeError):
+            # Windows event loops do not support signal handlers
+            pass
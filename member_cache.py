@@ -0,0 +1,342 @@
+import asyncio
+import bisect
+import logging
+import random
+import resource
+import subprocess
+import sys
+import time
+import discord
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+class MemberNameIndex:
+    """Per-guild display name index used for autocomplete without the member cache"""
+
+    def __init__(self, max_per_guild=None):
+        self.max_per_guild = max_per_guild or Config.MEMBER_INDEX_MAX_PER_GUILD
+        self._names = {}   # guild_id -> {member_id: display_name}, oldest first
+        self._sorted = {}  # guild_id -> sorted [(lower_name, member_id)], rebuilt on demand
+
+    def add(self, member):
+        """Remember (or refresh) a member's display name"""
+        if member.bot:
+            return
+        names = self._names.setdefault(member.guild.id, {})
+        if names.get(member.id) == member.display_name:
+            return
+        names.pop(member.id, None)
+        names[member.id] = member.display_name
+        if len(names) > self.max_per_guild:
+            # Forget the member seen longest ago
+            del names[next(iter(names))]
+        self._sorted.pop(member.guild.id, None)
+
+    def add_many(self, members):
+        for member in members:
+            self.add(member)
+
+    def remove(self, guild_id, member_id):
+        names = self._names.get(guild_id)
+        if names and names.pop(member_id, None) is not None:
+            self._sorted.pop(guild_id, None)
+
+    def search(self, guild_id, query, limit=25):
+        """Members whose name starts with the query, then ones containing it"""
+        names = self._names.get(guild_id)
+        if not names:
+            return []
+
+        ordered = self._sorted.get(guild_id)
+        if ordered is None:
+            ordered = self._sorted[guild_id] = sorted((name.lower(), member_id) for member_id, name in names.items())
+
+        query = query.lower().strip()
+        start = bisect.bisect_left(ordered, (query,))
+        matches = []
+        for lower_name, member_id in ordered[start:]:
+            if not lower_name.startswith(query) or len(matches) >= limit:
+                break
+            matches.append(member_id)
+
+        if len(matches) < limit and query:
+            seen = set(matches)
+            for lower_name, member_id in ordered:
+                if query in lower_name and member_id not in seen:
+                    matches.append(member_id)
+                    if len(matches) >= limit:
+                        break
+
+        return [(member_id, names[member_id]) for member_id in matches]
+
+    def forget_guild(self, guild_id):
+        self._names.pop(guild_id, None)
+        self._sorted.pop(guild_id, None)
+
+    def export_state(self):
+        return {str(guild_id): {str(mid): name for mid, name in names.items()} for guild_id, names in self._names.items()}
+
+    def import_state(self, state):
+        for guild_id, names in state.items():
+            self._names[int(guild_id)] = {int(mid): name for mid, name in names.items()}
+
+    def __len__(self):
+        return sum(len(names) for names in self._names.values())
+
+
+class MemberCacheManager:
+    """Controls how guild members are cached and resolves members on demand"""
+
+    EAGER = "eager"
+    LAZY = "lazy"
+
+    def __init__(self, mode=None):
+        self.mode = (mode or Config.MEMBER_CACHE_MODE).lower()
+        if self.mode not in (self.EAGER, self.LAZY):
+            logger.warning(f"MEMBER_CACHE_MODE inválido '{self.mode}', usando '{self.LAZY}'")
+            self.mode = self.LAZY
+
+        self._chunked_guilds = set()
+        self._chunk_locks = {}
+        self.names = MemberNameIndex()
+        self.chunk_requests = 0
+        self.member_queries = 0
+
+    @property
+    def is_lazy(self):
+        return self.mode == self.LAZY
+
+    def client_options(self, intents):
+        """Keyword arguments for commands.Bot matching the configured mode"""
+        if not self.is_lazy:
+            return {
+                'member_cache_flags': discord.MemberCacheFlags.from_intents(intents),
+                'chunk_guilds_at_startup': True,
+            }
+
+        # Members still arrive in message/join payloads; only the full
+        # per-guild lists are skipped until a command actually needs them
+        return {
+            'member_cache_flags': discord.MemberCacheFlags.none(),
+            'chunk_guilds_at_startup': False,
+        }
+
+    def is_chunked(self, guild):
+        """Check if the full member list of a guild is available locally"""
+        return not self.is_lazy or guild.chunked or guild.id in self._chunked_guilds
+
+    async def ensure_chunked(self, guild):
+        """Chunk a guild the first time its full member list is needed"""
+        if self.is_chunked(guild):
+            return
+
+        lock = self._chunk_locks.setdefault(guild.id, asyncio.Lock())
+        async with lock:
+            if self.is_chunked(guild):
+                return
+
+            started = time.perf_counter()
+            await guild.chunk(cache=True)
+            self.chunk_requests += 1
+            self._chunked_guilds.add(guild.id)
+            self.names.add_many(guild.members)
+            logger.info(
+                f"Membros de {guild.name} carregados sob demanda "
+                f"({len(guild.members)} membros em {time.perf_counter() - started:.2f}s)"
+            )
+
+    async def find_member(self, guild, name):
+        """Find a member whose display name contains the given text
+
+        Cached members and the local name index match anywhere in the name.
+        Only the last resort, a gateway query, matches username/nickname
+        prefixes (that is all Discord's member search supports).
+        """
+        name_lower = name.lower()
+        member = discord.utils.find(
+            lambda m: name_lower in m.display_name.lower(),
+            guild.members
+        )
+        if member or self.is_chunked(guild):
+            return member
+
+        # Names seen in chat keep substring matching without a gateway request
+        for member_id, _ in self.names.search(guild.id, name, limit=3):
+            member = guild.get_member(member_id)
+            if member is None:
+                try:
+                    member = await guild.fetch_member(member_id)
+                except discord.HTTPException:
+                    continue
+            if name_lower in member.display_name.lower():
+                return member
+
+        # Ask the gateway instead of downloading the whole guild
+        self.member_queries += 1
+        candidates = await guild.query_members(query=name, limit=5, cache=True)
+        self.names.add_many(candidates)
+        for candidate in candidates:
+            if name_lower in candidate.display_name.lower():
+                return candidate
+        return candidates[0] if candidates else None
+
+    async def resolve_member(self, guild, value):
+        """Resolve an autocomplete value (member id) or a typed name"""
+        if value.isdigit():
+            member = guild.get_member(int(value))
+            if member:
+                return member
+            try:
+                return await guild.fetch_member(int(value))
+            except discord.HTTPException:
+                pass
+        return await self.find_member(guild, value)
+
+    def remember(self, member):
+        """Index a member seen in a message or event payload"""
+        if isinstance(member, discord.Member):
+            self.names.add(member)
+
+    async def random_member(self, guild):
+        """Pick a random non-bot member of the guild"""
+        await self.ensure_chunked(guild)
+        humans = [m for m in guild.members if not m.bot]
+        return random.choice(humans) if humans else None
+
+    def member_count(self, guilds):
+        """Total member count without requiring the member cache"""
+        if not self.is_lazy:
+            return len({m.id for g in guilds for m in g.members})
+        return sum(g.member_count or 0 for g in guilds)
+
+    def forget_guild(self, guild_id):
+        """Drop chunking state for a guild the bot left"""
+        self._chunked_guilds.discard(guild_id)
+        self._chunk_locks.pop(guild_id, None)
+        self.names.forget_guild(guild_id)
+
+    def get_stats(self):
+        """Get member cache statistics"""
+        return {
+            'mode': self.mode,
+            'chunked_guilds': len(self._chunked_guilds),
+            'chunk_requests': self.chunk_requests,
+            'member_queries': self.member_queries,
+            'indexed_names': len(self.names),
+        }
+
+
+def _member_payload(member_id):
+    """A GUILD_MEMBERS_CHUNK member entry shaped like the gateway sends it"""
+    return {
+        'user': {
+            'id': str(member_id),
+            'username': f"membro_{member_id}",
+            'global_name': None if member_id % 3 else f"Membro {member_id}",
+            'discriminator': '0',
+            'avatar': f"{member_id:032x}",
+        },
+        'nick': None if member_id % 5 else f"apelido_{member_id}",
+        'roles': [str(role) for role in range(1, member_id % 4 + 1)],
+        'joined_at': "2024-01-01T00:00:00+00:00",
+        'deaf': False,
+        'mute': False,
+        'flags': 0,
+    }
+
+
+class _ReplayGateway:
+    """Answers member requests (op 8) with synthetic chunks, like the gateway would
+
+    Chunks arrive after a short delay, as real gateway events do, and go
+    through discord.py's own parse_guild_members_chunk.
+    """
+
+    CHUNK_SIZE = 1000
+    LATENCY = 0.001  # seconds; requests wait for chunks only after sending
+
+    def __init__(self, state, members_per_guild):
+        self.state = state
+        self.members_per_guild = members_per_guild
+        self.requests = 0
+
+    async def request_chunks(self, guild_id, query=None, *, limit, user_ids=None, presences=False, nonce=None):
+        self.requests += 1
+        base = guild_id * self.members_per_guild
+        member_ids = range(base, base + self.members_per_guild)
+        if query:
+            member_ids = [mid for mid in member_ids if f"membro_{mid}".startswith(query.lower())][:limit or None]
+        asyncio.get_running_loop().call_later(self.LATENCY, self._deliver, guild_id, list(member_ids), nonce)
+
+    def _deliver(self, guild_id, member_ids, nonce):
+        chunks = [member_ids[i:i + self.CHUNK_SIZE] for i in range(0, len(member_ids), self.CHUNK_SIZE)] or [[]]
+        for index, chunk in enumerate(chunks):
+            self.state.parse_guild_members_chunk({
+                'guild_id': str(guild_id),
+                'members': [_member_payload(mid) for mid in chunk],
+                'chunk_index': index,
+                'chunk_count': len(chunks),
+                'nonce': nonce,
+            })
+
+
+async def _run_benchmark_mode(mode, guilds, members_per_guild, active_guilds):
+    """Start a real discord.py client state in one cache mode; timing, peak RSS and cached members"""
+    from discord.ext import commands
+
+    intents = discord.Intents.default()
+    intents.members = True
+    manager = MemberCacheManager(mode)
+    bot = commands.Bot(command_prefix='!', intents=intents, **manager.client_options(intents))
+    state = bot._connection
+    state.loop = asyncio.get_running_loop()
+    gateway = _ReplayGateway(state, members_per_guild)
+    state._get_websocket = lambda *args, **kwargs: gateway
+
+    started = time.perf_counter()
+    # GUILD_CREATE of a large guild carries no member list
+    joined = [
+        state._add_guild_from_data({
+            'id': str(guild_id), 'name': f"servidor {guild_id}", 'member_count': members_per_guild,
+            'large': True, 'members': [], 'channels': [], 'roles': [], 'emojis': [], 'stickers': [],
+        })
+        for guild_id in range(1, guilds + 1)
+    ]
+    if mode == MemberCacheManager.EAGER:
+        # What chunk_guilds_at_startup does before READY
+        await asyncio.gather(*(guild.chunk() for guild in joined))
+    else:
+        # Commands in the active guilds: !zoa without a target, then a name lookup elsewhere
+        for guild in joined[:active_guilds]:
+            await manager.random_member(guild)
+        await manager.find_member(joined[-1], f"membro_{guilds * members_per_guild}")
+    elapsed = time.perf_counter() - started
+
+    peak_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    cached = sum(len(guild.members) for guild in joined)
+    return elapsed, peak_rss_kb, cached, gateway.requests
+
+
+def run_benchmark(guilds=20, members_per_guild=10000, active_guilds=2):
+    """Compare eager and lazy member caching through discord.py's chunking path"""
+    print(f"{guilds} servidores x {members_per_guild} membros ({active_guilds} ativos)")
+    for mode in (MemberCacheManager.EAGER, MemberCacheManager.LAZY):
+        # Each mode runs in a fresh interpreter so peak RSS is not shared
+        output = subprocess.check_output([
+            sys.executable, __file__, '--mode', mode,
+            str(guilds), str(members_per_guild), str(active_guilds)
+        ], text=True)
+        elapsed, rss_kb, cached, requests = output.split()
+        print(
+            f"  {mode:>5}: startup {float(elapsed) * 1000:8.1f} ms, RSS máx {int(rss_kb) / 1024:8.1f} MB, "
+            f"{int(cached):8d} membros em cache, {requests} pedidos ao gateway"
+        )
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == '--mode':
+        mode, guilds, members, active = sys.argv[2], *map(int, sys.argv[3:6])
+        print(*asyncio.run(_run_benchmark_mode(mode, guilds, members, active)))
+    else:
+        run_benchmark(*map(int, sys.argv[1:4]))
@@ -0,0 +1,241 @@
+import asyncio
+import gc
+import logging
+import os
+import random
+import resource
+import sys
+import time
+import tracemalloc
+from types import SimpleNamespace
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Allocations made by the tracer itself or by imports are noise
+_SNAPSHOT_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+def current_rss():
+    """Current resident set size in bytes (peak RSS where /proc is unavailable)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def deep_sizeof(obj, limit=100000):
+    """Approximate size of an object graph (containers, __dict__ and __slots__)"""
+    seen = set()
+    stack = [obj]
+    size = 0
+    while stack and len(seen) < limit:
+        current = stack.pop()
+        if id(current) in seen:
+            continue
+        seen.add(id(current))
+        size += sys.getsizeof(current)
+
+        if isinstance(current, dict):
+            stack.extend(current.keys())
+            stack.extend(current.values())
+        elif isinstance(current, (list, tuple, set, frozenset)) or type(current).__name__ == 'deque':
+            stack.extend(current)
+        elif hasattr(current, '__dict__') and not isinstance(current, type):
+            stack.append(vars(current))
+        elif hasattr(type(current), '__slots__'):
+            stack.extend(getattr(current, slot) for slot in type(current).__slots__ if hasattr(current, slot))
+    return size
+
+def format_size(size):
+    for unit in ("B", "KiB", "MiB"):
+        if abs(size) < 1024:
+            return f"{size:.0f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GiB"
+
+
+class MemoryMonitor:
+    """Tracks RSS, per-structure sizes and allocation growth between snapshots"""
+
+    def __init__(self, bot=None):
+        self.bot = bot
+        self.baseline = None
+        self.previous = None
+        self._task = None
+        self.snapshots = 0
+
+    @property
+    def tracing(self):
+        return tracemalloc.is_tracing()
+
+    def start_tracing(self):
+        """Start tracemalloc and take the baseline snapshot"""
+        if not self.tracing:
+            tracemalloc.start(Config.MEMORY_TRACE_FRAMES)
+        self.baseline = self.previous = self._snapshot()
+
+    def start(self):
+        """Periodic snapshots in the background (only when enabled; tracing has overhead)"""
+        if Config.MEMORY_MONITOR and self._task is None:
+            self.start_tracing()
+            self._task = asyncio.create_task(self._snapshot_loop())
+
+    async def _snapshot_loop(self):
+        while True:
+            await asyncio.sleep(Config.MEMORY_SNAPSHOT_INTERVAL)
+            snapshot = self._snapshot()
+            growth = sum(stat.size_diff for stat in snapshot.compare_to(self.previous, 'filename'))
+            self.previous = snapshot
+            if growth >= Config.MEMORY_GROWTH_WARN_MB * 1024 * 1024:
+                top = self.top_growth(limit=3, snapshot=snapshot)
+                logger.warning(
+                    f"Memória cresceu {format_size(growth)} desde o último snapshot; "
+                    + "; ".join(f"{site} +{format_size(size)}" for site, size, _ in top)
+                )
+
+    def _snapshot(self):
+        self.snapshots += 1
+        return tracemalloc.take_snapshot().filter_traces(_SNAPSHOT_FILTERS)
+
+    def top_growth(self, limit=10, snapshot=None, key_type='lineno'):
+        """Allocation sites that grew the most since the baseline"""
+        if self.baseline is None:
+            return []
+        snapshot = snapshot or self._snapshot()
+        stats = snapshot.compare_to(self.baseline, key_type)
+        growth = [stat for stat in stats if stat.size_diff > 0][:limit]
+        return [(str(stat.traceback[0]), stat.size_diff, stat.count_diff) for stat in growth]
+
+    def structure_sizes(self):
+        """Entry counts and estimated sizes of the bot's long-lived structures"""
+        bot = self.bot
+        sizes = {}
+
+        def add(name, obj, entries):
+            sizes[name] = {'entries': entries, 'bytes': deep_sizeof(obj)}
+
+        personality = bot.personality
+        add('conversation_history', personality.conversation_history, len(personality.conversation_history))
+        add('channel_context', personality.channel_context.channels, len(personality.channel_context.channels))
+        add('rate_limiter', bot.rate_limiter.user_timestamps, len(bot.rate_limiter.user_timestamps))
+        if not bot.state.shared:
+            add('cooldowns', bot.state.buckets, len(bot.state.buckets))
+        add('member_name_index', bot.member_cache.names, len(bot.member_cache.names))
+        add('analytics', bot.analytics.guilds, len(bot.analytics.guilds))
+        add('participation', bot.participation.channels, len(bot.participation.channels))
+        add('reply_cache', bot.reply_cache.entries, len(bot.reply_cache.entries))
+        add('audit_pending', personality.audit._pending, len(personality.audit._pending))
+
+        # discord.py caches are only counted; walking them would take too long
+        sizes['discord_messages'] = {'entries': len(bot.cached_messages), 'bytes': None}
+        sizes['discord_members'] = {'entries': sum(len(g.members) for g in bot.guilds), 'bytes': None}
+        sizes['discord_users'] = {'entries': len(bot.users), 'bytes': None}
+        return sizes
+
+    def get_stats(self):
+        traced, peak = tracemalloc.get_traced_memory() if self.tracing else (0, 0)
+        return {
+            'rss': current_rss(),
+            'traced': traced,
+            'traced_peak': peak,
+            'tracing': self.tracing,
+            'snapshots': self.snapshots,
+        }
+
+
+def _synthetic_message(rng, guilds, channels):
+    guild = guilds[rng.randrange(len(guilds))]
+    channel = channels[guild.id][rng.randrange(len(channels[guild.id]))]
+    user_id = rng.randrange(1, 200000)
+    author = SimpleNamespace(id=user_id, bot=False, guild=guild, display_name=f"membro_{user_id}")
+    content = rng.choice([
+        "alguém aí jogou o jogo novo? achei muito legal",
+        "claro né, com certeza isso vai dar certo",
+        "qual o melhor anime da temporada?",
+        "kkkk esse meme é muito bom",
+        "bom dia pessoal",
+    ])
+    return SimpleNamespace(author=author, guild=guild, channel=channel, content=content)
+
+def soak(messages=1_000_000, warmup_fraction=0.1, max_growth_mb=None, max_object_growth=10000, trace=False):
+    """Feed synthetic messages through the per-message state and check memory stays flat
+
+    After a warm-up that lets every bounded structure fill up, RSS and the
+    number of live objects must stay put. tracemalloc multiplies the cost of
+    every allocation, so growth sites are only traced on request.
+    """
+    from analytics import AnalyticsStore
+    from member_cache import MemberNameIndex
+    from personality_gemini import GeminiPersonalityEngine
+    from utils import RateLimiter
+
+    max_growth_mb = max_growth_mb if max_growth_mb is not None else Config.MEMORY_SOAK_MAX_GROWTH_MB
+    rng = random.Random(42)
+    guilds = [SimpleNamespace(id=guild_id, name=f"servidor_{guild_id}") for guild_id in range(5)]
+    channels = {g.id: [SimpleNamespace(id=g.id * 100 + c, name=f"canal_{c}") for c in range(20)] for g in guilds}
+
+    engine = GeminiPersonalityEngine(client=None)
+    limiter = RateLimiter()
+    names = MemberNameIndex()
+    analytics = AnalyticsStore(path=os.path.join(os.path.dirname(os.path.abspath(__file__)), ".soak_analytics.json"))
+
+    if trace:
+        # One frame is enough for per-line growth
+        tracemalloc.start(1)
+    # The soak's own bookkeeping is not growth of the bot's structures
+    filters = _SNAPSHOT_FILTERS + (tracemalloc.Filter(False, __file__),)
+    warmup = int(messages * warmup_fraction)
+    started = time.perf_counter()
+
+    for i in range(messages):
+        if i == warmup:
+            gc.collect()
+            baseline_rss = current_rss()
+            baseline_objects = len(gc.get_objects())
+            baseline = tracemalloc.take_snapshot().filter_traces(filters) if trace else None
+
+        message = _synthetic_message(rng, guilds, channels)
+        names.add(message.author)
+        analytics.record_message(message)
+        if limiter.check_user(message.author.id):
+            reply = engine._get_casual_fallback(message.content)
+            if reply:
+                engine._update_conversation_history(message.author.display_name, message.content, reply, message.author.id)
+                analytics.record_reply(message)
+
+    gc.collect()
+    rss_growth = current_rss() - baseline_rss
+    object_growth = len(gc.get_objects()) - baseline_objects
+    elapsed = time.perf_counter() - started
+
+    print(
+        f"{messages} mensagens em {elapsed:.1f}s; após aquecimento: RSS {format_size(rss_growth)}, "
+        f"{object_growth:+d} objetos"
+    )
+    if trace:
+        final = tracemalloc.take_snapshot().filter_traces(filters)
+        for stat in final.compare_to(baseline, 'lineno')[:5]:
+            print(f"  {stat.traceback[0]}: {format_size(stat.size_diff)} ({stat.count_diff:+d} blocos)")
+        tracemalloc.stop()
+    return rss_growth < max_growth_mb * 1024 * 1024 and object_growth < max_object_growth
+
+
+def main():
+    command = sys.argv[1] if len(sys.argv) > 1 else 'soak'
+    if command == 'soak':
+        args = [arg for arg in sys.argv[2:] if not arg.startswith('--')]
+        messages = int(args[0]) if args else 1_000_000
+        if not soak(messages, trace='--trace' in sys.argv):
+            raise SystemExit("Memória não ficou estável durante o teste de carga")
+        print("Memória estável")
+    else:
+        raise SystemExit("uso: python memory_monitor.py soak [mensagens] [--trace]")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+import random
+import time
+from analytics import DecayedCounter
+from config import Config
+
+class ChannelParticipation:
+    """Decayed traffic and reply rates for one channel plus its feedback gain"""
+
+    __slots__ = ('messages', 'replies', 'gain', 'probability')
+
+    def __init__(self):
+        self.messages = DecayedCounter()
+        self.replies = DecayedCounter()
+        self.gain = 1.0
+        self.probability = Config.PARTICIPATION_MAX_PROBABILITY
+
+
+class ParticipationController:
+    """Adjusts casual participation so each channel gets about the same replies per hour
+
+    The base probability is target / incoming rate, so busy channels are
+    rolled less often and quiet ones more. A per-channel gain corrects for
+    replies that never happen (rate limits, empty responses) or that happen
+    too often, and every channel is scaled down together once the bot's
+    total reply rate goes over the global budget.
+    """
+
+    def __init__(self, target_per_hour=None, global_budget_per_hour=None, rng=None):
+        self.target = target_per_hour or Config.PARTICIPATION_TARGET_PER_HOUR
+        self.global_budget = global_budget_per_hour or Config.PARTICIPATION_GLOBAL_BUDGET_PER_HOUR
+        self.half_life = Config.PARTICIPATION_HALF_LIFE
+        self.channels = {}  # channel_id -> ChannelParticipation
+        self.replies = DecayedCounter()
+        self.rng = rng or random.Random()
+        self.rolls = 0
+        self.accepted = 0
+
+    def _channel(self, channel_id):
+        channel = self.channels.get(channel_id)
+        if channel is None:
+            if len(self.channels) >= Config.PARTICIPATION_MAX_CHANNELS:
+                # Evict the quietest channel
+                quietest = min(self.channels, key=lambda cid: self.channels[cid].messages.get(self.half_life))
+                del self.channels[quietest]
+            channel = self.channels[channel_id] = ChannelParticipation()
+        return channel
+
+    def global_factor(self, now=None):
+        """1.0 under the global budget, shrinking in proportion once over it"""
+        rate = self.replies.rate_per_hour(self.half_life, now)
+        return min(1.0, self.global_budget / rate) if rate > 0 else 1.0
+
+    def should_participate(self, channel_id, weight=1.0, now=None):
+        """Count an eligible message and roll against the channel's current probability"""
+        now = now or time.time()
+        channel = self._channel(channel_id)
+        channel.messages.add(self.half_life, now=now)
+
+        incoming = channel.messages.rate_per_hour(self.half_life, now)
+        replies = channel.replies.rate_per_hour(self.half_life, now)
+        # Integral term: nudge the gain towards the target, bounded so a silent
+        # channel cannot wind it up forever
+        error = (self.target + 1.0) / (replies + 1.0)
+        channel.gain = min(max(channel.gain * error ** Config.PARTICIPATION_FEEDBACK, 0.1), 10.0)
+
+        probability = channel.gain * self.target / incoming * self.global_factor(now)
+        channel.probability = min(max(probability, Config.PARTICIPATION_MIN_PROBABILITY), Config.PARTICIPATION_MAX_PROBABILITY)
+
+        self.rolls += 1
+        if self.rng.random() < min(channel.probability * weight, 1.0):
+            self.accepted += 1
+            return True
+        return False
+
+    def record_reply(self, channel_id, now=None):
+        """Count a casual reply that was actually sent"""
+        now = now or time.time()
+        self._channel(channel_id).replies.add(self.half_life, now=now)
+        self.replies.add(self.half_life, now=now)
+
+    def forget_channel(self, channel_id):
+        self.channels.pop(channel_id, None)
+
+    def channel_state(self, channel_id, now=None):
+        channel = self.channels.get(channel_id)
+        if channel is None:
+            return None
+        return {
+            'messages_per_hour': channel.messages.rate_per_hour(self.half_life, now),
+            'replies_per_hour': channel.replies.rate_per_hour(self.half_life, now),
+            'gain': channel.gain,
+            'probability': channel.probability,
+        }
+
+    def export_state(self):
+        def counter(c):
+            return [c.value, c.updated_at]
+        return {
+            'channels': {
+                str(cid): {'messages': counter(c.messages), 'replies': counter(c.replies), 'gain': c.gain}
+                for cid, c in self.channels.items()
+            },
+            'replies': counter(self.replies),
+        }
+
+    def import_state(self, state):
+        for cid, data in state.get('channels', {}).items():
+            channel = self._channel(int(cid))
+            channel.messages = DecayedCounter(*data['messages'])
+            channel.replies = DecayedCounter(*data['replies'])
+            channel.gain = data['gain']
+        if 'replies' in state:
+            self.replies = DecayedCounter(*state['replies'])
+
+    def get_stats(self):
+        return {
+            'channels': len(self.channels),
+            'replies_per_hour': self.replies.rate_per_hour(self.half_life),
+            'target_per_hour': self.target,
+            'global_budget_per_hour': self.global_budget,
+            'global_factor': self.global_factor(),
+            'acceptance_rate': self.accepted / self.rolls if self.rolls else 0.0,
+        }
@@ -2,6 +2,7 @@ import random
 import asyncio
 from openai import OpenAI
 from config import Config
+from transport import get_shared_transport
 import logging
 
 logger = logging.getLogger(__name__)
@@ -10,7 +11,10 @@ class PersonalityEngine:
     """Handles the bot's personality and response generation using OpenAI"""
     
     def __init__(self):
-        self.client = OpenAI(api_key=Config.OPENAI_API_KEY)
+        self.client = OpenAI(
+            api_key=Config.OPENAI_API_KEY,
+            http_client=get_shared_transport().openai_http_client()
+        )
         self.conversation_history = {}  # Store recent conversations per user
         
         # Enhanced fallback responses
@@ -1,8 +1,20 @@
 import random
 import asyncio
 import os
-from google import genai
+import time
 from config import Config
+from circuit_breaker import CircuitBreaker
+from fallback_model import LocalReplyModel, ReplyCorpus
+from transport import get_shared_transport
+from audit_log import get_interaction_log
+from cassette import Cassette
+from quota import QuotaScheduler
+from user_profiles import UserProfileStore
+from retrieval import ChannelRetrieval
+from prompts import (
+    PERSONA_INSTRUCTION, render_prompt, build_mention_prompt, build_casual_prompt,
+    detect_irony, detect_heavy
+)
 import logging
 
 logger = logging.getLogger(__name__)
@@ -10,17 +22,22 @@ logger = logging.getLogger(__name__)
 class GeminiPersonalityEngine:
     """Handles the bot's personality and response generation using Google Gemini (free)"""
     
-    def __init__(self):
-        # Initialize Gemini client
-        gemini_key = os.getenv('GEMINI_API_KEY')
-        if gemini_key:
-            self.client = genai.Client(api_key=gemini_key)
-            self.has_api = True
-        else:
-            self.client = None
-            self.has_api = False
-            
+    # Hosts to pre-connect to at startup
+    provider_urls = ["https://generativelanguage.googleapis.com/"]
+    backend_name = "Gemini"  # shown by !status
+    
+    def __init__(self, client=None):
+        self.client = self._create_client(client)
+        self.has_api = self.client is not None
+        
+        self.breaker = CircuitBreaker("gemini")
+        self.quota = QuotaScheduler()
+        self.usage = {}  # profile -> call count, latency and token totals
+        self.audit = get_interaction_log()
+        
         self.conversation_history = {}  # Store recent conversations per user
+        self.profiles = UserProfileStore()  # short summaries built in the background (user_profiles.py)
+        self.channel_context = ChannelRetrieval()  # recent channel lines retrieved into prompts
         
         # Enhanced fallback responses - menos sarcástico, mais direto
         self.fallback_responses = [
@@ -72,6 +89,40 @@ class GeminiPersonalityEngine:
             "Dahora! Conte mais sobre isso!"
         ]
         
+        # Fallback replies per category (contextual = mentions, casual = participation)
+        self.contextual_responses = {
+            'greeting': self.greeting_responses,
+            'question': self.question_responses,
+            'goodbye': self.goodbye_responses,
+            'compliment': self.compliment_responses,
+            'tech': self.tech_responses,
+            'laugh': ["Kkkkk também achei engraçado! 😂"],
+            'long': ["Eita, textão! Resumindo: concordo contigo! 📝"],
+            'default': self.fallback_responses,
+        }
+        
+        self.casual_responses = {
+            'irony': ["Ah tá né 😭", "Claro que sim 😭", "Entendi a ironia 😭"],
+            'heavy': ["Eita 💀", "Nossa 💀", "Caramba 💀"],
+            'casual_question': [
+                "Boa pergunta! Também tô curioso sobre isso",
+                "Interessante... alguém sabe responder?",
+                "Essa é difícil! E vocês, o que acham?"
+            ],
+            'opinion': ["Concordo!", "Interessante ponto de vista!", "Faz sentido!"],
+            'casual_tech': [
+                "Dahora! Também curto essas paradas",
+                "Massa! Você manja do assunto",
+                "Top! Conte mais sobre isso"
+            ],
+            'positive': ["Né que é!", "Exato!", "Concordo plenamente!"],
+            'casual': ["Interessante isso!", "Hmm...", "Entendi!", "Faz sentido!"],
+        }
+        
+        # Local generator trained from logged replies (see fallback_model.py)
+        self.fallback_model = LocalReplyModel.load()
+        self.reply_corpus = ReplyCorpus() if Config.LOG_GOOD_REPLIES else None
+        
         # Welcome messages templates
         self.welcome_templates = [
             "Olha só quem chegou! Bem-vindo(a) {name} ao {server}! 🎉",
@@ -80,7 +131,7 @@ class GeminiPersonalityEngine:
             "Chegou reforço! {name} está agora no {server}! Seja bem-vindo(a) à bagunça! 🎊"
         ]
     
-    async def generate_response(self, message_content, user_name, guild_name):
+    async def generate_response(self, message_content, user_name, guild_name, channel_id=None, reply_chain=None, user_id=None):
         """Generate a response using Gemini AI or smart fallbacks"""
         try:
             # Clean the message (remove mentions)
@@ -94,19 +145,18 @@ class GeminiPersonalityEngine:
             if self.has_api and self.client:
                 try:
                     # Build prompt for Gemini
-                    prompt = self._build_gemini_prompt(user_name, guild_name, clean_message)
+                    prompt = self._build_gemini_prompt(user_name, guild_name, clean_message, channel_id, reply_chain, user_id)
                     
                     # Generate response with Gemini
-                    response = self.client.models.generate_content(
-                        model="gemini-2.5-flash",
-                        contents=prompt
-                    )
+                    bot_response = await self._generate(prompt, 'mention')
                     
-                    if response.text:
-                        bot_response = response.text.strip()
+                    if bot_response:
                         
                         # Update conversation history
-                        self._update_conversation_history(user_name, clean_message, bot_response)
+                        self._update_conversation_history(user_name, clean_message, bot_response, user_id)
+                        
+                        if self.reply_corpus:
+                            self.reply_corpus.add(self._contextual_category(clean_message), bot_response)
                         
                         return bot_response
                         
@@ -125,32 +175,25 @@ class GeminiPersonalityEngine:
         """Generate a welcome message for new members"""
         try:
             if self.has_api and self.client:
-                prompt = f"""
-                Gere uma mensagem de boas-vindas engraçada e acolhedora para {user_name} 
-                que acabou de entrar no servidor {guild_name}. 
-                
-                Seja carismático, use humor brasileiro e emojis. 
-                Máximo 2 frases. Mencione o nome da pessoa e do servidor.
-                Fale português do Brasil naturalmente.
-                """
-                
-                response = self.client.models.generate_content(
-                    model="gemini-2.5-flash",
-                    contents=prompt
-                )
+                prompt = render_prompt('welcome', user_name=user_name, guild_name=guild_name)
                 
-                if response.text:
-                    return response.text.strip()
+                welcome_msg = await self._generate(prompt, 'welcome')
+                if welcome_msg:
+                    return welcome_msg
                     
         except Exception as e:
             logger.error(f"Erro ao gerar mensagem de boas-vindas: {e}")
             
+        return self.canned_welcome_message(user_name, guild_name)
+    
+    def canned_welcome_message(self, user_name, guild_name):
+        """Welcome from the local templates, without a model call"""
         return random.choice(self.welcome_templates).format(
             name=user_name, 
             server=guild_name
         )
     
-    async def generate_casual_response(self, message_content, user_name, guild_name):
+    async def generate_casual_response(self, message_content, user_name, guild_name, channel_id=None, user_id=None):
         """Generate a casual response for natural conversation participation"""
         try:
             # Clean the message
@@ -163,18 +206,20 @@ class GeminiPersonalityEngine:
             if self.has_api and self.client:
                 try:
                     # Build casual prompt
-                    prompt = self._build_casual_prompt(user_name, guild_name, clean_message)
+                    prompt = self._build_casual_prompt(user_name, guild_name, clean_message, channel_id, user_id)
                     
-                    response = self.client.models.generate_content(
-                        model="gemini-2.5-flash",
-                        contents=prompt
-                    )
+                    bot_response = await self._generate(prompt, 'casual')
                     
-                    if response.text:
-                        bot_response = response.text.strip()
-                        
+                    # The model opts out of replying with "SKIP"
+                    if bot_response and bot_response.upper().strip('."') == "SKIP":
+                        return None
+                    
+                    if bot_response:
                         # Update conversation history
-                        self._update_conversation_history(user_name, clean_message, bot_response)
+                        self._update_conversation_history(user_name, clean_message, bot_response, user_id)
+                        
+                        if self.reply_corpus:
+                            self.reply_corpus.add(self._casual_category(clean_message), bot_response)
                         
                         return bot_response
                         
@@ -189,121 +234,55 @@ class GeminiPersonalityEngine:
             logger.error(f"Erro geral ao gerar resposta casual: {e}")
             return None
     
-    def _build_casual_prompt(self, user_name, guild_name, message):
+    def _build_casual_prompt(self, user_name, guild_name, message, channel_id=None, user_id=None):
         """Build prompt for casual conversation participation"""
-        # Detect irony/sarcasm patterns
-        irony_indicators = ['né', 'claro', 'obvio', 'lógico', 'com certeza', 'aha', 'sim sim', 'tá bom']
-        has_irony = any(indicator in message.lower() for indicator in irony_indicators)
-        
-        # Detect heavy/awkward content
-        heavy_keywords = ['caguei', 'vomitei', 'merda', 'fodeu', 'morri', 'quebrei', 'explodi', 'ferrou']
-        is_heavy = any(keyword in message.lower() for keyword in heavy_keywords)
-        
-        prompt = f"""
-        Você é um bot brasileiro amigável chamado Drode participando naturalmente de uma conversa no Discord.
-        
-        SITUAÇÃO:
-        - Alguém disse: "{message}"
-        - Usuário: {user_name}
-        - Servidor: {guild_name}
-        
-        NOVA PERSONALIDADE:
-        - Seja menos sarcástico, mais genuíno e compreensivo
-        - Responda de forma útil e construtiva
-        - Use menos emojis, apenas quando necessário
-        - {'Use 😭 para reconhecer ironia se apropriado' if has_irony else 'Seja natural'}
-        - {'Use 💀 para situações pesadas/constrangedoras' if is_heavy else 'Mantenha tom apropriado'}
-        
-        INSTRUÇÕES:
-        - Responda apenas se tiver algo útil ou interessante para contribuir
-        - NÃO seja zoeiro ou sarcástico demais
-        - Use português brasileiro natural e direto
-        - Máximo 1-2 frases curtas
-        - Poucos ou nenhum emoji
-        
-        IMPORTANTE: Se não tiver nada construtivo para dizer, retorne "SKIP".
-        """
-        
-        return prompt
+        return build_casual_prompt(
+            user_name, guild_name, message, self.profiles.get(user_id), self._channel_context(channel_id, message)
+        )
     
-    def _get_casual_fallback(self, message_content):
-        """Get casual fallback response"""
+    def _casual_category(self, message_content):
+        """Pick the casual fallback category of a message"""
         message_lower = message_content.lower()
         
-        # Detect irony/sarcasm patterns
-        irony_indicators = ['né', 'claro', 'obvio', 'lógico', 'com certeza', 'aha', 'sim sim', 'tá bom']
-        has_irony = any(indicator in message_lower for indicator in irony_indicators)
-        
-        # Detect heavy/awkward content
-        heavy_keywords = ['caguei', 'vomitei', 'merda', 'fodeu', 'morri', 'quebrei', 'explodi', 'ferrou']
-        is_heavy = any(keyword in message_lower for keyword in heavy_keywords)
-        
-        # Handle irony with crying emoji
-        if has_irony:
-            irony_responses = [
-                "Ah tá né 😭",
-                "Claro que sim 😭",
-                "Entendi a ironia 😭"
-            ]
-            return random.choice(irony_responses)
-        
-        # Handle heavy content with skull emoji
-        if is_heavy:
-            heavy_responses = [
-                "Eita 💀",
-                "Nossa 💀",
-                "Caramba 💀"
-            ]
-            return random.choice(heavy_responses)
-        
-        # Questions - sem emojis
-        if '?' in message_content:
-            casual_question_responses = [
-                "Boa pergunta! Também tô curioso sobre isso",
-                "Interessante... alguém sabe responder?",
-                "Essa é difícil! E vocês, o que acham?"
-            ]
-            return random.choice(casual_question_responses)
+        # Irony gets a crying emoji, heavy content a skull
+        if detect_irony(message_content):
+            return 'irony'
+        if detect_heavy(message_content):
+            return 'heavy'
         
-        # Opinions or discussions - sem emojis
+        if '?' in message_content:
+            return 'casual_question'
         if any(word in message_lower for word in ['acho', 'penso', 'opinião', 'acham']):
-            opinion_responses = [
-                "Concordo!",
-                "Interessante ponto de vista!",
-                "Faz sentido!"
-            ]
-            return random.choice(opinion_responses)
-        
-        # Gaming/tech topics - sem emojis
+            return 'opinion'
         if any(word in message_lower for word in ['game', 'jogo', 'tech', 'código']):
-            tech_responses = [
-                "Dahora! Também curto essas paradas",
-                "Massa! Você manja do assunto",
-                "Top! Conte mais sobre isso"
-            ]
-            return random.choice(tech_responses)
-        
-        # General positive reactions - sem emojis
+            return 'casual_tech'
         if any(word in message_lower for word in ['legal', 'massa', 'top', 'dahora']):
-            positive_responses = [
-                "Né que é!",
-                "Exato!",
-                "Concordo plenamente!"
-            ]
-            return random.choice(positive_responses)
+            return 'positive'
+        return 'casual'
+    
+    def _get_casual_fallback(self, message_content):
+        """Get casual fallback response"""
+        category = self._casual_category(message_content)
         
         # Don't respond to everything - return None sometimes
-        if random.random() < 0.4:  # 40% chance to not respond (increased to use less memory)
+        if category == 'casual' and random.random() < 0.4:  # 40% chance to not respond (increased to use less memory)
             return None
         
-        # Generic casual responses - sem emojis
-        casual_responses = [
-            "Interessante isso!",
-            "Hmm...",
-            "Entendi!",
-            "Faz sentido!"
-        ]
-        return random.choice(casual_responses)
+        return self._local_reply(category, self.casual_responses[category])
+    
+    def _local_reply(self, category, choices):
+        """Reply from the local generator, or the hardcoded list without one"""
+        if self.fallback_model:
+            reply = self.fallback_model.generate(category)
+            if reply:
+                self.audit.record('fallback', category=category, source='model')
+                return reply
+        self.audit.record('fallback', category=category, source='list')
+        return random.choice(choices)
+    
+    def fallback_seeds(self):
+        """All hardcoded fallback replies per category, used to seed the local generator"""
+        return {**self.contextual_responses, **self.casual_responses}
     
     def _clean_message(self, message):
         """Remove mentions and clean up the message"""
@@ -314,80 +293,223 @@ class GeminiPersonalityEngine:
         clean = re.sub(r'<:[a-zA-Z0-9_]+:[0-9]+>', '', clean)
         return clean.strip()
     
-    def _build_gemini_prompt(self, user_name, guild_name, message):
-        """Build prompt for Gemini"""
-        # Detect irony/sarcasm patterns
-        irony_indicators = ['né', 'claro', 'obvio', 'lógico', 'com certeza', 'aha', 'sim sim', 'tá bom']
-        has_irony = any(indicator in message.lower() for indicator in irony_indicators)
-        
-        # Detect heavy/awkward content
-        heavy_keywords = ['caguei', 'vomitei', 'merda', 'fodeu', 'morri', 'quebrei', 'explodi', 'ferrou']
-        is_heavy = any(keyword in message.lower() for keyword in heavy_keywords)
-        
-        # Check if it's a question
-        is_question = '?' in message or any(word in message.lower() for word in ['que', 'como', 'por que', 'quando', 'onde', 'qual'])
-        
-        prompt = f"""
-        Você é um bot brasileiro amigável e natural chamado Drode para Discord. 
+    def _build_gemini_prompt(self, user_name, guild_name, message, channel_id=None, reply_chain=None, user_id=None):
+        """Build prompt for Gemini (the persona goes in the system instruction)"""
+        return build_mention_prompt(
+            user_name, guild_name, message, self.profiles.get(user_id), self._channel_context(channel_id, message),
+            reply_chain
+        )
+    
+    def remember_channel_message(self, channel_id, user_name, message_content):
+        """Index a channel message so later replies can be grounded on it"""
+        if Config.RETRIEVAL_ENABLED:
+            self.channel_context.add(channel_id, user_name, self._clean_message(message_content))
+    
+    def _channel_context(self, channel_id, message):
+        """Recent lines of the channel most related to the message"""
+        if channel_id is None or not Config.RETRIEVAL_ENABLED:
+            return None
+        return self.channel_context.search(channel_id, message)
+    
+    def _create_client(self, client):
+        """Gemini client, or None without an API key (an injected client is used by benchmarks)"""
+        if client is not None:
+            return client
         
-        PERSONALIDADE AJUSTADA:
-        - Seja menos sarcástico, mais genuíno e amigável
-        - Fale português brasileiro natural sem exageros
-        - Seja compreensivo e divertido sem ser zoeiro demais
-        - Responda de forma mais direta e útil
+        # Record real calls or replay them offline (see cassette.py)
+        if Config.GEMINI_CASSETTE_MODE == Cassette.REPLAY:
+            return Cassette(Config.GEMINI_CASSETTE_PATH, Cassette.REPLAY, latency=Config.GEMINI_CASSETTE_LATENCY)
         
-        CONTEXTO:
-        - Usuário: {user_name}
-        - Servidor: {guild_name}
-        - Mensagem: "{message}"
+        gemini_key = os.getenv('GEMINI_API_KEY')
+        if not gemini_key:
+            return None
+        # Imported here: google-genai is slow to import and unused by other backends
+        from google import genai
+        from google.genai import types
+        client = genai.Client(
+            api_key=gemini_key,
+            http_options=types.HttpOptions(client_args=get_shared_transport().genai_client_args())
+        )
+        if Config.GEMINI_CASSETTE_MODE == Cassette.RECORD:
+            client = Cassette(Config.GEMINI_CASSETTE_PATH, Cassette.RECORD, inner=client)
+        return client
+    
+    async def warmup(self):
+        """Pre-connect to Gemini so the first user request skips DNS/TLS setup"""
+        if not self.has_api or getattr(self.client, 'offline', False):
+            return
+        http_pool = get_shared_transport()
+        await http_pool.prewarm(self.provider_urls)
+        http_pool.start_keepalive()
+    
+    def _breaker_allows(self, background):
+        """Background work only runs on a closed circuit and never takes the half-open probe"""
+        if background:
+            return self.breaker.state == self.breaker.CLOSED
+        return self.breaker.allow_request()
+    
+    async def _generate(self, contents, profile, site=None, background=False):
+        """Generate with the profile's settings, through the breaker, quota, audit and usage stats"""
+        if not self.has_api:
+            return None
+        settings = Config.GENERATION_PROFILES[profile]
         
-        INSTRUÇÕES ESPECÍFICAS:
-        - {'Reconheça a ironia com um 😭 se for apropriado' if has_irony else 'Responda naturalmente'}
-        - {'Use 💀 para reagir ao conteúdo pesado' if is_heavy else 'Use emojis com moderação'}
-        - {'Responda a pergunta de forma útil' if is_question else 'Comente de forma construtiva'}
-        - Use NO MÁXIMO 1-2 frases
-        - Seja natural, não force humor
-        - Use poucos emojis, apenas quando necessário
-        """
+        # While the circuit is open callers go straight to their local fallback
+        if not self._breaker_allows(background):
+            self._audit_call(site or profile, settings, contents, 'breaker_open')
+            return None
+        # A probe cancelled mid-call must not leave the circuit waiting on it forever
+        probing = self.breaker.state == self.breaker.HALF_OPEN
         
-        return prompt
+        self.quota.record(background=background)
+        started = time.perf_counter()
+        try:
+            response = await self._call_model(contents, settings)
+        except Exception as e:
+            if not background:
+                self.breaker.record_failure(e)
+            self._audit_call(site or profile, settings, contents, 'error', started=started, error=e)
+            raise
+        except BaseException:
+            if probing:
+                self.breaker.release_probe()
+            raise
+        
+        if not background:
+            self.breaker.record_success()
+        self._record_usage(profile, response, time.perf_counter() - started)
+        text = response.text.strip() if response.text else None
+        self._audit_call(site or profile, settings, contents, 'ok' if text else 'empty', started=started, response=response, text=text)
+        return text
     
-    def _get_contextual_fallback(self, message_content):
-        """Get contextual fallback based on message content"""
+    def _audit_call(self, site, settings, contents, outcome, started=None, response=None, text=None, error=None):
+        """Queue one model call for the interaction log"""
+        usage = getattr(response, 'usage_metadata', None)
+        entry = {
+            'site': site,
+            'model': settings['model'],
+            'outcome': outcome,
+            'latency_ms': round((time.perf_counter() - started) * 1000, 1) if started else None,
+            'prompt_tokens': usage.prompt_token_count if usage else None,
+            'cached_tokens': usage.cached_content_token_count if usage else None,
+            'output_tokens': usage.candidates_token_count if usage else None,
+            'thoughts_tokens': usage.thoughts_token_count if usage else None,
+        }
+        if error is not None:
+            entry['error'] = type(error).__name__
+        if Config.AUDIT_LOG_TEXT:
+            entry['prompt'] = str(contents)[-Config.AUDIT_MAX_TEXT:]
+            entry['reply'] = text[:Config.AUDIT_MAX_TEXT] if text else None
+        self.audit.record('call', **entry)
+    
+    async def _call_model(self, contents, settings):
+        """The provider call itself; returns a response with text and usage_metadata"""
+        return await asyncio.wait_for(
+            asyncio.to_thread(self._generate_sync, contents, settings),
+            timeout=Config.GEMINI_TIMEOUT
+        )
+    
+    def _generate_sync(self, contents, settings):
+        return self.client.models.generate_content(
+            model=settings['model'],
+            contents=contents,
+            config=self._build_generation_config(settings)
+        )
+    
+    def _build_generation_config(self, settings):
+        """Build the GenerateContentConfig for a generation profile"""
+        from google.genai import types
+        
+        options = {
+            'max_output_tokens': settings['max_tokens'],
+            'temperature': settings['temperature'],
+        }
+        if settings['thinking_budget'] is not None:
+            options['thinking_config'] = types.ThinkingConfig(thinking_budget=settings['thinking_budget'])
+        
+        # The persona is below the minimum size for an explicit context cache;
+        # as a fixed prefix it is picked up by Gemini's implicit caching instead
+        if settings['persona']:
+            options['system_instruction'] = PERSONA_INSTRUCTION
+        
+        return types.GenerateContentConfig(**options)
+    
+    def _record_usage(self, profile, response, latency):
+        """Accumulate latency and token usage per generation profile"""
+        stats = self.usage.setdefault(profile, {
+            'calls': 0, 'latency': 0.0, 'prompt': 0, 'cached': 0, 'output': 0, 'thoughts': 0
+        })
+        stats['calls'] += 1
+        stats['latency'] += latency
+        
+        usage = getattr(response, 'usage_metadata', None)
+        if not usage:
+            return
+        stats['prompt'] += usage.prompt_token_count or 0
+        stats['cached'] += usage.cached_content_token_count or 0
+        stats['output'] += usage.candidates_token_count or 0
+        stats['thoughts'] += usage.thoughts_token_count or 0
+    
+    async def generate_roast(self, target_name):
+        """Generate a friendly roast for the !zoa command"""
+        return await self._generate(render_prompt('roast', user_name=target_name), 'roast')
+    
+    async def generate_joke(self):
+        """Generate a short joke for the !piada command"""
+        return await self._generate(render_prompt('joke'), 'joke')
+    
+    async def generate_compliment(self, target_name, backhanded=False):
+        """Generate a compliment for the !elogio command"""
+        return await self._generate(render_prompt(
+            'compliment',
+            user_name=target_name,
+            compliment_kind='elogio meio duvidoso e engraçado' if backhanded else 'elogio genuíno mas divertido'
+        ), 'roast', site='compliment')
+    
+    async def generate_conversation_starter(self, topic):
+        """Generate a conversation starter for the !conversa command"""
+        return await self._generate(render_prompt('conversation', topic=topic), 'joke', site='conversation')
+    
+    def _contextual_category(self, message_content):
+        """Pick the contextual fallback category of a message"""
         message_lower = message_content.lower()
         
         # Check for greetings
         if any(word in message_lower for word in self.greeting_words):
-            return random.choice(self.greeting_responses)
+            return 'greeting'
         
         # Check for questions
         if any(word in message_lower for word in self.question_words) or '?' in message_content:
-            return random.choice(self.question_responses)
+            return 'question'
         
         # Check for goodbyes
         if any(word in message_lower for word in self.goodbye_words):
-            return random.choice(self.goodbye_responses)
+            return 'goodbye'
         
         # Check for compliments
         if any(word in message_lower for word in self.compliment_words):
-            return random.choice(self.compliment_responses)
+            return 'compliment'
         
         # Check for tech/gaming
         if any(word in message_lower for word in self.tech_words):
-            return random.choice(self.tech_responses)
+            return 'tech'
         
         # Check for emojis
         if any(emoji in message_content for emoji in ['😂', '🤣', '😄', '😅']):
-            return "Kkkkk também achei engraçado! 😂"
+            return 'laugh'
         
         # Long messages
         if len(message_content) > 100:
-            return "Eita, textão! Resumindo: concordo contigo! 📝"
+            return 'long'
         
-        # Default fallback
-        return random.choice(self.fallback_responses)
+        return 'default'
+    
+    def _get_contextual_fallback(self, message_content):
+        """Get contextual fallback based on message content"""
+        category = self._contextual_category(message_content)
+        return self._local_reply(category, self.contextual_responses[category])
     
-    def _update_conversation_history(self, user_name, user_message, bot_response):
+    def _update_conversation_history(self, user_name, user_message, bot_response, user_id=None):
         """Update conversation history for context - OPTIMIZED for memory"""
         # Limit total users tracked to avoid memory bloat
         max_users = 10
@@ -408,6 +530,21 @@ class GeminiPersonalityEngine:
         # Keep only last 2 messages (1 exchange) to save memory
         if len(self.conversation_history[user_name]) > 2:
             self.conversation_history[user_name] = self.conversation_history[user_name][-2:]
+        
+        # Profiles follow the account, not the display name
+        if user_id is not None:
+            self.profiles.observe(user_id, user_name, user_message, bot_response)
+    
+    def export_state(self):
+        """Conversation context and user profiles, for a restart handoff"""
+        return {
+            'conversation_history': self.conversation_history,
+            'profiles': self.profiles.export_state(),
+        }
+    
+    def import_state(self, state):
+        self.conversation_history.update(state.get('conversation_history', {}))
+        self.profiles.import_state(state.get('profiles', {}))
     
     def get_random_reaction(self):
         """Get a random reaction for variety"""
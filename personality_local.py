@@ -0,0 +1,196 @@
+import asyncio
+import importlib.util
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from config import Config
+from personality_gemini import GeminiPersonalityEngine
+from prompts import PERSONA_INSTRUCTION
+
+logger = logging.getLogger(__name__)
+
+# Per-process model instance, created by the pool initializer
+_llm = None
+
+def _init_worker(model_path, n_ctx, n_threads):
+    """Load the quantized model once per worker process"""
+    global _llm
+    from llama_cpp import Llama
+    _llm = Llama(model_path=model_path, n_ctx=n_ctx, n_threads=n_threads, verbose=False)
+
+def _generate_batch(requests):
+    """Run a batch of (prompt, max_tokens, temperature, persona) in the worker process"""
+    results = []
+    for prompt, max_tokens, temperature, persona in requests:
+        started = time.perf_counter()
+        messages = [{"role": "user", "content": prompt}]
+        if persona:
+            messages.insert(0, {"role": "system", "content": PERSONA_INSTRUCTION})
+        completion = _llm.create_chat_completion(
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature,
+        )
+        usage = completion.get('usage', {})
+        results.append((
+            completion['choices'][0]['message']['content'],
+            usage.get('prompt_tokens', 0),
+            usage.get('completion_tokens', 0),
+            time.perf_counter() - started,
+        ))
+    return results
+
+
+class LocalUsage:
+    """Token usage of a local completion, shaped like Gemini's usage_metadata"""
+
+    def __init__(self, prompt_tokens, output_tokens):
+        self.prompt_token_count = prompt_tokens
+        self.candidates_token_count = output_tokens
+        self.cached_content_token_count = 0
+        self.thoughts_token_count = 0
+
+
+class LocalResponse:
+    def __init__(self, text, prompt_tokens, output_tokens):
+        self.text = text
+        self.usage_metadata = LocalUsage(prompt_tokens, output_tokens)
+
+
+class LocalModelPool:
+    """Process pool running the local model, fed by micro-batches of prompts
+
+    Each micro-batch is split across the workers, so concurrent requests
+    run in parallel instead of queueing behind one process.
+    """
+
+    def __init__(self, workers=None, generate_fn=_generate_batch, initializer=_init_worker, initargs=None):
+        self.workers = workers or Config.LOCAL_LLM_WORKERS
+        threads = Config.LOCAL_LLM_THREADS or max(1, (os.cpu_count() or 1) // self.workers)
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            # spawn: the bot process already runs threads (logging, HTTP pool)
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=initializer,
+            initargs=initargs if initargs is not None else (Config.LOCAL_MODEL_PATH, Config.LOCAL_LLM_CONTEXT, threads)
+        )
+        self.generate_fn = generate_fn
+        self.max_batch = Config.LOCAL_LLM_MAX_BATCH
+        self.batch_window = Config.LOCAL_LLM_BATCH_WINDOW
+
+        self._pending = []  # (request, future) waiting for the next batch
+        self._flush_task = None
+        self.batches = 0
+        self.batched_requests = 0
+
+    async def submit(self, prompt, max_tokens, temperature, persona=False):
+        """Queue a prompt and wait for its completion"""
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append(((prompt, max_tokens, temperature, persona), future))
+
+        if len(self._pending) >= self.max_batch:
+            self._dispatch()
+        elif self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+        return await future
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.batch_window)
+        self._flush_task = None
+        self._dispatch()
+
+    def _dispatch(self):
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+
+        batch, self._pending = self._pending[:self.max_batch], self._pending[self.max_batch:]
+        if not batch:
+            return
+        if self._pending:
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+        self.batches += 1
+        self.batched_requests += len(batch)
+        asyncio.create_task(self._run_batch(batch))
+
+    async def _run_batch(self, batch):
+        # One chunk per worker; a worker generates its chunk sequentially
+        size = -(-len(batch) // self.workers)
+        await asyncio.gather(*(
+            self._run_chunk(batch[start:start + size]) for start in range(0, len(batch), size)
+        ))
+
+    async def _run_chunk(self, chunk):
+        loop = asyncio.get_running_loop()
+        try:
+            results = await asyncio.wait_for(
+                loop.run_in_executor(self.executor, self.generate_fn, [request for request, _ in chunk]),
+                timeout=Config.LOCAL_LLM_TIMEOUT
+            )
+        except Exception as e:
+            for _, future in chunk:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), result in zip(chunk, results):
+            if not future.done():
+                future.set_result(result)
+
+    async def warmup(self):
+        """Start every worker so the model is loaded before the first message"""
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(
+            loop.run_in_executor(self.executor, self.generate_fn, []) for _ in range(self.workers)
+        ))
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+class LocalPersonalityEngine(GeminiPersonalityEngine):
+    """Same personality and fallbacks as the Gemini engine, generated by a local CPU model"""
+
+    provider_urls = []
+    backend_name = "modelo local"
+
+    def __init__(self, pool=None):
+        if pool is None and self._local_model_available():
+            pool = LocalModelPool()
+
+        # The pool takes the client's place so has_api/client checks keep working
+        super().__init__(client=pool)
+        # The fallback model learns from Gemini's replies, not from the local model's
+        self.reply_corpus = None
+
+    def _create_client(self, client):
+        # Never a Gemini client: without a local model the engine uses its fallbacks
+        return client
+
+    @staticmethod
+    def _local_model_available():
+        if importlib.util.find_spec("llama_cpp") is None:
+            logger.error("llama-cpp-python não instalado; usando respostas locais de fallback")
+            return False
+        if not os.path.exists(Config.LOCAL_MODEL_PATH):
+            logger.error(f"Modelo local não encontrado em {Config.LOCAL_MODEL_PATH}; usando respostas locais de fallback")
+            return False
+        return True
+
+    async def warmup(self):
+        """Load the model in every worker process"""
+        if self.has_api:
+            started = time.perf_counter()
+            await self.client.warmup()
+            logger.info(f"Modelo local carregado em {time.perf_counter() - started:.1f}s")
+
+    async def _call_model(self, contents, settings):
+        """Run the prompt on the local model pool, which applies its own timeout"""
+        text, prompt_tokens, output_tokens, _ = await self.client.submit(
+            contents, settings['max_tokens'], settings['temperature'], settings['persona']
+        )
+        return LocalResponse(text, prompt_tokens, output_tokens)
@@ -0,0 +1,163 @@
+import asyncio
+import collections
+import os
+import sys
+import threading
+import time
+from config import Config
+
+_REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Leaf frames of threads that are only waiting for work
+_IDLE_LEAVES = {
+    ('thread.py', '_worker'),  # executor worker waiting on its queue
+    ('handlers.py', '_monitor'),  # logging QueueListener
+    ('threading.py', 'wait'),
+}
+_LOOP_IDLE_LEAF = ('selectors.py', 'select')
+
+def _label(code):
+    return f"{code.co_qualname} ({os.path.basename(code.co_filename)})"
+
+def _is_repo(code):
+    return code.co_filename.startswith(_REPO_DIR)
+
+def _frame_stack(frame):
+    """Code objects from the outermost frame to the innermost"""
+    codes = []
+    while frame is not None:
+        codes.append(frame.f_code)
+        frame = frame.f_back
+    codes.reverse()
+    return codes
+
+def _await_stack(coro):
+    """Code objects of a suspended task, from its coroutine down the await chain"""
+    codes = []
+    while coro is not None:
+        frame = getattr(coro, 'cr_frame', None) or getattr(coro, 'gi_frame', None)
+        if frame is None:
+            break
+        codes.append(frame.f_code)
+        coro = getattr(coro, 'cr_await', None) or getattr(coro, 'gi_yieldfrom', None)
+    return codes
+
+def _trim_loop_frames(codes):
+    """Drop the event loop's own frames above the callback being run"""
+    for i in range(len(codes) - 1, -1, -1):
+        if codes[i].co_name == '_run' and os.path.basename(codes[i].co_filename) == 'events.py':
+            return codes[i + 1:]
+    return codes
+
+def _task_label(task):
+    return f"task:{task.get_name()}" if task is not None else "(fora de task)"
+
+
+class ProfileResult:
+    """Collapsed stacks (flamegraph.pl / speedscope format) plus a per-handler summary"""
+
+    def __init__(self, duration, interval):
+        self.duration = duration
+        self.interval = interval
+        self.cpu = collections.Counter()  # collapsed stack -> samples on a thread
+        self.waiting = collections.Counter()  # collapsed stack -> samples of suspended tasks
+        self.loop_samples = 0
+        self.loop_idle = 0
+        self.functions = collections.Counter()  # bot function -> thread samples with it on the stack
+        self.waiting_functions = collections.Counter()  # bot function -> task samples suspended inside it
+        self.tasks = collections.Counter()  # task name -> loop samples while it ran
+
+    @staticmethod
+    def add(root, codes, stacks, functions):
+        stacks[";".join([root] + [_label(code) for code in codes])] += 1
+        for code in {code for code in codes if _is_repo(code)}:
+            functions[code.co_qualname] += 1
+
+    @staticmethod
+    def collapsed(counter):
+        return "".join(f"{stack} {count}\n" for stack, count in counter.most_common())
+
+    def summary(self, top=8):
+        busy = self.loop_samples - self.loop_idle
+        return {
+            'samples': sum(self.cpu.values()),
+            'loop_busy': busy / self.loop_samples if self.loop_samples else 0.0,
+            'tasks': self.tasks.most_common(top),
+            'functions': self.functions.most_common(top),
+            'waiting': self.waiting_functions.most_common(top),
+        }
+
+
+class SamplingProfiler:
+    """Samples every thread's stack from a side thread and the pending tasks from the loop
+
+    The side thread reads sys._current_frames() at a fixed interval, so a
+    handler blocking the event loop shows up just like one using the CPU, and
+    executor threads running model calls are included. Suspended tasks are
+    sampled on the loop at a lower rate, which shows where slow handlers wait.
+    """
+
+    def __init__(self, interval=None, await_interval=None):
+        self.interval = interval or Config.PROFILER_INTERVAL
+        self.await_interval = await_interval or Config.PROFILER_AWAIT_INTERVAL
+        self.running = False
+
+    async def run(self, seconds):
+        """Profile for `seconds` and return the result"""
+        if self.running:
+            raise RuntimeError("perfilador já está rodando")
+        self.running = True
+        loop = asyncio.get_running_loop()
+        result = ProfileResult(seconds, self.interval)
+        stop = threading.Event()
+        sampler = threading.Thread(
+            target=self._sample_threads, args=(loop, threading.get_ident(), result, stop),
+            name="profiler", daemon=True
+        )
+        started = time.perf_counter()
+        sampler.start()
+        try:
+            ends_at = loop.time() + seconds
+            while loop.time() < ends_at:
+                self._sample_tasks(result)
+                await asyncio.sleep(self.await_interval)
+        finally:
+            stop.set()
+            await asyncio.to_thread(sampler.join)
+            self.running = False
+        result.duration = time.perf_counter() - started
+        return result
+
+    def _sample_threads(self, loop, loop_ident, result, stop):
+        me = threading.get_ident()
+        names = {}
+        while not stop.wait(self.interval):
+            frames = sys._current_frames()
+            if len(names) != len(frames):
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in frames.items():
+                if ident == me:
+                    continue
+                codes = _frame_stack(frame)
+                leaf = (os.path.basename(codes[-1].co_filename), codes[-1].co_name)
+                if ident == loop_ident:
+                    result.loop_samples += 1
+                    if leaf == _LOOP_IDLE_LEAF:
+                        result.loop_idle += 1
+                        result.cpu["loop;(ocioso)"] += 1
+                        continue
+                    # Reading the loop's current task from here is a plain dict lookup
+                    task = asyncio.current_task(loop)
+                    result.tasks[task.get_name() if task else "(callbacks)"] += 1
+                    result.add(f"loop;{_task_label(task)}", _trim_loop_frames(codes), result.cpu, result.functions)
+                elif leaf not in _IDLE_LEAVES:
+                    result.add(f"thread:{names.get(ident, ident)}", codes, result.cpu, result.functions)
+
+    def _sample_tasks(self, result):
+        current = asyncio.current_task()
+        for task in asyncio.all_tasks():
+            if task is current:
+                continue
+            codes = _await_stack(task.get_coro())
+            if codes:
+                result.add(f"await;{_task_label(task)}", codes, result.waiting, result.waiting_functions)
@@ -0,0 +1,306 @@
+import os
+import re
+import sys
+from config import Config
+
+# Detection patterns shared by the prompt builders and the local fallbacks
+IRONY_INDICATORS = ['né', 'claro', 'obvio', 'lógico', 'com certeza', 'aha', 'sim sim', 'tá bom']
+HEAVY_KEYWORDS = ['caguei', 'vomitei', 'merda', 'fodeu', 'morri', 'quebrei', 'explodi', 'ferrou']
+QUESTION_WORDS = ['que', 'como', 'por que', 'quando', 'onde', 'qual']
+
+# Keywords that make the bot more likely to join a conversation
+TRIGGER_KEYWORDS = [
+    'alguém', 'algum', 'opinião', 'acham', 'pensam', 'sabem', 'conhecem',
+    'ajuda', 'dica', 'sugestão', 'recomenda', 'indica', 'melhor',
+    'pior', 'legal', 'massa', 'dahora', 'top', 'ruim', 'chato',
+    'game', 'jogo', 'filme', 'série', 'música', 'comida', 'anime',
+    'python', 'código', 'programação', 'tech', 'ia', 'ai', 'bot',
+    'engraçado', 'funny', 'piada', 'meme', 'rir', 'kkkk', 'haha'
+]
+
+def detect_irony(text):
+    """Check if a message looks ironic or sarcastic"""
+    text_lower = text.lower()
+    return any(indicator in text_lower for indicator in IRONY_INDICATORS)
+
+def detect_heavy(text):
+    """Check if a message has heavy or awkward content"""
+    text_lower = text.lower()
+    return any(keyword in text_lower for keyword in HEAVY_KEYWORDS)
+
+def detect_question(text):
+    """Check if a message is a question"""
+    text_lower = text.lower()
+    return '?' in text or any(word in text_lower for word in QUESTION_WORDS)
+
+def compile_prompt(text):
+    """Strip indentation and blank lines so no tokens are spent on layout"""
+    lines = (re.sub(r'[ \t]+', ' ', line).strip() for line in text.strip().splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+# Static persona, sent as system instruction on mention and casual replies only
+# (see the 'persona' flag of Config.GENERATION_PROFILES)
+PERSONA_SOURCE = """
+    Você é Drode, um bot brasileiro amigável e natural para Discord.
+
+    PERSONALIDADE:
+    - Fale português brasileiro natural, com gírias na medida, sem exageros
+    - Seja genuíno, compreensivo e divertido, sem ser sarcástico ou zoeiro demais
+    - Responda de forma direta e útil
+    - Seja natural, não force humor
+    - Use poucos emojis, apenas quando necessário
+    - Reconheça ironia com 😭 e situações pesadas/constrangedoras com 💀 quando fizer sentido
+
+    REGRAS:
+    - Seja sempre respeitoso, mesmo quando zoando
+    - Não use linguagem ofensiva ou preconceituosa
+    - Respeite o limite de frases pedido em cada tarefa
+"""
+
+PERSONA_INSTRUCTION = compile_prompt(PERSONA_SOURCE)
+
+# Per-request parts; only these change between calls
+PROMPT_SOURCES = {
+    'mention': """
+        Usuário: {user_name}
+        Servidor: {guild_name}
+        Mensagem: "{message}"
+        - {irony_hint}
+        - {heavy_hint}
+        - {question_hint}
+        - Use NO MÁXIMO 1-2 frases
+    """,
+    'casual': """
+        Você está participando naturalmente de uma conversa, sem ter sido chamado.
+        {user_name} disse em {guild_name}: "{message}"
+        - {irony_hint}
+        - {heavy_hint}
+        - Responda apenas se tiver algo útil ou interessante para contribuir
+        - Máximo 1-2 frases curtas
+        Se não tiver nada construtivo para dizer, retorne "SKIP".
+    """,
+    'welcome': """
+        Gere uma mensagem de boas-vindas engraçada e acolhedora para {user_name},
+        que acabou de entrar no servidor {guild_name}.
+        Use humor brasileiro e emojis. Máximo 2 frases. Mencione o nome da pessoa e do servidor.
+        Fale português do Brasil.
+    """,
+    'roast': """
+        Faça uma zoação amigável e engraçada sobre {user_name}.
+        Seja criativo mas respeitoso. Use humor brasileiro. Máximo 2 frases. Fale português do Brasil.
+    """,
+    'joke': """
+        Conte uma piada curta e engraçada.
+        Pode ser sobre tecnologia, games, ou cotidiano. Máximo 3 frases. Fale português do Brasil.
+    """,
+    'compliment': """
+        Faça um {compliment_kind} para {user_name}.
+        Seja criativo e use humor brasileiro. Máximo 2 frases. Fale português do Brasil.
+    """,
+    'conversation': """
+        Inicie uma conversa interessante e divertida sobre: {topic}
+        Faça uma pergunta ou comentário provocativo para gerar discussão.
+        Seja engraçado e use gírias brasileiras. Máximo 2 frases. Fale português do Brasil.
+    """,
+    'profile_context': """
+        Sobre {user_name} (de conversas anteriores): {profile}
+    """,
+    'channel_context': """
+        Mensagens recentes do canal que podem ajudar (use só se forem relevantes):
+        {lines}
+    """,
+    'reply_chain': """
+        A mensagem responde a esta conversa (da mais antiga para a mais recente):
+        {lines}
+    """,
+    'profile': """
+        Resuma quem é {user_name} para conversas futuras, em no máximo 2 frases curtas.
+        Inclua apenas interesses, jeito de falar e assuntos recorrentes; nada sensível ou pessoal demais.
+        Perfil anterior: {previous}
+        Conversas recentes:
+        {conversation}
+    """,
+}
+
+PROMPT_TEMPLATES = {name: compile_prompt(source) for name, source in PROMPT_SOURCES.items()}
+
+def render_prompt(name, **values):
+    """Fill a precompiled per-request template"""
+    return PROMPT_TEMPLATES[name].format(**values)
+
+def _with_profile(prompt, user_name, user_profile):
+    """Attach a user's short profile (a fixed, small number of tokens)"""
+    if not user_profile:
+        return prompt
+    return prompt + "\n" + render_prompt('profile_context', user_name=user_name, profile=user_profile)
+
+def _with_context(prompt, context_lines):
+    """Attach the few channel lines retrieved for this message"""
+    if not context_lines:
+        return prompt
+    return prompt + "\n" + render_prompt('channel_context', lines="\n".join(context_lines))
+
+def _with_reply_chain(prompt, reply_chain):
+    """Attach the messages a reply points back to"""
+    if not reply_chain:
+        return prompt
+    return prompt + "\n" + render_prompt('reply_chain', lines="\n".join(reply_chain))
+
+def build_mention_prompt(user_name, guild_name, message, user_profile=None, context_lines=None, reply_chain=None):
+    """Per-request part of a reply to a mention or DM"""
+    return _with_reply_chain(_with_context(_with_profile(render_prompt(
+        'mention',
+        user_name=user_name,
+        guild_name=guild_name,
+        message=message,
+        irony_hint='Reconheça a ironia com um 😭 se for apropriado' if detect_irony(message) else 'Responda naturalmente',
+        heavy_hint='Use 💀 para reagir ao conteúdo pesado' if detect_heavy(message) else 'Use emojis com moderação',
+        question_hint='Responda a pergunta de forma útil' if detect_question(message) else 'Comente de forma construtiva'
+    ), user_name, user_profile), context_lines), reply_chain)
+
+def build_casual_prompt(user_name, guild_name, message, user_profile=None, context_lines=None):
+    """Per-request part of a casual participation"""
+    return _with_context(_with_profile(render_prompt(
+        'casual',
+        user_name=user_name,
+        guild_name=guild_name,
+        message=message,
+        irony_hint='Use 😭 para reconhecer ironia se apropriado' if detect_irony(message) else 'Seja natural',
+        heavy_hint='Use 💀 para situações pesadas/constrangedoras' if detect_heavy(message) else 'Mantenha tom apropriado'
+    ), user_name, user_profile), context_lines)
+
+
+def _sample_prompts():
+    """One rendered prompt per call site, used by the token report"""
+    return {
+        'mention': build_mention_prompt("Fulano", "Servidor", "alguém sabe qual o melhor jogo de 2024?"),
+        'casual': build_casual_prompt("Fulano", "Servidor", "acho que esse filme é muito legal"),
+        'welcome': render_prompt('welcome', user_name="Fulano", guild_name="Servidor"),
+        'roast': render_prompt('roast', user_name="Fulano"),
+        'joke': render_prompt('joke'),
+        'compliment': render_prompt('compliment', compliment_kind='elogio genuíno mas divertido', user_name="Fulano"),
+        'conversation': render_prompt('conversation', topic="games"),
+    }
+
+def _baseline_prompts():
+    """The same samples as the prompts were written before the persona moved out
+
+    Kept verbatim (indentation included) so the report measures against what
+    was actually sent: every call carried its own copy of the persona.
+    """
+    user_name, guild_name = "Fulano", "Servidor"
+    mention = "alguém sabe qual o melhor jogo de 2024?"
+    casual = "acho que esse filme é muito legal"
+    return {
+        'mention': f"""
+        Você é um bot brasileiro amigável e natural chamado Drode para Discord. 
+        
+        PERSONALIDADE AJUSTADA:
+        - Seja menos sarcástico, mais genuíno e amigável
+        - Fale português brasileiro natural sem exageros
+        - Seja compreensivo e divertido sem ser zoeiro demais
+        - Responda de forma mais direta e útil
+        
+        CONTEXTO:
+        - Usuário: {user_name}
+        - Servidor: {guild_name}
+        - Mensagem: "{mention}"
+        
+        INSTRUÇÕES ESPECÍFICAS:
+        - Responda naturalmente
+        - Use emojis com moderação
+        - Responda a pergunta de forma útil
+        - Use NO MÁXIMO 1-2 frases
+        - Seja natural, não force humor
+        - Use poucos emojis, apenas quando necessário
+        """,
+        'casual': f"""
+        Você é um bot brasileiro amigável chamado Drode participando naturalmente de uma conversa no Discord.
+        
+        SITUAÇÃO:
+        - Alguém disse: "{casual}"
+        - Usuário: {user_name}
+        - Servidor: {guild_name}
+        
+        NOVA PERSONALIDADE:
+        - Seja menos sarcástico, mais genuíno e compreensivo
+        - Responda de forma útil e construtiva
+        - Use menos emojis, apenas quando necessário
+        - Seja natural
+        - Mantenha tom apropriado
+        
+        INSTRUÇÕES:
+        - Responda apenas se tiver algo útil ou interessante para contribuir
+        - NÃO seja zoeiro ou sarcástico demais
+        - Use português brasileiro natural e direto
+        - Máximo 1-2 frases curtas
+        - Poucos ou nenhum emoji
+        
+        IMPORTANTE: Se não tiver nada construtivo para dizer, retorne "SKIP".
+        """,
+        'welcome': f"""
+                Gere uma mensagem de boas-vindas engraçada e acolhedora para {user_name} 
+                que acabou de entrar no servidor {guild_name}. 
+                
+                Seja carismático, use humor brasileiro e emojis. 
+                Máximo 2 frases. Mencione o nome da pessoa e do servidor.
+                Fale português do Brasil naturalmente.
+                """,
+        'roast': f"""
+                        Faça uma zoação amigável e engraçada sobre {user_name}.
+                        Seja criativo mas respeitoso. Use humor brasileiro.
+                        Máximo 2 frases. Fale português do Brasil.
+                        """,
+        'joke': """
+                        Conte uma piada curta e engraçada em português brasileiro.
+                        Pode ser sobre tecnologia, games, ou cotidiano.
+                        Máximo 3 frases. Fale português do Brasil.
+                        """,
+        'compliment': f"""
+                        Faça um elogio genuíno mas divertido 
+                        para {user_name}.
+                        Seja criativo e use humor brasileiro.
+                        Máximo 2 frases. Fale português do Brasil.
+                        """,
+        'conversation': """
+                        Inicie uma conversa interessante e divertida sobre: games
+                        Faça uma pergunta ou comentário provocativo para gerar discussão.
+                        Seja engraçado e use gírias brasileiras.
+                        Máximo 2 frases. Fale português do Brasil.
+                        """,
+    }
+
+def report_token_counts(client=None, model="gemini-2.5-flash"):
+    """Compare tokens per request against the original prompts"""
+    if client is not None:
+        def count(text):
+            return client.models.count_tokens(model=model, contents=text).total_tokens
+        unit = "tokens"
+    else:
+        # Rough estimate (~4 chars per token) when no API key is available
+        def count(text):
+            return max(1, len(text) // 4)
+        unit = "tokens (estimado)"
+
+    # After: mention and casual replies carry the persona as system instruction
+    # (a fixed prefix, so Gemini's implicit caching can discount it); commands
+    # send only their own prompt, as they always did
+    persona = count(PERSONA_INSTRUCTION)
+    print(f"Persona (system instruction de menções e conversas): {persona} {unit}")
+
+    baseline = _baseline_prompts()
+    for name, prompt in _sample_prompts().items():
+        before = count(baseline[name])
+        with_persona = Config.GENERATION_PROFILES.get(name, {}).get('persona', False)
+        after = count(prompt) + (persona if with_persona else 0)
+        note = f" ({count(prompt)} sem a persona)" if with_persona else ""
+        print(f"  {name:>12}: {before:5d} -> {after:5d} {unit} por requisição{note}")
+
+
+if __name__ == "__main__":
+    api_client = None
+    if os.getenv('GEMINI_API_KEY') and '--estimate' not in sys.argv:
+        from google import genai
+        api_client = genai.Client(api_key=os.getenv('GEMINI_API_KEY'))
+    report_token_counts(api_client)
@@ -0,0 +1,64 @@
+import collections
+import time
+from config import Config
+
+class QuotaScheduler:
+    """Tracks model requests against the per-minute and per-day quota
+
+    Foreground traffic is never blocked here; background jobs ask
+    has_spare_capacity() and only run while usage stays well below the limits.
+    """
+
+    def __init__(self, rpm_limit=None, daily_limit=None, spare_fraction=None):
+        self.rpm_limit = rpm_limit or Config.GEMINI_RPM_LIMIT
+        self.daily_limit = daily_limit or Config.GEMINI_DAILY_LIMIT
+        self.spare_fraction = spare_fraction or Config.QUOTA_SPARE_FRACTION
+
+        self._minute = collections.deque()  # request timestamps in the last 60s
+        self._hours = collections.deque()  # [hour, count] for the last 24 hours
+        self.background_requests = 0
+
+    def _prune(self, now):
+        while self._minute and now - self._minute[0] >= 60:
+            self._minute.popleft()
+        current_hour = int(now // 3600)
+        while self._hours and self._hours[0][0] <= current_hour - 24:
+            self._hours.popleft()
+
+    def record(self, background=False, now=None):
+        """Count one request sent to the model"""
+        now = now or time.time()
+        self._prune(now)
+        self._minute.append(now)
+        hour = int(now // 3600)
+        if self._hours and self._hours[-1][0] == hour:
+            self._hours[-1][1] += 1
+        else:
+            self._hours.append([hour, 1])
+        if background:
+            self.background_requests += 1
+
+    def requests_last_minute(self, now=None):
+        self._prune(now or time.time())
+        return len(self._minute)
+
+    def requests_last_day(self, now=None):
+        self._prune(now or time.time())
+        return sum(count for _, count in self._hours)
+
+    def has_spare_capacity(self, now=None):
+        """True while both windows are below the spare fraction of their limit"""
+        now = now or time.time()
+        return (
+            self.requests_last_minute(now) < self.rpm_limit * self.spare_fraction
+            and self.requests_last_day(now) < self.daily_limit * self.spare_fraction
+        )
+
+    def get_stats(self):
+        return {
+            'last_minute': self.requests_last_minute(),
+            'last_day': self.requests_last_day(),
+            'rpm_limit': self.rpm_limit,
+            'daily_limit': self.daily_limit,
+            'background_requests': self.background_requests,
+        }
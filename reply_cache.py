@@ -0,0 +1,110 @@
+import collections
+import logging
+import re
+import time
+import discord
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+_MENTION_RE = re.compile(r'<@[!&]?[0-9]+>')
+
+class ReplyEntry:
+    """One message the bot sent, with the user message that prompted it"""
+
+    __slots__ = ('content', 'user_name', 'prompt', 'reference_id', 'created_at')
+
+    def __init__(self, content, user_name, prompt, reference_id):
+        self.content = content
+        self.user_name = user_name
+        self.prompt = prompt
+        self.reference_id = reference_id  # what the prompting message itself replied to
+        self.created_at = time.time()
+
+
+class ReplyCache:
+    """Bounded cache of the bot's recent messages, so reply chains rarely need fetch_message
+
+    Filled from the dispatcher futures once a reply is actually sent. A
+    cached bot message also yields the user message it answered, so each hit
+    rebuilds two links of the chain without any HTTP call.
+    """
+
+    def __init__(self, max_entries=None):
+        self.max_entries = max_entries or Config.REPLY_CACHE_SIZE
+        self.entries = collections.OrderedDict()  # message id -> ReplyEntry
+        self.hits = 0
+        self.resolved = 0  # referenced message was already in the gateway payload
+        self.fetches = 0
+
+    def track(self, future, message):
+        """Cache the reply behind a dispatcher future once it is sent"""
+        prompt = _MENTION_RE.sub('', message.content).strip()[:Config.REPLY_CACHE_MAX_CHARS]
+        user_name = message.author.display_name
+        reference_id = message.reference.message_id if message.reference else None
+
+        def on_sent(done):
+            sent = None if done.cancelled() else done.result()
+            if sent is not None:
+                self.remember(sent.id, sent.content, user_name, prompt, reference_id)
+        future.add_done_callback(on_sent)
+
+    def remember(self, message_id, content, user_name, prompt, reference_id=None):
+        self.entries[message_id] = ReplyEntry(content[:Config.REPLY_CACHE_MAX_CHARS], user_name, prompt, reference_id)
+        self.entries.move_to_end(message_id)
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def is_bot_message(self, message_id):
+        return message_id in self.entries
+
+    async def build_chain(self, message, bot_user, max_depth=None):
+        """"author: text" lines of what the message replies to, oldest first
+
+        Walks message.reference upwards: the cache first, then the message
+        discord.py resolved from the payload, and fetch_message only on a miss.
+        """
+        max_depth = max_depth or Config.REPLY_CHAIN_DEPTH
+        bot_name = bot_user.display_name
+        reference = message.reference
+        next_id = reference.message_id if reference else None
+        resolved = reference.resolved if reference else None
+        lines = []
+
+        while next_id is not None and len(lines) < max_depth:
+            entry = self.entries.get(next_id)
+            if entry is not None:
+                self.hits += 1
+                lines.append((bot_name, entry.content))
+                lines.append((entry.user_name, entry.prompt))
+                next_id = entry.reference_id
+                resolved = None
+                continue
+
+            if isinstance(resolved, discord.Message) and resolved.id == next_id:
+                self.resolved += 1
+                found = resolved
+            else:
+                self.fetches += 1
+                try:
+                    found = await message.channel.fetch_message(next_id)
+                except discord.HTTPException as e:
+                    logger.debug(f"Mensagem {next_id} da cadeia de respostas indisponível: {e}")
+                    break
+            author = bot_name if found.author.id == bot_user.id else found.author.display_name
+            lines.append((author, _MENTION_RE.sub('', found.content).strip()[:Config.REPLY_CACHE_MAX_CHARS]))
+            next_id = found.reference.message_id if found.reference else None
+            resolved = found.reference.resolved if found.reference else None
+
+        lines.reverse()
+        return [f"{author}: {text}" for author, text in lines[-max_depth:]]
+
+    def get_stats(self):
+        lookups = self.hits + self.resolved + self.fetches
+        return {
+            'entries': len(self.entries),
+            'hits': self.hits,
+            'resolved': self.resolved,
+            'fetches': self.fetches,
+            'hit_rate': (self.hits + self.resolved) / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,75 @@
+import collections
+import re
+from config import Config
+from prompts import detect_irony, detect_heavy
+
+# Pure laughter ("kkkk", "hahaha", "rsrs", laughing emoji) never needs words back;
+# punctuation alone ("......") is not laughter, so at least one laugh is required
+_LAUGH = r"(?:k{3,}|(?:ha){2,}h?|(?:he){2,}|(?:rs){2,}|lol|😂|🤣)"
+_LAUGHTER_RE = re.compile(rf"^[\s!.]*{_LAUGH}(?:{_LAUGH}|[\s!.])*$", re.IGNORECASE)
+
+# Someone asking the channel for something; worth a real answer
+HIGH_VALUE_PHRASES = [
+    'alguém sabe', 'alguem sabe', 'como faz', 'como faço', 'ajuda', 'dica', 'recomenda', 'indica',
+    'sugestão', 'opinião', 'o que acham', 'vocês acham', 'vcs acham', 'qual o melhor', 'qual a melhor'
+]
+
+class ResponsePolicy:
+    """Picks the cheapest way to take part in a conversation
+
+    reaction: an emoji on the message (laughter, short irony or heavy moments)
+    template: a local reply from the fallback model or the canned lists
+    model:    a full model call, kept for questions and substantial messages
+    """
+
+    REACTION = 'reaction'
+    TEMPLATE = 'template'
+    MODEL = 'model'
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.tiers = collections.Counter()
+
+    def choose(self, content):
+        """(tier, emoji) for a message; emoji is only set for the reaction tier"""
+        tier, emoji = self._classify(content.strip())
+        self.tiers[tier] += 1
+        self.engine.audit.record('tier', tier=tier)
+        return tier, emoji
+
+    def _classify(self, text):
+        if not Config.RESPONSE_TIERS:
+            return self.MODEL, None
+        if _LAUGHTER_RE.match(text):
+            return self.REACTION, "😂"
+
+        text_lower = text.lower()
+        high_value = (
+            '?' in text
+            or any(phrase in text_lower for phrase in HIGH_VALUE_PHRASES)
+            or len(text.split()) >= Config.RESPONSE_MODEL_MIN_WORDS
+        )
+        if high_value:
+            return self.MODEL, None
+        # The casual prompt would only ask for a 💀 or 😭 here anyway
+        if detect_heavy(text):
+            return self.REACTION, "💀"
+        if detect_irony(text):
+            return self.REACTION, "😭"
+        return self.TEMPLATE, None
+
+    def template_reply(self, content):
+        """Local reply for the template tier (None when it chooses to stay quiet)"""
+        return self.engine._get_casual_fallback(self.engine._clean_message(content))
+
+    def get_stats(self):
+        total = sum(self.tiers.values())
+        # Without an API every tier is local; nothing was saved
+        saved = self.tiers[self.REACTION] + self.tiers[self.TEMPLATE] if self.engine.has_api else 0
+        return {
+            'reaction': self.tiers[self.REACTION],
+            'template': self.tiers[self.TEMPLATE],
+            'model': self.tiers[self.MODEL],
+            'model_calls_saved': saved,
+            'saved_rate': saved / total if total else 0.0,
+        }
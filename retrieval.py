@@ -0,0 +1,251 @@
+import collections
+import math
+import re
+import sys
+import time
+import zlib
+from config import Config
+
+try:
+    import numpy
+except ImportError:  # optional; scoring falls back to a pure Python scan
+    numpy = None
+
+_WORD_RE = re.compile(r"\w{2,}", re.UNICODE)
+
+# Too common in chat to tell messages apart
+_STOPWORDS = frozenset("""
+    que de da do das dos em no na nos nas um uma uns umas com por para pra pro os as se ao
+    eu tu ele ela nós eles elas você vc vcs isso isto esse essa este esta aquilo aí ai
+    mas ou não nao sim já tem ter foi ser sou era é muito mais bem só também quando como onde
+    me te lhe meu minha seu sua the and kk kkk kkkk
+""".split())
+
+def _features(text, dimensions):
+    """Hashed term frequencies (sublinear) of a message"""
+    counts = collections.Counter(
+        zlib.crc32(word.encode()) % dimensions
+        for word in _WORD_RE.findall(text.lower()) if word not in _STOPWORDS
+    )
+    return {bucket: 1.0 + math.log(count) for bucket, count in counts.most_common(Config.RETRIEVAL_MAX_TERMS)}
+
+
+class ChannelIndex:
+    """Fixed-size ring of one channel's recent messages as hashed TF-IDF vectors
+
+    Document frequencies are kept per hash bucket and updated as messages
+    enter and leave the ring, so IDF weights always describe the current
+    window. With NumPy the ring is stored as padded (slots x terms) arrays
+    and scored in one vectorized pass.
+    """
+
+    def __init__(self, capacity=None, dimensions=None):
+        self.capacity = capacity or Config.RETRIEVAL_RING_SIZE
+        self.dimensions = dimensions or Config.RETRIEVAL_DIMENSIONS
+        self.texts = [None] * self.capacity
+        self.times = [0.0] * self.capacity
+        self.terms = [None] * self.capacity  # slot -> {bucket: tf}
+        self.df = collections.Counter()
+        self.size = 0
+        self.next_slot = 0
+
+        if numpy is not None:
+            # Padding points at an extra bucket whose IDF is always zero
+            self._buckets = numpy.full((self.capacity, Config.RETRIEVAL_MAX_TERMS), self.dimensions, dtype=numpy.int32)
+            self._tf = numpy.zeros((self.capacity, Config.RETRIEVAL_MAX_TERMS), dtype=numpy.float32)
+            self._df = numpy.zeros(self.dimensions + 1, dtype=numpy.float32)
+
+    def add(self, text, line=None, now=None):
+        """Index a message; `line` is what search returns (defaults to the text)"""
+        terms = _features(text, self.dimensions)
+        if not terms:
+            return
+        slot = self.next_slot
+        old = self.terms[slot]
+        if old is not None:
+            self.df.subtract(old.keys())
+        self.df.update(terms.keys())
+
+        self.texts[slot] = (line or text)[:Config.RETRIEVAL_MAX_CHARS]
+        self.times[slot] = now or time.time()
+        self.terms[slot] = terms
+        if numpy is not None:
+            if old is not None:
+                self._df[list(old)] -= 1
+            self._df[list(terms)] += 1
+            self._buckets[slot] = self.dimensions
+            self._tf[slot] = 0
+            self._buckets[slot, :len(terms)] = list(terms)
+            self._tf[slot, :len(terms)] = list(terms.values())
+
+        self.next_slot = (slot + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def _idf(self, df):
+        return math.log((1 + self.size) / (1 + df)) + 1.0
+
+    def search(self, query, k=3):
+        """Up to k (score, text) pairs most similar to the query, best first
+
+        Near-identical lines are skipped: usually the query itself, which
+        was indexed when it arrived, and never new context anyway.
+        """
+        if not self.size:
+            return []
+        query_terms = _features(query, self.dimensions)
+        if not query_terms:
+            return []
+        scores = self._scores_numpy(query_terms, k) if numpy is not None else self._scores_python(query_terms)
+
+        results = []
+        for slot, score in scores:
+            if score < Config.RETRIEVAL_MIN_SCORE:
+                break
+            if score < 0.999:
+                results.append((score, self.texts[slot]))
+                if len(results) == k:
+                    break
+        return results
+
+    def _scores_numpy(self, query_terms, k):
+        idf = numpy.log((1 + self.size) / (1 + self._df)) + 1.0
+        idf[self.dimensions] = 0.0
+        query = numpy.zeros(self.dimensions + 1, dtype=numpy.float32)
+        for bucket, tf in query_terms.items():
+            query[bucket] = tf * idf[bucket]
+        query_norm = float(numpy.sqrt((query * query).sum()))
+
+        used = self.size
+        buckets = self._buckets[:used] if used < self.capacity else self._buckets
+        weights = self._tf[:len(buckets)] * idf[buckets]
+        dots = (weights * query[buckets]).sum(axis=1)
+        norms = numpy.sqrt((weights * weights).sum(axis=1)) * query_norm
+        scores = dots / numpy.maximum(norms, 1e-9)
+
+        # A few extra candidates in case the query itself is among the best
+        top = min(k + 2, len(scores))
+        best = numpy.argpartition(-scores, top - 1)[:top]
+        best = best[numpy.argsort(-scores[best])]
+        return [(int(slot), float(scores[slot])) for slot in best]
+
+    def _scores_python(self, query_terms):
+        idf = {bucket: self._idf(self.df[bucket]) for bucket in query_terms}
+        query = {bucket: tf * idf[bucket] for bucket, tf in query_terms.items()}
+        query_norm = math.sqrt(sum(w * w for w in query.values()))
+
+        scores = []
+        for slot, terms in enumerate(self.terms):
+            if terms is None:
+                continue
+            dot = sum(weight * idf[bucket] * terms[bucket] for bucket, weight in query.items() if bucket in terms)
+            if dot:
+                # Only candidates that share a term pay for the norm
+                norm = math.sqrt(sum((tf * self._idf(self.df[bucket])) ** 2 for bucket, tf in terms.items()))
+                scores.append((slot, dot / (norm * query_norm)))
+        scores.sort(key=lambda item: item[1], reverse=True)
+        return scores
+
+    def memory_bytes(self):
+        """Fixed arrays plus the texts and term dicts currently held"""
+        size = sum(sys.getsizeof(text) for text in self.texts if text)
+        size += sum(sys.getsizeof(terms) for terms in self.terms if terms)
+        if numpy is not None:
+            size += self._buckets.nbytes + self._tf.nbytes + self._df.nbytes
+        return size
+
+    def __len__(self):
+        return self.size
+
+
+class ChannelRetrieval:
+    """Per-channel retrieval indexes, least recently active channel evicted first"""
+
+    def __init__(self, max_channels=None):
+        self.max_channels = max_channels or Config.RETRIEVAL_MAX_CHANNELS
+        self.channels = collections.OrderedDict()  # channel_id -> ChannelIndex
+        self.queries = 0
+        self.hits = 0
+
+    def add(self, channel_id, author_name, content, now=None):
+        if len(content) < Config.RETRIEVAL_MIN_CHARS:
+            return
+        index = self.channels.get(channel_id)
+        if index is None:
+            index = self.channels[channel_id] = ChannelIndex()
+            if len(self.channels) > self.max_channels:
+                self.channels.popitem(last=False)
+        else:
+            self.channels.move_to_end(channel_id)
+        # Only the content is vectorized, so a repeated message scores as identical
+        index.add(content, f"{author_name}: {content}", now)
+
+    def search(self, channel_id, query, k=None):
+        """Most relevant recent lines of the channel for a query"""
+        index = self.channels.get(channel_id)
+        if index is None:
+            return []
+        self.queries += 1
+        results = index.search(query, k or Config.RETRIEVAL_TOP_K)
+        if results:
+            self.hits += 1
+        return [text for _, text in results]
+
+    def forget_channel(self, channel_id):
+        self.channels.pop(channel_id, None)
+
+    def get_stats(self):
+        return {
+            'channels': len(self.channels),
+            'messages': sum(len(index) for index in self.channels.values()),
+            'queries': self.queries,
+            'hit_rate': self.hits / self.queries if self.queries else 0.0,
+            'backend': 'numpy' if numpy is not None else 'python',
+        }
+
+
+def benchmark(messages=10000, queries=200):
+    """Query latency over one channel holding `messages` lines"""
+    import random
+    rng = random.Random(42)
+    vocabulary = [
+        "jogo", "anime", "filme", "série", "código", "python", "discord", "servidor", "música", "banda",
+        "temporada", "episódio", "lançamento", "preço", "placa", "vídeo", "memes", "futebol", "time", "campeonato",
+        "prova", "faculdade", "trabalho", "chefe", "viagem", "praia", "comida", "pizza", "receita", "café",
+    ] + [f"palavra{i}" for i in range(2000)]
+
+    def sentence():
+        return " ".join(rng.choice(vocabulary) for _ in range(rng.randint(4, 14)))
+
+    index = ChannelIndex(capacity=messages)
+    started = time.perf_counter()
+    for i in range(messages):
+        index.add(f"membro_{i % 50}: {sentence()}")
+    build = time.perf_counter() - started
+
+    latencies = []
+    for _ in range(queries):
+        query = sentence()
+        started = time.perf_counter()
+        index.search(query, Config.RETRIEVAL_TOP_K)
+        latencies.append(time.perf_counter() - started)
+    latencies.sort()
+
+    print(f"backend: {'numpy' if numpy is not None else 'python'}")
+    print(f"{messages} mensagens indexadas em {build * 1000:.0f}ms ({build / messages * 1e6:.1f}µs/mensagem)")
+    print(f"consulta: p50 {latencies[len(latencies) // 2] * 1000:.2f}ms, p95 {latencies[int(len(latencies) * 0.95)] * 1000:.2f}ms")
+    print(f"memória do índice: {index.memory_bytes() / 1024:.0f} KiB")
+
+    if numpy is not None:
+        # The numpy path must rank like the pure Python one, for any k
+        mismatches = 0
+        for k in (1, Config.RETRIEVAL_TOP_K, 10):
+            for _ in range(20):
+                query_terms = _features(sentence(), index.dimensions)
+                fast = [round(score, 4) for _, score in index._scores_numpy(query_terms, k)[:k] if score > 0]
+                slow = [round(score, 4) for _, score in index._scores_python(query_terms)[:k]]
+                mismatches += fast != slow
+        print(f"numpy vs python: {mismatches} divergências em 60 consultas")
+
+
+if __name__ == "__main__":
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
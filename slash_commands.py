@@ -0,0 +1,160 @@
+import hashlib
+import json
+import logging
+import discord
+from discord import app_commands
+from config import Config
+from command_text import (
+    COMMAND_COOLDOWNS, cooldown_key, roast_text, joke_text, compliment_text, conversation_text
+)
+from commands import build_status_embed
+from state_backend import get_state_backend
+
+logger = logging.getLogger(__name__)
+
+MAX_CHOICES = 25  # Discord limit for autocomplete choices
+
+class BotCommandTree(app_commands.CommandTree):
+    async def interaction_check(self, interaction):
+        # No new work once a graceful shutdown started
+        return self.client.accepting
+
+
+def _shared_cooldown(name):
+    """app_commands cooldown with the bucket in the state backend (shared with !commands)"""
+    rate, per = COMMAND_COOLDOWNS[name]
+
+    async def predicate(interaction):
+        retry_after = await get_state_backend().take(cooldown_key(name, interaction.user.id), rate, per)
+        if retry_after:
+            raise app_commands.CommandOnCooldown(app_commands.Cooldown(rate, per), retry_after)
+        return True
+    return app_commands.check(predicate)
+
+def command_payload_hash(tree):
+    """Stable hash of the global command payloads Discord would receive"""
+    payload = sorted(
+        (command.to_dict(tree) for command in tree.get_commands()),
+        key=lambda command: command['name']
+    )
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+def _read_sync_state(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+async def sync_commands(bot, path=None):
+    """Sync global commands in one bulk request, only when they changed"""
+    path = path or Config.COMMAND_SYNC_HASH_PATH
+    digest = command_payload_hash(bot.tree)
+    key = str(bot.application_id)
+
+    state = _read_sync_state(path)
+    if state.get(key) == digest:
+        logger.info("Comandos de barra inalterados; sincronização pulada")
+        return False
+
+    # tree.sync() overwrites every global command with a single PUT
+    try:
+        synced = await bot.tree.sync()
+    except discord.HTTPException as e:
+        # Rate limit, outage or missing applications.commands scope: keep the
+        # commands Discord already has and retry on the next start
+        logger.error(f"Erro ao sincronizar comandos de barra: {e}")
+        return False
+    state[key] = digest
+    try:
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+    except OSError as e:
+        logger.error(f"Erro ao salvar hash dos comandos: {e}")
+    logger.info(f"{len(synced)} comandos de barra sincronizados")
+    return True
+
+async def setup_slash_commands(bot):
+    """Register slash versions of the prefix commands"""
+
+    async def member_autocomplete(interaction, current):
+        if interaction.guild is None:
+            return []
+        matches = bot.member_cache.names.search(interaction.guild.id, current, MAX_CHOICES)
+        if not matches and interaction.guild.members:
+            # Eager cache mode: search the member list directly
+            current_lower = current.lower()
+            matches = [
+                (m.id, m.display_name) for m in interaction.guild.members
+                if not m.bot and current_lower in m.display_name.lower()
+            ][:MAX_CHOICES]
+        return [app_commands.Choice(name=name[:100], value=str(member_id)) for member_id, name in matches]
+
+    @bot.tree.command(name='zoa', description="Zoa um usuário específico ou aleatório")
+    @app_commands.describe(membro="Quem vai ser zoado (vazio para alguém aleatório)")
+    @app_commands.autocomplete(membro=member_autocomplete)
+    @app_commands.guild_only()
+    @_shared_cooldown('zoa')
+    async def slash_zoa(interaction: discord.Interaction, membro: str = None):
+        # Acknowledge first; generation can take longer than the 3s interaction window
+        await interaction.response.defer(thinking=True)
+        async with bot.in_flight.track():
+            if membro:
+                target_user = await bot.member_cache.resolve_member(interaction.guild, membro)
+            else:
+                target_user = await bot.member_cache.random_member(interaction.guild)
+
+            if not target_user:
+                await interaction.followup.send("Não achei essa pessoa! Você inventou? 🤔")
+                return
+            await interaction.followup.send(await roast_text(bot, target_user))
+
+    @bot.tree.command(name='piada', description="Conta uma piada")
+    @_shared_cooldown('piada')
+    async def slash_piada(interaction: discord.Interaction):
+        await interaction.response.defer(thinking=True)
+        async with bot.in_flight.track():
+            await interaction.followup.send(await joke_text(bot))
+
+    @bot.tree.command(name='elogio', description="Faz um elogio (às vezes meio zoeiro)")
+    @app_commands.describe(membro="Quem vai ser elogiado (vazio para você mesmo)")
+    @app_commands.autocomplete(membro=member_autocomplete)
+    @app_commands.guild_only()
+    @_shared_cooldown('elogio')
+    async def slash_elogio(interaction: discord.Interaction, membro: str = None):
+        await interaction.response.defer(thinking=True)
+        async with bot.in_flight.track():
+            target_user = None
+            if membro:
+                target_user = await bot.member_cache.resolve_member(interaction.guild, membro)
+            await interaction.followup.send(await compliment_text(bot, target_user or interaction.user))
+
+    @bot.tree.command(name='conversa', description="Inicia uma conversa sobre um tópico")
+    @app_commands.describe(topico="Assunto da conversa")
+    @_shared_cooldown('conversa')
+    async def slash_conversa(interaction: discord.Interaction, topico: str):
+        await interaction.response.defer(thinking=True)
+        async with bot.in_flight.track():
+            await interaction.followup.send(await conversation_text(bot, topico))
+
+    @bot.tree.command(name='status', description="Mostra informações sobre o bot")
+    async def slash_status(interaction: discord.Interaction):
+        # Nothing slow to wait for; answer directly
+        await interaction.response.send_message(embed=build_status_embed(bot))
+
+    @bot.tree.error
+    async def on_app_command_error(interaction, error):
+        if isinstance(error, app_commands.CheckFailure) and not bot.accepting:
+            message = "Tô reiniciando! Tenta de novo em alguns segundos. 🔄"
+        elif isinstance(error, app_commands.CommandOnCooldown):
+            message = f"Calma aí! Espera mais {error.retry_after:.1f} segundos. ⏰"
+        else:
+            logger.error(f"Erro em comando de barra: {error}")
+            message = "Deu ruim aqui! Tenta de novo mais tarde. 🛠️"
+
+        if interaction.response.is_done():
+            await interaction.followup.send(message, ephemeral=True)
+        else:
+            await interaction.response.send_message(message, ephemeral=True)
+
+    await sync_commands(bot)
@@ -0,0 +1,91 @@
+import importlib.abc
+import logging
+import os
+import sys
+import time
+
+logger = logging.getLogger(__name__)
+
+class _ImportTimer(importlib.abc.MetaPathFinder):
+    """Times every module executed while installed (inclusive of its own imports)"""
+
+    def __init__(self, profile):
+        self.profile = profile
+        self._depth = 0
+
+    def find_spec(self, name, path=None, target=None):
+        # Ask the real finders, then time the loader they picked
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, 'find_spec'):
+                continue
+            spec = finder.find_spec(name, path, target)
+            if spec is not None:
+                break
+        else:
+            return None
+
+        loader = spec.loader
+        # Only per-module loader instances can be wrapped without side effects
+        if loader is None or isinstance(loader, type) or 'exec_module' in vars(loader):
+            return spec
+
+        exec_module = loader.exec_module
+        timer = self
+
+        def timed_exec_module(module):
+            started = time.perf_counter()
+            timer._depth += 1
+            try:
+                exec_module(module)
+            finally:
+                timer._depth -= 1
+                timer.profile.imports.append((name, timer._depth, time.perf_counter() - started))
+
+        loader.exec_module = timed_exec_module
+        return spec
+
+
+class StartupProfile:
+    """Import times and boot phases, reported once the bot is ready"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.imports = []  # (module, depth, seconds)
+        self.marks = []  # (phase, seconds since start)
+        self._timer = None
+        self.enabled = os.getenv("STARTUP_PROFILE", "true").lower() == "true"
+
+    def install(self):
+        """Start timing imports; call before importing the rest of the bot"""
+        if self.enabled and self._timer is None:
+            self._timer = _ImportTimer(self)
+            sys.meta_path.insert(0, self._timer)
+
+    def uninstall(self):
+        if self._timer is not None:
+            sys.meta_path.remove(self._timer)
+            self._timer = None
+
+    def mark(self, phase):
+        self.marks.append((phase, time.perf_counter() - self.started))
+
+    def report(self, top=10):
+        """Log the boot timeline and the slowest top-level imports"""
+        self.uninstall()
+        if not self.enabled:
+            return
+
+        lines = ["Perfil de inicialização:"]
+        for phase, elapsed in self.marks:
+            lines.append(f"  {elapsed * 1000:8.0f}ms  {phase}")
+
+        top_level = sorted((entry for entry in self.imports if entry[1] == 0), key=lambda e: e[2], reverse=True)
+        if top_level:
+            total = sum(seconds for _, _, seconds in top_level)
+            lines.append(f"  imports: {total * 1000:.0f}ms em {len(self.imports)} módulos; mais lentos:")
+            for name, _, seconds in top_level[:top]:
+                lines.append(f"  {seconds * 1000:8.0f}ms  {name}")
+        logger.info("\n".join(lines))
+
+
+startup_profile = StartupProfile()
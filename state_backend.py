@@ -0,0 +1,479 @@
+"""Rate limit and cooldown state shared by every process of the bot
+
+Limits are token buckets: `capacity` uses that refill over `per` seconds.
+take() returns 0.0 when the use was allowed, otherwise the seconds until it
+would be. The memory backend keeps buckets per process; the Redis backend
+keeps them in Redis, updated by one Lua script so concurrent replicas can
+never both spend the last token.
+
+    python state_backend.py check      # same scenario on both backends (Redis via a local stand-in)
+"""
+import asyncio
+import collections
+import hashlib
+import logging
+import math
+import sys
+import time
+from urllib.parse import urlparse
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+def _refill(tokens, updated_at, capacity, per, now):
+    return min(capacity, tokens + (now - updated_at) * capacity / per)
+
+
+class MemoryStateBackend:
+    """Token buckets in this process (limits are per replica)"""
+
+    shared = False
+
+    def __init__(self, max_keys=None):
+        self.max_keys = max_keys or Config.STATE_MEMORY_MAX_KEYS
+        self.buckets = collections.OrderedDict()  # key -> [tokens, updated_at]
+        self.checks = 0
+
+    def take_now(self, key, capacity, per, cost=1):
+        """Synchronous take(), for callers outside the event loop"""
+        self.checks += 1
+        now = time.time()
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = [capacity, now]
+            if len(self.buckets) > self.max_keys:
+                self.buckets.popitem(last=False)
+        else:
+            self.buckets.move_to_end(key)
+            bucket[0] = _refill(bucket[0], bucket[1], capacity, per, now)
+            bucket[1] = now
+
+        if bucket[0] >= cost:
+            bucket[0] -= cost
+            return 0.0
+        return (cost - bucket[0]) * per / capacity
+
+    async def take(self, key, capacity, per, cost=1):
+        return self.take_now(key, capacity, per, cost)
+
+    async def take_many(self, requests):
+        """take() for several (key, capacity, per[, cost]) at once"""
+        return [self.take_now(*request) for request in requests]
+
+    async def reset(self, key):
+        self.buckets.pop(key, None)
+
+    async def close(self):
+        pass
+
+    def get_stats(self):
+        return {'backend': 'memory', 'keys': len(self.buckets), 'checks': self.checks}
+
+
+class RedisError(Exception):
+    pass
+
+
+class RedisConnection:
+    """Minimal RESP client; commands written back to back share one round trip"""
+
+    def __init__(self, url, on_connect=()):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or 'localhost'
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int(parsed.path.lstrip('/') or 0)
+        self.on_connect = list(on_connect)  # commands sent with AUTH/SELECT on every (re)connect
+        self._reader = None
+        self._writer = None
+        self._waiters = collections.deque()  # futures for replies, in command order
+        self._reader_task = None
+        self._connect_lock = asyncio.Lock()
+        self.round_trips = 0
+
+    @staticmethod
+    def _encode(args):
+        parts = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode()
+            parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        return b"".join(parts)
+
+    async def _read_reply(self):
+        line = await self._reader.readline()
+        if not line:
+            raise ConnectionError("conexão com o Redis fechada")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest.decode()
+        if kind == b"-":
+            return RedisError(rest.decode())
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            length = int(rest)
+            if length < 0:
+                return None
+            return (await self._reader.readexactly(length + 2))[:-2]
+        if kind == b"*":
+            length = int(rest)
+            return None if length < 0 else [await self._read_reply() for _ in range(length)]
+        raise RedisError(f"resposta inválida: {line!r}")
+
+    async def _read_loop(self):
+        try:
+            while True:
+                reply = await self._read_reply()
+                if not self._waiters:
+                    # Its command was already failed (timeout); nobody waits for it
+                    logger.debug("Resposta do Redis sem comando pendente descartada")
+                    continue
+                waiter = self._waiters.popleft()
+                if not waiter.done():
+                    waiter.set_result(reply)
+        except (ConnectionError, OSError, asyncio.IncompleteReadError) as e:
+            self._fail_waiters(ConnectionError(str(e) or "conexão com o Redis perdida"))
+
+    def _fail_waiters(self, error):
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_exception(error)
+        # The old reader must not read (or fail waiters) alongside the next connection's
+        if self._reader_task is not None and self._reader_task is not asyncio.current_task():
+            self._reader_task.cancel()
+        if self._writer:
+            self._writer.close()
+        self._writer = None
+
+    async def _ensure_connected(self):
+        if self._writer is not None:
+            return
+        async with self._connect_lock:
+            if self._writer is not None:
+                return
+            if self._reader_task is not None:
+                await asyncio.gather(self._reader_task, return_exceptions=True)
+                self._reader_task = None
+            self._reader, self._writer = await asyncio.wait_for(
+                asyncio.open_connection(self.host, self.port), Config.REDIS_TIMEOUT
+            )
+            self._reader_task = asyncio.create_task(self._read_loop())
+            setup = []
+            if self.password:
+                setup.append(("AUTH", self.password))
+            if self.db:
+                setup.append(("SELECT", self.db))
+            setup.extend(self.on_connect)
+            if setup:
+                for reply in await self._send(setup):
+                    if isinstance(reply, RedisError):
+                        raise reply
+
+    async def _send(self, commands):
+        loop = asyncio.get_running_loop()
+        waiters = [loop.create_future() for _ in commands]
+        self._waiters.extend(waiters)
+        self._writer.write(b"".join(self._encode(command) for command in commands))
+        self.round_trips += 1
+        return await asyncio.wait_for(asyncio.gather(*waiters), Config.REDIS_TIMEOUT)
+
+    async def pipeline(self, commands):
+        """Send several commands in one write; replies (or RedisError values) in order"""
+        await self._ensure_connected()
+        try:
+            return await self._send(commands)
+        except asyncio.TimeoutError:
+            # Replies can no longer be matched to their commands
+            self._fail_waiters(ConnectionError("tempo esgotado esperando o Redis"))
+            raise ConnectionError("tempo esgotado esperando o Redis")
+
+    async def execute(self, *args):
+        reply = (await self.pipeline([args]))[0]
+        if isinstance(reply, RedisError):
+            raise reply
+        return reply
+
+    async def close(self):
+        if self._reader_task:
+            self._reader_task.cancel()
+        if self._writer:
+            self._writer.close()
+            self._writer = None
+
+
+# KEYS[1] bucket; ARGV capacity, per (seconds), cost. Returns {allowed, retry_after_ms}.
+# Uses the server clock so replicas with skewed clocks agree.
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local per_ms = tonumber(ARGV[2]) * 1000
+local cost = tonumber(ARGV[3])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + (now - ts) * capacity / per_ms)
+local allowed, retry = 0, 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+else
+    retry = math.ceil((cost - tokens) * per_ms / capacity)
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(per_ms))
+return {allowed, retry}
+"""
+TOKEN_BUCKET_SHA = hashlib.sha1(TOKEN_BUCKET_SCRIPT.encode()).hexdigest()
+
+
+class RedisStateBackend:
+    """Token buckets in Redis, checked with EVALSHA (one round trip per batch)
+
+    Redis being unreachable must not take the bot down with it, nor slow every
+    message by a connect timeout: after a failure, checks use per-process
+    buckets for REDIS_RETRY_INTERVAL seconds before Redis is tried again.
+    """
+
+    shared = True
+
+    def __init__(self, url=None, prefix=None):
+        # Loading the script with the connection keeps checks to a single EVALSHA
+        self.connection = RedisConnection(url or Config.REDIS_URL, on_connect=[("SCRIPT", "LOAD", TOKEN_BUCKET_SCRIPT)])
+        self.prefix = prefix if prefix is not None else Config.STATE_KEY_PREFIX
+        self.fallback = MemoryStateBackend()  # used while Redis is down
+        self.retry_at = 0.0
+        self.checks = 0
+        self.failures = 0
+        self.fallback_checks = 0
+
+    @property
+    def degraded(self):
+        return time.monotonic() < self.retry_at
+
+    async def take(self, key, capacity, per, cost=1):
+        return (await self.take_many([(key, capacity, per, cost)]))[0]
+
+    async def take_many(self, requests):
+        """take() for several (key, capacity, per[, cost]) in a single pipeline"""
+        self.checks += len(requests)
+        if self.degraded:
+            self.fallback_checks += len(requests)
+            return await self.fallback.take_many(requests)
+        commands = []
+        for request in requests:
+            key, capacity, per = request[:3]
+            cost = request[3] if len(request) > 3 else 1
+            commands.append(("EVALSHA", TOKEN_BUCKET_SHA, 1, self.prefix + key, capacity, per, cost))
+        try:
+            replies = await self.connection.pipeline(commands)
+            if any(isinstance(r, RedisError) and str(r).startswith("NOSCRIPT") for r in replies):
+                # Server restarted or SCRIPT FLUSH since we connected: EVAL also caches the script
+                commands = [("EVAL", TOKEN_BUCKET_SCRIPT) + command[2:] for command in commands]
+                replies = await self.connection.pipeline(commands)
+            results = []
+            for reply in replies:
+                if isinstance(reply, RedisError):
+                    raise reply
+                allowed, retry_ms = reply
+                results.append(0.0 if allowed else retry_ms / 1000)
+            return results
+        except (ConnectionError, OSError, RedisError, asyncio.TimeoutError) as e:
+            self.failures += 1
+            self.retry_at = time.monotonic() + Config.REDIS_RETRY_INTERVAL
+            logger.warning(f"Redis indisponível, usando limites locais por {Config.REDIS_RETRY_INTERVAL:.0f}s: {e}")
+            self.fallback_checks += len(requests)
+            return await self.fallback.take_many(requests)
+
+    async def reset(self, key):
+        await self.fallback.reset(key)
+        if self.degraded:
+            return
+        try:
+            await self.connection.execute("DEL", self.prefix + key)
+        except (ConnectionError, OSError, RedisError, asyncio.TimeoutError) as e:
+            logger.warning(f"Erro ao limpar limite no Redis: {e}")
+
+    async def close(self):
+        await self.connection.close()
+
+    def get_stats(self):
+        return {
+            'backend': 'redis',
+            'checks': self.checks,
+            'round_trips': self.connection.round_trips,
+            'failures': self.failures,
+            'fallback_checks': self.fallback_checks,
+            'degraded': self.degraded,
+        }
+
+
+_state_backend = None
+
+def get_state_backend():
+    """Process-wide backend selected by Config.STATE_BACKEND"""
+    global _state_backend
+    if _state_backend is None:
+        if Config.STATE_BACKEND == "redis":
+            _state_backend = RedisStateBackend()
+        else:
+            _state_backend = MemoryStateBackend()
+    return _state_backend
+
+
+# Local Redis stand-in: speaks RESP and runs the token bucket script in Python
+
+class LocalRedis:
+    """Just enough of Redis for this module: PING, SELECT, AUTH, DEL and the bucket script"""
+
+    def __init__(self):
+        self.hashes = {}  # key -> {'tokens', 'ts', 'expires'}
+        self.scripts = set()
+        self.reads = 0  # socket reads that carried commands, i.e. round trips seen by the server
+
+    async def start(self, host='127.0.0.1', port=0):
+        self.server = await asyncio.start_server(self._client, host, port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def _client(self, reader, writer):
+        buffer = b""
+        try:
+            while True:
+                data = await reader.read(65536)
+                if not data:
+                    break
+                self.reads += 1
+                buffer += data
+                while True:
+                    command, buffer = self._parse(buffer)
+                    if command is None:
+                        break
+                    writer.write(self._encode(self._execute(command)))
+                await writer.drain()
+        finally:
+            writer.close()
+
+    @staticmethod
+    def _parse(buffer):
+        if not buffer.startswith(b"*") or b"\r\n" not in buffer:
+            return None, buffer
+        header, rest = buffer.split(b"\r\n", 1)
+        args = []
+        for _ in range(int(header[1:])):
+            if b"\r\n" not in rest:
+                return None, buffer
+            length_line, rest = rest.split(b"\r\n", 1)
+            length = int(length_line[1:])
+            if len(rest) < length + 2:
+                return None, buffer
+            args.append(rest[:length])
+            rest = rest[length + 2:]
+        return args, rest
+
+    def _encode(self, value):
+        if isinstance(value, RedisError):
+            return b"-%s\r\n" % str(value).encode()
+        if isinstance(value, int):
+            return b":%d\r\n" % value
+        if isinstance(value, str):
+            return b"+%s\r\n" % value.encode()
+        if isinstance(value, list):
+            return b"*%d\r\n" % len(value) + b"".join(self._encode(item) for item in value)
+        return b"$-1\r\n"
+
+    def _execute(self, args):
+        name = args[0].decode().upper()
+        if name in ("PING", "SELECT", "AUTH"):
+            return "PONG" if name == "PING" else "OK"
+        if name == "DEL":
+            return sum(self.hashes.pop(key.decode(), None) is not None for key in args[1:])
+        if name == "SCRIPT" and args[1].decode().upper() == "LOAD":
+            if args[2].decode() != TOKEN_BUCKET_SCRIPT:
+                return RedisError("ERR script desconhecido pelo stand-in")
+            self.scripts.add(TOKEN_BUCKET_SHA)
+            return TOKEN_BUCKET_SHA
+        if name in ("EVAL", "EVALSHA"):
+            if name == "EVAL":
+                if args[1].decode() != TOKEN_BUCKET_SCRIPT:
+                    return RedisError("ERR script desconhecido pelo stand-in")
+                self.scripts.add(TOKEN_BUCKET_SHA)
+            elif args[1].decode() not in self.scripts:
+                return RedisError("NOSCRIPT No matching script. Please use EVAL.")
+            key = args[3].decode()
+            capacity, per, cost = (float(arg) for arg in args[4:7])
+            return self._token_bucket(key, capacity, per, cost)
+        return RedisError(f"ERR comando não suportado '{name}'")
+
+    def _token_bucket(self, key, capacity, per, cost):
+        now = time.time()
+        state = self.hashes.get(key)
+        if state is None or state['expires'] <= now:
+            tokens = capacity
+        else:
+            tokens = _refill(state['tokens'], state['ts'], capacity, per, now)
+        if tokens >= cost:
+            allowed, retry = 1, 0
+            tokens -= cost
+        else:
+            allowed, retry = 0, math.ceil((cost - tokens) * per * 1000 / capacity)
+        self.hashes[key] = {'tokens': tokens, 'ts': now, 'expires': now + per}
+        return [allowed, retry]
+
+
+async def check():
+    """Two replicas sharing limits: the allowance must not multiply"""
+    server = await LocalRedis().start()
+    url = f"redis://127.0.0.1:{server.port}/0"
+    try:
+        for label, replicas in [
+            ("memória (por processo)", [MemoryStateBackend(), MemoryStateBackend()]),
+            ("redis (compartilhado)", [RedisStateBackend(url), RedisStateBackend(url)]),
+        ]:
+            # 5 messages per 60s; each replica sees 5 attempts from the same user
+            results = await asyncio.gather(*(
+                replica.take("rate:1001", 5, 60) for _ in range(5) for replica in replicas
+            ))
+            allowed = sum(1 for retry_after in results if retry_after == 0)
+            print(f"{label}: {allowed} de {len(results)} mensagens permitidas (limite 5)")
+
+            cooldowns = await replicas[0].take_many([("cd:zoa:1001", 1, 10), ("cd:piada:1001", 1, 5), ("cd:zoa:1001", 1, 10)])
+            print(f"  cooldowns em lote: {[round(r, 1) for r in cooldowns]}")
+            for replica in replicas:
+                print(f"  {replica.get_stats()}")
+                await replica.close()
+        print(f"stand-in: {server.reads} leituras de socket")
+
+        # Redis gone: one failed attempt, then local limits without waiting on Redis
+        unreachable = RedisStateBackend("redis://127.0.0.1:1/0")
+        latencies = []
+        for _ in range(7):
+            started = time.perf_counter()
+            await unreachable.take('rate:1001', 5, 60)
+            latencies.append((time.perf_counter() - started) * 1000)
+        stats = unreachable.get_stats()
+        print(
+            f"redis fora do ar: {stats['failures']} falha, {stats['fallback_checks']} checagens locais, "
+            f"máx {max(latencies[1:]):.2f}ms após a falha, "
+            f"{await unreachable.take('rate:1001', 5, 60) > 0 and 'limite local aplicado' or 'liberado'}"
+        )
+    finally:
+        await server.stop()
+
+
+def main():
+    command = sys.argv[1] if len(sys.argv) > 1 else 'check'
+    if command == 'check':
+        logging.basicConfig(level=logging.ERROR)
+        asyncio.run(check())
+    else:
+        raise SystemExit("uso: python state_backend.py check")
+
+
+if __name__ == "__main__":
+    main()
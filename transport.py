@@ -0,0 +1,157 @@
+import asyncio
+import logging
+import threading
+import time
+import weakref
+import httpx
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+def _http2_available():
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+class InstrumentedTransport(httpx.BaseTransport):
+    """Wraps the pooled transport to measure connection reuse and time to first byte"""
+
+    def __init__(self, inner):
+        self._inner = inner
+        self._lock = threading.Lock()
+        self._streams = weakref.WeakSet()  # network streams (connections) already used
+
+        self.requests = 0
+        self.reused = 0
+        self.cold_ttfb = []
+        self.warm_ttfb = []
+        self.last_request_at = 0.0
+
+    def handle_request(self, request):
+        started = time.perf_counter()
+        response = self._inner.handle_request(request)
+        # handle_request returns once headers arrive; the body is streamed later
+        ttfb = time.perf_counter() - started
+
+        stream = response.extensions.get("network_stream")
+        with self._lock:
+            self.last_request_at = time.monotonic()
+            reused = stream is not None and stream in self._streams
+            if request.method == "HEAD":
+                # Warm-up and keep-alive pings only register the connection
+                if stream is not None:
+                    self._streams.add(stream)
+                return response
+
+            self.requests += 1
+            if reused:
+                self.reused += 1
+                samples = self.warm_ttfb
+            else:
+                if stream is not None:
+                    self._streams.add(stream)
+                samples = self.cold_ttfb
+            samples.append(ttfb)
+            del samples[:-100]  # keep the last 100 samples of each kind
+
+        return response
+
+    def close(self):
+        # Provider SDKs close their httpx clients on their own; the shared
+        # pool must outlive them, so only shutdown() really closes it
+        pass
+
+    def shutdown(self):
+        self._inner.close()
+
+    def get_stats(self):
+        def avg_ms(values):
+            return round(sum(values) / len(values) * 1000, 1) if values else None
+
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'reuse_rate': round(self.reused / self.requests, 3) if self.requests else 0.0,
+                'cold_ttfb_ms': avg_ms(self.cold_ttfb),
+                'warm_ttfb_ms': avg_ms(self.warm_ttfb),
+            }
+
+
+class SharedTransport:
+    """One keep-alive connection pool shared by every model provider client"""
+
+    def __init__(self):
+        self.http2 = Config.HTTP2 == "true" or (Config.HTTP2 == "auto" and _http2_available())
+        self.transport = InstrumentedTransport(httpx.HTTPTransport(
+            http2=self.http2,
+            retries=1,  # retry connection failures only
+            limits=httpx.Limits(
+                max_connections=Config.HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=Config.HTTP_MAX_KEEPALIVE,
+                keepalive_expiry=Config.HTTP_KEEPALIVE_EXPIRY
+            )
+        ))
+        self._ping_client = httpx.Client(transport=self.transport, timeout=10)
+        self.warm_urls = set()
+        self._keepalive_task = None
+
+    def genai_client_args(self):
+        """client_args for google-genai HttpOptions"""
+        return {'transport': self.transport}
+
+    def openai_http_client(self):
+        """httpx client for the OpenAI SDK backed by the shared pool"""
+        return httpx.Client(transport=self.transport, timeout=60)
+
+    def ping(self, url):
+        """Open (or keep open) a pooled connection to a provider host"""
+        try:
+            # Any status will do; only DNS, TLS and the connection matter
+            self._ping_client.head(url)
+            self.warm_urls.add(url)
+        except httpx.HTTPError as e:
+            logger.warning(f"Erro ao pré-conectar em {url}: {e}")
+
+    async def prewarm(self, urls):
+        """Pre-connect to every provider before the first user request"""
+        started = time.perf_counter()
+        await asyncio.gather(*(asyncio.to_thread(self.ping, url) for url in urls))
+        logger.info(f"Conexões pré-aquecidas em {(time.perf_counter() - started) * 1000:.0f}ms")
+
+    def start_keepalive(self):
+        """Ping idle providers so their connections do not expire"""
+        if self._keepalive_task is None:
+            self._keepalive_task = asyncio.create_task(self._keepalive_loop())
+
+    async def _keepalive_loop(self):
+        interval = Config.HTTP_KEEPALIVE_INTERVAL
+        while True:
+            await asyncio.sleep(interval)
+            idle_for = time.monotonic() - self.transport.last_request_at
+            if idle_for >= interval:
+                for url in list(self.warm_urls):
+                    await asyncio.to_thread(self.ping, url)
+
+    def close(self):
+        if self._keepalive_task:
+            self._keepalive_task.cancel()
+            self._keepalive_task = None
+        self._ping_client.close()
+        self.transport.shutdown()
+
+    def get_stats(self):
+        stats = self.transport.get_stats()
+        stats['http2'] = self.http2
+        return stats
+
+
+_shared_transport = None
+
+def get_shared_transport():
+    """Get the process-wide pooled transport"""
+    global _shared_transport
+    if _shared_transport is None:
+        _shared_transport = SharedTransport()
+    return _shared_transport
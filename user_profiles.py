@@ -0,0 +1,139 @@
+import asyncio
+import collections
+import logging
+import time
+from config import Config
+from prompts import render_prompt
+
+logger = logging.getLogger(__name__)
+
+class UserProfileStore:
+    """Short per-user summaries plus the messages not summarized yet
+
+    Keyed by Discord user id; display names change and are not unique, so
+    they are only kept for rendering the summary prompt.
+    """
+
+    def __init__(self, max_users=None):
+        self.max_users = max_users or Config.PROFILE_MAX_USERS
+        self.profiles = collections.OrderedDict()  # user id -> {'summary', 'updated_at'}
+        self.pending = collections.OrderedDict()  # user id -> deque of recent exchanges
+        self.names = {}  # user id -> latest display name, for users with pending exchanges
+
+    def observe(self, user_id, user_name, user_message, bot_response):
+        """Remember an exchange for the next summary of this user"""
+        exchanges = self.pending.get(user_id)
+        if exchanges is None:
+            exchanges = self.pending[user_id] = collections.deque(maxlen=Config.PROFILE_MAX_PENDING)
+        else:
+            self.pending.move_to_end(user_id)
+        self.names[user_id] = user_name
+        exchanges.append((user_message[:200], bot_response[:100]))
+        if len(self.pending) > self.max_users:
+            dropped, _ = self.pending.popitem(last=False)
+            self.names.pop(dropped, None)
+
+    def get(self, user_id):
+        """The user's summary, if one exists"""
+        profile = self.profiles.get(user_id)
+        return profile['summary'] if profile else None
+
+    def next_candidate(self):
+        """User with the most unsummarized exchanges, if enough piled up"""
+        best, best_count = None, Config.PROFILE_MIN_MESSAGES - 1
+        for user_id, exchanges in self.pending.items():
+            if len(exchanges) > best_count:
+                best, best_count = user_id, len(exchanges)
+        return best
+
+    def consume(self, user_id, count):
+        """Drop the oldest `count` pending exchanges once they are summarized"""
+        exchanges = self.pending.get(user_id)
+        if exchanges is None:
+            return
+        for _ in range(min(count, len(exchanges))):
+            exchanges.popleft()
+        if not exchanges:
+            del self.pending[user_id]
+            self.names.pop(user_id, None)
+
+    def update(self, user_id, summary):
+        self.profiles[user_id] = {'summary': summary[:Config.PROFILE_MAX_CHARS], 'updated_at': time.time()}
+        self.profiles.move_to_end(user_id)
+        if len(self.profiles) > self.max_users:
+            self.profiles.popitem(last=False)
+
+    def export_state(self):
+        return {'profiles': dict(self.profiles)}
+
+    def import_state(self, state):
+        for user_id, profile in state.get('profiles', {}).items():
+            # JSON keys are strings; profiles saved under display names are dropped
+            if str(user_id).isdigit():
+                self.profiles[int(user_id)] = profile
+
+    def __len__(self):
+        return len(self.profiles)
+
+
+class ProfileSummarizer:
+    """Background job that folds recent exchanges into user profiles using idle quota"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.store = engine.profiles
+        self._task = None
+        self.summaries = 0
+        self.skipped_busy = 0
+
+    def start(self):
+        if Config.PROFILE_SUMMARIES and self.engine.has_api and self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(Config.PROFILE_SUMMARY_INTERVAL)
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.warning(f"Erro ao resumir perfil: {e}")
+
+    async def run_once(self):
+        """Summarize at most one user, only with spare quota and a healthy model"""
+        user_id = self.store.next_candidate()
+        if user_id is None:
+            return False
+        if not self.engine.quota.has_spare_capacity() or self.engine.breaker.state != self.engine.breaker.CLOSED:
+            self.skipped_busy += 1
+            return False
+
+        # Exchanges stay pending until the summary is stored, so a failed call loses nothing
+        exchanges = list(self.store.pending[user_id])
+        user_name = self.store.names.get(user_id, "Usuário")
+        conversation = "\n".join(f"{user_name}: {message}\nDrode: {reply}" for message, reply in exchanges)
+        prompt = render_prompt(
+            'profile',
+            user_name=user_name,
+            previous=self.store.get(user_id) or "nenhum",
+            conversation=conversation
+        )
+        summary = await self.engine._generate(prompt, 'profile', background=True)
+        if summary:
+            self.store.update(user_id, summary.strip())
+            self.store.consume(user_id, len(exchanges))
+            self.summaries += 1
+            return True
+        return False
+
+    def get_stats(self):
+        return {
+            'profiles': len(self.store),
+            'pending_users': len(self.store.pending),
+            'summaries': self.summaries,
+            'skipped_busy': self.skipped_busy,
+        }
@@ -1,3 +1,9 @@
+import atexit
+import copy
+import json
+import logging.handlers
+import queue
+import re
 import time
 from collections import defaultdict
 from config import Config
@@ -8,7 +14,8 @@ logger = logging.getLogger(__name__)
 class RateLimiter:
     """Memory-optimized rate limiter to prevent spam"""
     
-    def __init__(self):
+    def __init__(self, backend=None):
+        self.backend = backend  # shared state backend; None keeps the limits in this process
         self.user_timestamps = {}  # Changed from defaultdict to regular dict
         self.messages_limit = Config.RATE_LIMIT_MESSAGES
         self.time_window = Config.RATE_LIMIT_WINDOW
@@ -41,11 +48,30 @@ class RateLimiter:
         user_times.append(current_time)
         return True
     
+    async def allow(self, user_id):
+        """check_user(), but against the shared backend when there is one"""
+        if self.backend is None:
+            return self.check_user(user_id)
+        retry_after = await self.backend.take(f"rate:{user_id}", self.messages_limit, self.time_window)
+        return retry_after == 0
+    
     def reset_user(self, user_id):
         """Reset rate limit for a specific user"""
         if user_id in self.user_timestamps:
             del self.user_timestamps[user_id]
     
+    def export_state(self):
+        """Timestamps still inside the window, for a restart handoff"""
+        now = time.time()
+        return {
+            str(user_id): [t for t in times if now - t < self.time_window]
+            for user_id, times in self.user_timestamps.items()
+        }
+    
+    def import_state(self, state):
+        for user_id, times in list(state.items())[-self.max_users:]:
+            self.user_timestamps[int(user_id)] = list(times)
+    
     def get_user_count(self, user_id):
         """Get current message count for user"""
         current_time = time.time()
@@ -77,6 +103,26 @@ class MessageFormatter:
         else:
             return truncated + "..."
     
+    @staticmethod
+    def split_message(message, max_length=2000):
+        """Split message into parts that fit Discord's character limit"""
+        parts = []
+        rest = message.strip()
+        
+        while rest:
+            part = MessageFormatter.truncate_message(rest, max_length)
+            
+            # truncate_message appends "..." when it had to cut mid-sentence
+            if rest.startswith(part):
+                consumed = len(part)
+            else:
+                consumed = len(part) - 3
+            
+            parts.append(part)
+            rest = rest[consumed:].strip()
+        
+        return parts
+    
     @staticmethod
     def clean_discord_formatting(text):
         """Remove Discord formatting from text"""
@@ -116,36 +162,159 @@ class ErrorHandler:
             if hasattr(error.response, 'status_code'):
                 logger.error(f"HTTP Status: {error.response.status_code}")
             if hasattr(error.response, 'text'):
-                logger.error(f"Response: {error.response.text}")
+                # Bodies can be huge during outages; keep only the start
+                body = str(error.response.text)
+                if len(body) > Config.LOG_MAX_BODY_CHARS:
+                    body = body[:Config.LOG_MAX_BODY_CHARS] + "..."
+                logger.error(f"Response: {body}")
+    
+    @staticmethod
+    def classify_error(error):
+        """Classify an error as quota, connection, auth, invalid or unknown"""
+        if isinstance(error, TimeoutError):
+            return "connection"
+        
+        error_str = str(error).lower()
+        
+        if "rate limit" in error_str or "quota" in error_str or "resource_exhausted" in error_str:
+            return "quota"
+        elif "timeout" in error_str or "connection" in error_str or "unavailable" in error_str:
+            return "connection"
+        elif "authentication" in error_str or "api key" in error_str:
+            return "auth"
+        elif "invalid" in error_str:
+            return "invalid"
+        else:
+            return "unknown"
     
     @staticmethod
     def get_user_friendly_error(error):
         """Convert technical errors to user-friendly messages"""
-        error_str = str(error).lower()
+        category = ErrorHandler.classify_error(error)
         
-        if "rate limit" in error_str or "quota" in error_str:
+        if category == "quota":
             return "Ops! Estou sendo muito usado agora. Tenta de novo em alguns minutos! ⏰"
-        elif "timeout" in error_str or "connection" in error_str:
+        elif category == "connection":
             return "Minha conexão deu pau! Tenta de novo, vai! 📡"
-        elif "authentication" in error_str or "api key" in error_str:
+        elif category == "auth":
             return "Problema na minha configuração! Chama o admin! 🔧"
-        elif "invalid" in error_str:
+        elif category == "invalid":
             return "Alguma coisa tá errada aí! Verifica o que você digitou! 🤔"
         else:
             return "Deu algum erro aqui! Mas não desiste de mim! 🤖💥"
 
+class ErrorSamplingFilter(logging.Filter):
+    """Lets the first few identical warnings/errors per window through and counts the rest"""
+    
+    def __init__(self, window=None, burst=None, max_keys=500):
+        super().__init__()
+        self.window = Config.LOG_SAMPLE_WINDOW if window is None else window
+        self.burst = Config.LOG_SAMPLE_BURST if burst is None else burst
+        self.max_keys = max_keys
+        self._seen = {}  # key -> [window_start, count]
+    
+    def filter(self, record):
+        if record.levelno < logging.WARNING:
+            return True
+        
+        # Same logger and message shape (ids and numbers stripped) count as one error
+        key = (record.name, record.levelno, re.sub(r'\d+', '#', str(record.msg))[:120])
+        now = time.monotonic()
+        entry = self._seen.get(key)
+        
+        if entry is None or now - entry[0] >= self.window:
+            suppressed = entry[1] - self.burst if entry and entry[1] > self.burst else 0
+            if entry is None and len(self._seen) >= self.max_keys:
+                self._seen.clear()
+            self._seen[key] = [now, 1]
+            record.suppressed = suppressed
+            return True
+        
+        entry[1] += 1
+        record.suppressed = 0
+        return entry[1] <= self.burst
+
+class StructuredFormatter(logging.Formatter):
+    """Formats records as one JSON object per line"""
+    
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        if getattr(record, 'suppressed', 0):
+            entry['suppressed'] = record.suppressed
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+class _SuppressedCountFormatter(logging.Formatter):
+    """Console formatter that mentions how many repeats were sampled away"""
+    
+    def format(self, record):
+        text = super().format(record)
+        if getattr(record, 'suppressed', 0):
+            text += f" (+{record.suppressed} repetições omitidas)"
+        return text
+
+class _TracebackQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that keeps the traceback in exc_text instead of folding it into msg"""
+    
+    def prepare(self, record):
+        # Same as QueueHandler.prepare, minus merging exc_text and stack_info into msg
+        if record.exc_info and not record.exc_text:
+            record.exc_text = _traceback_formatter.formatException(record.exc_info)
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        record.exc_info = None
+        return record
+
+_traceback_formatter = logging.Formatter()
+_log_listener = None
+
 def setup_logging():
-    """Setup logging configuration"""
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.StreamHandler(),
-            logging.FileHandler('bot.log', encoding='utf-8')
-        ]
+    """Setup non-blocking logging: handlers run on a background listener thread"""
+    global _log_listener
+    if _log_listener is not None:
+        return _log_listener
+    
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(_SuppressedCountFormatter(
+        '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    ))
+    
+    file_handler = logging.handlers.RotatingFileHandler(
+        Config.LOG_FILE,
+        maxBytes=Config.LOG_MAX_BYTES,
+        backupCount=Config.LOG_BACKUP_COUNT,
+        encoding='utf-8'
     )
+    file_handler.setFormatter(StructuredFormatter())
+    
+    # The event loop only pays for an enqueue; formatting and I/O happen elsewhere
+    log_queue = queue.SimpleQueue()
+    queue_handler = _TracebackQueueHandler(log_queue)
+    queue_handler.addFilter(ErrorSamplingFilter())
+    
+    root = logging.getLogger()
+    root.handlers.clear()
+    root.addHandler(queue_handler)
+    root.setLevel(logging.INFO)
+    
+    _log_listener = logging.handlers.QueueListener(
+        log_queue, console_handler, file_handler, respect_handler_level=True
+    )
+    _log_listener.start()
+    atexit.register(_log_listener.stop)
     
     # Set specific log levels for different modules
     logging.getLogger('discord').setLevel(logging.WARNING)
     logging.getLogger('openai').setLevel(logging.WARNING)
     logging.getLogger('urllib3').setLevel(logging.WARNING)
+    logging.getLogger('httpx').setLevel(logging.WARNING)
+    
+    return _log_listener
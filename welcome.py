@@ -0,0 +1,156 @@
+import asyncio
+import logging
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+class WelcomeChannelCache:
+    """Caches the resolved welcome channel per guild"""
+
+    def __init__(self):
+        self._channels = {}  # guild_id -> channel_id (None when the guild has no welcome channel)
+        self.hits = 0
+        self.misses = 0
+
+    def resolve(self, guild):
+        """Get the welcome channel of a guild, scanning channels only on a miss"""
+        if guild.id in self._channels:
+            self.hits += 1
+            channel_id = self._channels[guild.id]
+            return guild.get_channel(channel_id) if channel_id else None
+
+        self.misses += 1
+        channel = guild.system_channel
+        if not channel:
+            # Try to find a general channel
+            for ch in guild.text_channels:
+                if 'geral' in ch.name.lower() or 'general' in ch.name.lower():
+                    channel = ch
+                    break
+
+        self._channels[guild.id] = channel.id if channel else None
+        return channel
+
+    def invalidate(self, guild_id):
+        """Forget the cached channel of a guild"""
+        self._channels.pop(guild_id, None)
+
+
+class WelcomeBatcher:
+    """Debounces member joins into one welcome message per guild and window"""
+
+    def __init__(self, personality, dispatcher, window=None, max_names=None):
+        self.personality = personality
+        self.dispatcher = dispatcher
+        self.window = Config.WELCOME_BATCH_WINDOW if window is None else window
+        self.max_names = max_names or Config.WELCOME_MAX_NAMES
+        self.channels = WelcomeChannelCache()
+
+        self._pending = {}  # guild_id -> list of members waiting for a welcome
+        self._tasks = {}
+        self.joins = 0
+        self.welcomed = 0
+        self.sends = 0
+
+    def add_member(self, member):
+        """Queue a member for the next welcome message of their guild"""
+        self.joins += 1
+        guild_id = member.guild.id
+        self._pending.setdefault(guild_id, []).append(member)
+
+        if guild_id not in self._tasks:
+            self._tasks[guild_id] = asyncio.create_task(self._flush_later(member.guild))
+
+    async def _flush_later(self, guild):
+        try:
+            await asyncio.sleep(self.window)
+        finally:
+            self._tasks.pop(guild.id, None)
+
+        members = self._pending.pop(guild.id, [])
+        if members:
+            await self._send_welcome(guild, members)
+
+    async def _send_welcome(self, guild, members):
+        try:
+            channel = self.channels.resolve(guild)
+            if not channel:
+                return
+
+            welcome_msg = await self.personality.generate_welcome_message(
+                self._format_names([m.display_name for m in members]),
+                guild.name
+            )
+            await self._queue_welcome(channel, guild, members, welcome_msg)
+
+        except Exception as e:
+            logger.error(f"Erro ao dar boas-vindas: {e}")
+
+    def _queue_welcome(self, channel, guild, members, welcome_msg):
+        """Hand a welcome to the dispatcher; returns its delivery future"""
+        sent = self.dispatcher.send(channel, welcome_msg)
+        self.sends += 1
+        self.welcomed += len(members)
+
+        if len(members) > 1:
+            logger.info(f"{len(members)} entradas em {guild.name} recebidas com uma única mensagem")
+        return sent
+
+    async def flush_pending(self, timeout=None):
+        """Queue waiting welcomes now instead of at the end of their window
+
+        Model calls get `timeout` seconds in total; welcomes not generated by
+        then use the canned templates, so a slow provider cannot hold up
+        shutdown. Delivery is left to the dispatcher's drain.
+        """
+        for task in list(self._tasks.values()):
+            task.cancel()
+        self._tasks.clear()
+        pending, self._pending = self._pending, {}
+
+        batches = []
+        for members in pending.values():
+            guild = members[0].guild
+            channel = self.channels.resolve(guild)
+            if channel:
+                names = self._format_names([m.display_name for m in members])
+                task = asyncio.create_task(self.personality.generate_welcome_message(names, guild.name))
+                batches.append((channel, guild, members, names, task))
+        if not batches:
+            return
+
+        _, late = await asyncio.wait([batch[-1] for batch in batches], timeout=timeout)
+        if late:
+            logger.warning(f"{len(late)} boas-vindas sem resposta do modelo a tempo; usando mensagens prontas")
+        for channel, guild, members, names, task in batches:
+            if task in late:
+                task.cancel()
+                welcome_msg = self.personality.canned_welcome_message(names, guild.name)
+            else:
+                welcome_msg = task.result()
+            self._queue_welcome(channel, guild, members, welcome_msg)
+
+    def _format_names(self, names):
+        """Join names the Portuguese way, capping very large bursts"""
+        if len(names) > self.max_names:
+            extra = len(names) - self.max_names
+            names = names[:self.max_names] + [f"mais {extra} pessoas"]
+
+        if len(names) == 1:
+            return names[0]
+        return f"{', '.join(names[:-1])} e {names[-1]}"
+
+    def invalidate_channel(self, guild_id):
+        """Invalidate the cached welcome channel after channel changes"""
+        self.channels.invalidate(guild_id)
+
+    def get_stats(self):
+        """Get welcome pipeline statistics"""
+        return {
+            'joins': self.joins,
+            'sends': self.sends,
+            'sends_saved': self.welcomed - self.sends,
+            'pending': sum(len(m) for m in self._pending.values()),
+            'channel_cache_hits': self.channels.hits,
+            'channel_cache_misses': self.channels.misses,
+        }